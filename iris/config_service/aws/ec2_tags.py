@@ -1,12 +1,12 @@
 import os
 from dataclasses import dataclass
 from logging import Logger
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-import boto3
 import requests
 from botocore.exceptions import ClientError
 
+from iris.config_service.aws.session_cache import AWSSessionCache
 from iris.utils import util
 
 
@@ -22,6 +22,8 @@ class EC2Tags:
     :param dev_instance_id: the instance id of the host you want to test in dev mode, see readme & iris.cfg. This
     field is not set by default in iris.cfg when running on a host. It must be manually set by the tester
     :param logger: logger for forensics
+    :param session_cache: the AWSSessionCache that keeps the ec2 resource of each aws profile across the runs of the
+    Config Service. Optional
     """
     aws_creds_path: str
     region_name: str
@@ -29,6 +31,7 @@ class EC2Tags:
     dev_mode: bool
     dev_instance_id: str
     logger: Logger
+    session_cache: Optional[AWSSessionCache] = None
 
     def __post_init__(self) -> None:
         """
@@ -42,6 +45,9 @@ class EC2Tags:
 
         os.environ['AWS_SHARED_CREDENTIALS_FILE'] = self.aws_creds_path
 
+        self._session_cache = self.session_cache or AWSSessionCache(aws_creds_path=self.aws_creds_path,
+                                                                    logger=self.logger)
+
         if self.dev_mode:
             self.instance_id = self.dev_instance_id  # local dev mode will use the instance id specified in iris.cfg
         else:
@@ -64,7 +70,7 @@ class EC2Tags:
 
         # try each profile name in the aws_credentials file as the host won't know it's own aws profile
         for profile in profiles:
-            ec2 = boto3.Session(profile_name=profile, region_name=self.region_name).resource('ec2')
+            ec2 = self._session_cache.get_resource('ec2', profile, self.region_name)
             try:
                 instance_tags = ec2.Instance(self.instance_id).tags
                 break
@@ -1,12 +1,119 @@
+import gzip
+import hashlib
+import io
+import json
 import os
+import shutil
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from logging import Logger
-from shutil import rmtree
-from typing import List
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
+from iris.config_service.aws.session_cache import AWSSessionCache
 from iris.utils import util
+from iris.utils.prom_helpers import PromStrBuilder
+
+# the bucket layout of the config bundle, see S3.upload_directory. The manifest is the only object the Config Services
+# read on each run, the bundles are named after their content hash so a published bundle never changes
+BUNDLE_MANIFEST_KEY = 'iris_bundle.json'
+BUNDLE_KEY_FORMAT = 'bundles/iris_configs.{}.tar.gz'
+
+
+@dataclass
+class S3SyncStats:
+    """
+    The S3SyncStats count the objects & bytes that each sync of the bucket fetched, skipped because they were
+    unchanged, or deleted because they were removed from the bucket, so we can see the S3 traffic Iris saves
+
+    :param logger: logger for forensics
+    """
+    logger: Logger
+
+    sync_actions = ('fetched', 'skipped', 'deleted')
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the object & byte counters of each sync action
+
+        :return: None
+        """
+        self.objects_totals: Dict[str, int] = {action: 0 for action in self.sync_actions}
+        self.bytes_totals: Dict[str, int] = {action: 0 for action in self.sync_actions}
+        self.last_sync_duration = 0.0
+        self.sync_duration_total = 0.0
+        self.syncs_total = 0
+
+    def record(self, action: str, size: int) -> None:
+        """
+        Count an object the sync fetched, skipped or deleted
+
+        :param action: what the sync did with the object, one of sync_actions
+        :param size: the size of the object in bytes
+        :return: None
+        """
+        self.objects_totals[action] += 1
+        self.bytes_totals[action] += size
+
+    def record_sync(self, duration: float) -> None:
+        """
+        Record the wall clock time of a sync of the bucket
+
+        :param duration: the seconds the sync took, from listing the bucket to publishing the configs
+        :return: None
+        """
+        self.last_sync_duration = duration
+        self.sync_duration_total += duration
+        self.syncs_total += 1
+
+    def get_prom_strings(self) -> List[str]:
+        """
+        Get the sync counters & timings in the prom format
+
+        :return: a list of strings that build up to the prom string we need to write
+        """
+        prom_builders = [
+            PromStrBuilder(
+                metric_name='iris_config_service_s3_sync_duration_seconds',
+                metric_result=round(self.last_sync_duration, 6),
+                help_str='the wall clock seconds the last sync of the config bucket took',
+                type_str='gauge'
+            ),
+            PromStrBuilder(
+                metric_name='iris_config_service_s3_sync_duration_seconds_total',
+                metric_result=round(self.sync_duration_total, 6),
+                help_str='the wall clock seconds all the syncs of the config bucket took',
+                type_str='counter'
+            ),
+            PromStrBuilder(
+                metric_name='iris_config_service_s3_syncs_total',
+                metric_result=self.syncs_total,
+                help_str='the number of syncs of the config bucket',
+                type_str='counter'
+            ),
+        ]
+        for action in self.sync_actions:
+            prom_builders.extend([
+                PromStrBuilder(
+                    metric_name='iris_config_service_s3_{}_objects_total'.format(action),
+                    metric_result=self.objects_totals[action],
+                    help_str='the number of s3 objects {} by the syncs of the config bucket'.format(action),
+                    type_str='counter'
+                ),
+                PromStrBuilder(
+                    metric_name='iris_config_service_s3_{}_bytes_total'.format(action),
+                    metric_result=self.bytes_totals[action],
+                    help_str='the bytes of the s3 objects {} by the syncs of the config bucket'.format(action),
+                    type_str='counter'
+                ),
+            ])
+
+        return [prom_builder.create_prom_string() for prom_builder in prom_builders]
 
 
 @dataclass
@@ -20,6 +127,15 @@ class S3:
     :param bucket_name: the name of the bucket
     :param dev_mode: set to True when you want to run in dev mode, see readme & iris.cfg
     :param logger: logger for forensics
+    :param sync_stats: the S3SyncStats that count what each sync of the bucket fetched, skipped & deleted. Optional
+    :param kept_versions: the number of versions of the downloads directory that are kept in prod mode, including the
+    current one, see download_bucket
+    :param download_workers: the number of objects downloaded at once. The threads share the connection pool of a
+    single boto3 client
+    :param bundle: set to True to sync the configs from the bundle published by upload_directory(bundle=True) instead
+    of syncing each object of the bucket
+    :param session_cache: the AWSSessionCache that keeps the s3 resource across the runs of the Config Service.
+    Optional
     """
     aws_creds_path: str
     region_name: str
@@ -27,49 +143,570 @@ class S3:
     bucket_name: str
     dev_mode: bool
     logger: Logger
+    sync_stats: Optional[S3SyncStats] = None
+    kept_versions: int = 3
+    download_workers: int = 10
+    bundle: bool = False
+    session_cache: Optional[AWSSessionCache] = None
 
     def __post_init__(self) -> None:
         """
         Check if the aws_creds_file exists and set the AWS_SHARED_CREDENTIALS_FILE env variable. Initialize the S3
         Bucket object via boto3
 
-        :return: None
+        :return: None, raises ValueError if kept_versions or download_workers are not set correctly
         """
+        if self.kept_versions < 1 or self.download_workers < 1:
+            err_msg = 'Invalid S3 kept_versions: {} & download_workers: {} must be >= 1'.format(
+                self.kept_versions, self.download_workers)
+            self.logger.error(err_msg)
+            raise ValueError(err_msg)
+
         util.check_file_exists(file_path=self.aws_creds_path, file_type='aws_credentials', logger=self.logger)
 
         os.environ['AWS_SHARED_CREDENTIALS_FILE'] = self.aws_creds_path
 
-        s3 = boto3.Session(profile_name=self.bucket_environment, region_name=self.region_name).resource('s3')
+        # the resource's client is thread safe, give it a connection per download worker
+        client_config = Config(max_pool_connections=self.download_workers)
+        session_cache = self.session_cache or AWSSessionCache(aws_creds_path=self.aws_creds_path, logger=self.logger)
+        s3 = session_cache.get_resource('s3', self.bucket_environment, self.region_name, client_config)
         self._bucket = s3.Bucket(self.bucket_name)
+        self._client = self._bucket.meta.client
+        # each download runs in a download worker, don't let every download start its own transfer threads
+        self._transfer_config = TransferConfig(use_threads=False)
+
+        self._sync_stats = self.sync_stats or S3SyncStats(logger=self.logger)
+
+    def download_bucket(self, download_path: str,
+                        validate_download: Optional[Callable[[str], None]] = None) -> List[str]:
+        """
+        Sync the contents of the s3 bucket to download_path. An object is only downloaded when its ETag or size changed
+        since the last sync, or when its local copy is missing or was modified, see the manifest at get_manifest_path.
+
+        In prod mode, download_path is a symlink to a versioned directory. A change in the bucket is staged into a new
+        version (the unchanged objects are hard linked from the current one), checksum verified & validated, and then
+        published by atomically swapping the symlink, so the Scheduler & the Garbage Collector always read a complete
+        set of configs. The last kept_versions versions are kept for rollback, see get_versions_path. In dev mode, the
+        bucket is synced in place and the local files that are not in the bucket are kept
+
+        In bundle mode, the bucket is not listed: a single GET of the bundle manifest tells if the config bundle
+        changed, and only then is the bundle downloaded, verified & extracted, see upload_directory
+
+        :param download_path: the path to download the bucket content/configs
+        :param validate_download: checks the configs staged in the directory it is given (ie lints them), and raises to
+        stop them from being published. Only used in prod mode
+        :return: a list containing the paths to each synced file
+        """
+        start = time.monotonic()
+        if self.bundle:
+            synced_files, fetched_files = self._sync_bundle(download_path, validate_download)
+        else:
+            synced_files, fetched_files = self._sync_bucket(download_path, validate_download)
+
+        sync_duration = time.monotonic() - start
+        self._sync_stats.record_sync(sync_duration)
+
+        self.logger.info('Synced {} files in {:.3f}s, downloaded {} changed files. Files: {}.'.format(
+            len(synced_files), sync_duration, len(fetched_files), ', '.join(fetched_files)))
+
+        return synced_files
+
+    def _sync_bucket(self, download_path: str,
+                     validate_download: Optional[Callable[[str], None]]) -> Tuple[List[str], List[str]]:
+        """
+        Helper method for download_bucket to sync the objects of the bucket one by one
+
+        :param download_path: the path to download the bucket content/configs
+        :param validate_download: checks the staged configs, and raises to stop them from being published
+        :return: a list of the synced files and a list of the downloaded files
+        """
+        objects = list(self._bucket.objects.all())
+        manifest_path = self.get_manifest_path(download_path)
+        manifest = self._load_manifest(manifest_path)
+
+        if self.dev_mode:  # do not clear the downloads dir in dev mode so you can run new test metrics and profiles
+            msg = 'Dev_Mode run: syncing the downloads dir {} in place so you can locally test new metrics/profiles'
+            self.logger.info(msg.format(download_path))
+
+            synced_manifest: Dict[str, Dict[str, Any]] = {}
+            try:
+                fetched_files = self._sync_objects(objects, manifest, download_path, download_path, synced_manifest)
+            finally:  # keep the objects fetched before an error, so the next sync doesn't fetch them again
+                self._write_manifest(manifest_path, synced_manifest)
+        else:
+            fetched_files = self._sync_version(objects, manifest, manifest_path, download_path, validate_download)
 
-    def download_bucket(self, download_path: str) -> List[str]:
+        return [object_.key for object_ in objects], fetched_files
+
+    def _sync_bundle(self, download_path: str,
+                     validate_download: Optional[Callable[[str], None]]) -> Tuple[List[str], List[str]]:
+        """
+        Helper method for download_bucket to sync the config bundle published by upload_directory. Only the bundle
+        manifest is read from the bucket, the bundle itself is downloaded & extracted when its hash changed since the
+        last sync, see get_bundle_manifest_path
+
+        :param download_path: the path to download the bucket content/configs
+        :param validate_download: checks the staged configs, and raises to stop them from being published
+        :return: a list of the synced files and a list of the downloaded files
+        """
+        bundle_manifest = self._get_bundle_manifest()
+        if bundle_manifest is None:
+            err_msg = 'No config bundle manifest {} in the s3 bucket {}, upload the configs as a bundle'.format(
+                BUNDLE_MANIFEST_KEY, self.bucket_name)
+            self.logger.error(err_msg)
+            raise OSError(err_msg)
+
+        applied_manifest_path = self.get_bundle_manifest_path(download_path)
+        applied_manifest = self._load_manifest(applied_manifest_path)
+        if applied_manifest.get('sha256') == bundle_manifest['sha256'] and os.path.isdir(download_path):
+            self._sync_stats.record('skipped', bundle_manifest['size'])
+            self.logger.info('The config bundle version {} is unchanged, keeping the downloads at {}'.format(
+                bundle_manifest['version'], download_path))
+            return applied_manifest['files'], []
+
+        bundle_path = '{}.bundle.tmp'.format(os.path.normpath(download_path))
+        try:
+            self._client.download_file(self.bucket_name, bundle_manifest['bundle_key'], bundle_path,
+                                       Config=self._transfer_config)
+            self._verify_bundle(bundle_manifest, bundle_path)
+
+            if self.dev_mode:  # extract in place, so the local test metrics and profiles are kept
+                os.makedirs(download_path, exist_ok=True)
+                synced_files = self._extract_bundle(bundle_path, download_path)
+            else:
+                staging_path = self._create_staging_dir(download_path)
+                synced_files = self._extract_bundle(bundle_path, staging_path)
+                self._publish_staging_dir(download_path, staging_path, validate_download)
+        finally:
+            if os.path.exists(bundle_path):
+                os.remove(bundle_path)
+
+        self._sync_stats.record('fetched', bundle_manifest['size'])
+        self._write_manifest(applied_manifest_path, dict(bundle_manifest, files=synced_files))
+        self.logger.info('Applied the config bundle version {}'.format(bundle_manifest['version']))
+
+        return synced_files, [bundle_manifest['bundle_key']]
+
+    @staticmethod
+    def get_manifest_path(download_path: str) -> str:
+        """
+        Get the path to the manifest of the objects synced to download_path. It sits next to the download directory, so
+        it is never mistaken for a config file
+
+        :param download_path: the path to download the bucket content/configs
+        :return: the path to the manifest
         """
-        Download the contents of the s3 bucket do download_path
+        return '{}.manifest.json'.format(os.path.normpath(download_path))
+
+    @staticmethod
+    def get_bundle_manifest_path(download_path: str) -> str:
+        """
+        Get the path to the copy of the manifest of the config bundle last synced to download_path, with the list of
+        the files it contained
 
         :param download_path: the path to download the bucket content/configs
-        :return: a list containing the paths to each downloaded file
+        :return: the path to the applied bundle manifest
         """
-        if os.path.isdir(download_path):
-            if not self.dev_mode:  # clear the previous download directory on each prod run
-                self.logger.info('Cleared the previous content in the downloads dir before pulling down new data')
-                rmtree(download_path)
-            else:  # do not clear the downloads directory in dev mode so you can run new test metrics and profiles
-                msg = 'Dev_Mode run: not clearing the downloads dir {} so you can locally test new metrics/profiles'
-                self.logger.info(msg.format(download_path))
+        return '{}.bundle.json'.format(os.path.normpath(download_path))
 
-        downloaded_files = []
-        for object_ in self._bucket.objects.all():
-            downloaded_files.append(object_.key)
-            obj_dir_path = '/'.join(object_.key.split('/')[:-1])
+    @staticmethod
+    def get_versions_path(download_path: str) -> str:
+        """
+        Get the path to the directory of the versions of download_path. Each version is a directory named after its
+        increasing version number. To roll back, point the download_path symlink to a previous version
+
+        :param download_path: the path to download the bucket content/configs
+        :return: the path to the versions directory
+        """
+        return '{}.versions'.format(os.path.normpath(download_path))
+
+    def _sync_version(self, objects: List[Any], manifest: Dict[str, Dict[str, Any]], manifest_path: str,
+                      download_path: str, validate_download: Optional[Callable[[str], None]]) -> List[str]:
+        """
+        Helper method for download_bucket to stage the bucket into a new version of download_path & publish it, unless
+        the current version is up to date
+
+        :param objects: the object summaries of the bucket
+        :param manifest: the manifest of the last sync
+        :param manifest_path: the path to the manifest
+        :param download_path: the path to download the bucket content/configs
+        :param validate_download: checks the staged configs, and raises to stop them from being published
+        :return: a list of the downloaded files
+        """
+        current_path = os.path.realpath(download_path) if os.path.isdir(download_path) else None
+        if current_path is not None and set(manifest) == {object_.key for object_ in objects} and all(
+                self._is_synced(object_, manifest[object_.key], os.path.join(current_path, object_.key))
+                for object_ in objects):
+            for object_ in objects:
+                self._sync_stats.record('skipped', object_.size)
+            self.logger.info('The bucket is unchanged, keeping the downloads version at {}'.format(current_path))
+            return []
+
+        staging_path = self._create_staging_dir(download_path)
+
+        synced_manifest: Dict[str, Dict[str, Any]] = {}
+        fetched_files = self._sync_objects(objects, manifest, current_path or staging_path, staging_path,
+                                           synced_manifest)
+
+        self._publish_staging_dir(download_path, staging_path, validate_download)
+        self._write_manifest(manifest_path, synced_manifest)
+
+        for object_key, manifest_entry in manifest.items():
+            if object_key not in synced_manifest:
+                self._sync_stats.record('deleted', manifest_entry['size'])
+
+        return fetched_files
+
+    def _create_staging_dir(self, download_path: str) -> str:
+        """
+        Helper method for download_bucket to create an empty directory to stage the next version of download_path in
+
+        :param download_path: the path to download the bucket content/configs
+        :return: the path to the staging directory
+        """
+        staging_path = os.path.join(self.get_versions_path(download_path), '.staging')
+        if os.path.isdir(staging_path):  # left behind by a sync that failed
+            shutil.rmtree(staging_path)
+        os.makedirs(staging_path)
+
+        return staging_path
+
+    def _publish_staging_dir(self, download_path: str, staging_path: str,
+                             validate_download: Optional[Callable[[str], None]]) -> None:
+        """
+        Helper method for download_bucket to validate the staged configs, turn them into the next version of
+        download_path & publish it, and then delete the versions that are no longer kept. The files of a version are
+        made read-only before it is published, as the next versions hard link the unchanged files: a published file
+        is never written in place, so the kept versions stay independent snapshots for rollback
+
+        :param download_path: the path to download the bucket content/configs
+        :param staging_path: the path to the staging directory, see _create_staging_dir
+        :param validate_download: checks the staged configs, and raises to stop them from being published
+        :return: None
+        """
+        if validate_download is not None:
+            validate_download(staging_path)
+
+        self._make_read_only(staging_path)
+
+        versions_path = os.path.dirname(staging_path)
+        version_path = os.path.join(versions_path, self._get_next_version(versions_path))
+        os.rename(staging_path, version_path)
+        self._publish_version(download_path, version_path)
+
+        self._prune_versions(versions_path)
+
+    def _sync_objects(self, objects: List[Any], manifest: Dict[str, Dict[str, Any]], source_path: str,
+                      target_path: str, synced_manifest: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Helper method for download_bucket to sync the objects to target_path. The objects that are up to date in
+        source_path are hard linked (or copied) from it, the others are downloaded & verified by download_workers
+        threads
+
+        :param objects: the object summaries of the bucket
+        :param manifest: the manifest of the last sync
+        :param source_path: the directory of the last sync, ie the current version. Can be the target_path
+        :param target_path: the directory to sync the objects to
+        :param synced_manifest: the manifest of this sync, filled in as the objects are synced
+        :return: a list of the downloaded files, raises the first download error once the other downloads are done
+        """
+        objects_to_fetch = []
+        for object_ in objects:
+            source_file_path = os.path.join(source_path, object_.key)
+            target_file_path = os.path.join(target_path, object_.key)
 
             # make directories contained in s3 bucket. Won't make dirs if they already exists
-            os.makedirs(os.path.join(download_path, obj_dir_path), exist_ok=True)
+            os.makedirs(os.path.dirname(target_file_path), exist_ok=True)
+
+            manifest_entry = manifest.get(object_.key)
+            if manifest_entry is not None and self._is_synced(object_, manifest_entry, source_file_path):
+                if source_file_path != target_file_path:
+                    self._link_file(source_file_path, target_file_path)
+                synced_manifest[object_.key] = manifest_entry
+                self._sync_stats.record('skipped', object_.size)
+            else:
+                objects_to_fetch.append(object_)
+
+        fetched_files = []
+        download_error = None
+        with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+            futures = {
+                executor.submit(self._download_object, object_, os.path.join(target_path, object_.key)): object_
+                for object_ in objects_to_fetch
+            }
+            for future in as_completed(futures):
+                object_ = futures[future]
+                try:
+                    synced_manifest[object_.key] = future.result()
+                except Exception as e:
+                    download_error = download_error or e
+                    continue
+
+                fetched_files.append(object_.key)
+                self._sync_stats.record('fetched', object_.size)
+
+        if download_error is not None:
+            raise download_error
+
+        return sorted(fetched_files)
+
+    def _download_object(self, object_: Any, file_path: str) -> Dict[str, Any]:
+        """
+        Helper method for _sync_objects to download & verify an object, it runs in a download worker thread
+
+        :param object_: the object summary from the bucket
+        :param file_path: the path to download the object to
+        :return: the manifest entry of the object
+        """
+        self._client.download_file(self.bucket_name, object_.key, file_path, Config=self._transfer_config)
+        self._verify_download(object_, file_path)
+
+        return {
+            'e_tag': object_.e_tag,
+            'size': object_.size,
+            'last_modified': str(object_.last_modified),
+            'local_mtime_ns': self._get_mtime_ns(file_path),
+        }
+
+    def _is_synced(self, object_: Any, manifest_entry: Dict[str, Any], file_path: str) -> bool:
+        """
+        Helper method for download_bucket to check if the local copy of an object is up to date
+
+        :param object_: the object summary from the bucket
+        :param manifest_entry: the manifest entry of the object from the last sync
+        :param file_path: the path to the local copy of the object
+        :return: True if the ETag & size of the object didn't change and its local copy wasn't modified, else False
+        """
+        return manifest_entry['e_tag'] == object_.e_tag and manifest_entry['size'] == object_.size and \
+            manifest_entry['local_mtime_ns'] == self._get_mtime_ns(file_path)
+
+    def _verify_download(self, object_: Any, file_path: str) -> None:
+        """
+        Helper method for download_bucket to verify the size & the checksum of a downloaded object. The ETag of an
+        object uploaded in a single part is the md5 of its content, the ETag of a multipart upload is not checked
+
+        :param object_: the object summary from the bucket
+        :param file_path: the path the object was downloaded to
+        :return: None, raises OSError if the download doesn't match the object
+        """
+        e_tag = object_.e_tag.strip('"')
+        file_size = os.path.getsize(file_path)
+
+        err_msg = None
+        if file_size != object_.size:
+            err_msg = 'The download of s3 object {} has {} bytes instead of {}'.format(
+                object_.key, file_size, object_.size)
+        elif '-' not in e_tag:
+            with open(file_path, 'rb') as object_file:
+                md5_digest = hashlib.md5(object_file.read()).hexdigest()
+            if md5_digest != e_tag:
+                err_msg = 'The download of s3 object {} has the md5 {} instead of its ETag {}'.format(
+                    object_.key, md5_digest, e_tag)
+
+        if err_msg:
+            self.logger.error(err_msg)
+            raise OSError(err_msg)
+
+    def _get_bundle_manifest(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the manifest of the config bundle from the bucket
+
+        :return: a dict of the version, sha256 hex digest, key & size of the current bundle, or None if no bundle was
+        published. Raises ValueError if the manifest is invalid
+        """
+        try:
+            response = self._client.get_object(Bucket=self.bucket_name, Key=BUNDLE_MANIFEST_KEY)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+
+        try:
+            bundle_manifest = json.loads(response['Body'].read())
+        except ValueError as e:
+            bundle_manifest = None
+            self.logger.warning('Could not decode the config bundle manifest. Err: {}'.format(e))
 
-            self._bucket.download_file(object_.key, os.path.join(download_path, object_.key))
+        if not isinstance(bundle_manifest, dict) or \
+                not {'version', 'sha256', 'bundle_key', 'size'}.issubset(bundle_manifest):
+            err_msg = 'The config bundle manifest {} in the s3 bucket {} is invalid: {}'.format(
+                BUNDLE_MANIFEST_KEY, self.bucket_name, bundle_manifest)
+            self.logger.error(err_msg)
+            raise ValueError(err_msg)
 
-        self.logger.info('Downloaded {} files. Files: {}.'.format(len(downloaded_files), ', '.join(downloaded_files)))
+        return bundle_manifest
 
-        return downloaded_files
+    def _verify_bundle(self, bundle_manifest: Dict[str, Any], bundle_path: str) -> None:
+        """
+        Helper method for download_bucket to verify the size & the sha256 checksum of a downloaded config bundle
+
+        :param bundle_manifest: the manifest of the bundle
+        :param bundle_path: the path the bundle was downloaded to
+        :return: None, raises OSError if the download doesn't match the manifest
+        """
+        with open(bundle_path, 'rb') as bundle_file:
+            bundle_content = bundle_file.read()
+        sha256_digest = hashlib.sha256(bundle_content).hexdigest()
+
+        if len(bundle_content) != bundle_manifest['size'] or sha256_digest != bundle_manifest['sha256']:
+            err_msg = 'The download of the config bundle {} has {} bytes & the sha256 {} instead of {} & {}'.format(
+                bundle_manifest['bundle_key'], len(bundle_content), sha256_digest, bundle_manifest['size'],
+                bundle_manifest['sha256'])
+            self.logger.error(err_msg)
+            raise OSError(err_msg)
+
+    def _extract_bundle(self, bundle_path: str, target_path: str) -> List[str]:
+        """
+        Helper method for download_bucket to extract a config bundle. The bundle may only contain regular files &
+        directories below target_path
+
+        :param bundle_path: the path to the downloaded bundle
+        :param target_path: the directory to extract the bundle to
+        :return: a list of the extracted files, raises OSError if the bundle has an unsafe member
+        """
+        with tarfile.open(bundle_path, 'r:gz') as bundle_file:
+            members = bundle_file.getmembers()
+            for member in members:
+                if os.path.isabs(member.name) or '..' in member.name.split('/') or \
+                        not (member.isfile() or member.isdir()):
+                    err_msg = 'The config bundle {} has the unsafe member {}'.format(bundle_path, member.name)
+                    self.logger.error(err_msg)
+                    raise OSError(err_msg)
+
+            # the members are checked above, the filter only silences the warning of the pythons that have it
+            if hasattr(tarfile, 'data_filter'):
+                bundle_file.extractall(target_path, members=members, filter='data')
+            else:
+                bundle_file.extractall(target_path, members=members)
+
+        return sorted(member.name for member in members if member.isfile())
+
+    def _publish_version(self, download_path: str, version_path: str) -> None:
+        """
+        Helper method for download_bucket to atomically point the download_path symlink to a new version
+
+        :param download_path: the path to download the bucket content/configs
+        :param version_path: the path to the new version
+        :return: None
+        """
+        download_path = os.path.abspath(download_path)
+        tmp_link_path = '{}.tmp'.format(download_path)
+        if os.path.lexists(tmp_link_path):
+            os.remove(tmp_link_path)
+        os.symlink(os.path.relpath(os.path.abspath(version_path), os.path.dirname(download_path)), tmp_link_path)
+
+        if os.path.isdir(download_path) and not os.path.islink(download_path):
+            # the downloads dir of an older Iris, only happens once. It is kept as the version before the first one
+            # (pruned like any other version) and is only moved right before the link takes its place, so the configs
+            # never go missing while the service upgrades
+            legacy_version_path = os.path.join(os.path.dirname(version_path), '{:06d}'.format(0))
+            if os.path.isdir(legacy_version_path):
+                shutil.rmtree(legacy_version_path)
+            self.logger.warning('Moving the downloads dir {} to the downloads version {}'.format(
+                download_path, legacy_version_path))
+            os.rename(download_path, legacy_version_path)
+
+        os.replace(tmp_link_path, download_path)  # Atomically swap the downloads link
+
+        self.logger.info('Published the downloads version {}'.format(version_path))
+
+    @staticmethod
+    def _make_read_only(staging_path: str) -> None:
+        """
+        Helper method for download_bucket to make the files of a staged version read-only, this keeps their mtime so
+        the manifest still matches
+
+        :param staging_path: the path to the staging directory
+        :return: None
+        """
+        for dir_path, _, file_names in os.walk(staging_path):
+            for file_name in file_names:
+                os.chmod(os.path.join(dir_path, file_name), 0o444)
+
+    @staticmethod
+    def _get_next_version(versions_path: str) -> str:
+        """
+        Helper method for download_bucket to get the name of the next version
+
+        :param versions_path: the path to the versions directory
+        :return: the name of the next version, zero padded so the versions sort by name
+        """
+        versions = [int(version) for version in os.listdir(versions_path) if version.isdigit()]
+        return '{:06d}'.format(max(versions, default=0) + 1)
+
+    def _prune_versions(self, versions_path: str) -> None:
+        """
+        Helper method for download_bucket to delete all but the last kept_versions versions
+
+        :param versions_path: the path to the versions directory
+        :return: None
+        """
+        versions = sorted(version for version in os.listdir(versions_path) if version.isdigit())
+        for version in versions[:-self.kept_versions]:
+            shutil.rmtree(os.path.join(versions_path, version))
+            self.logger.info('Deleted the downloads version {}'.format(version))
+
+    def _load_manifest(self, manifest_path: str) -> Dict[str, Any]:
+        """
+        Helper method for download_bucket to load the manifest of the last sync
+
+        :param manifest_path: the path to the manifest
+        :return: a dict of the ETag, size, last modified time & local mtime of each synced object, by key, or the
+        applied bundle manifest. Empty if there is no usable manifest, so everything is downloaded
+        """
+        try:
+            with open(manifest_path) as manifest_file:
+                return json.load(manifest_file)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            self.logger.warning('Could not load the s3 manifest {}, downloading every object. Err: {}'.format(
+                manifest_path, e))
+            return {}
+
+    @staticmethod
+    def _write_manifest(manifest_path: str, manifest: Dict[str, Any]) -> None:
+        """
+        Helper method for download_bucket to atomically write the manifest of the sync
+
+        :param manifest_path: the path to the manifest
+        :param manifest: a dict of the ETag, size, last modified time & local mtime of each synced object, by key, or
+        the applied bundle manifest
+        :return: None
+        """
+        tmp_file_path = '{}.tmp'.format(manifest_path)
+        with open(tmp_file_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        os.rename(tmp_file_path, manifest_path)  # Atomically update the manifest file
+
+    @staticmethod
+    def _get_mtime_ns(path: str) -> Optional[int]:
+        """
+        Helper method for download_bucket to get the modification time of a local copy of an object
+
+        :param path: the path to the local copy
+        :return: the mtime of the file in ns, or None if it doesn't exist
+        """
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _link_file(source_file_path: str, target_file_path: str) -> None:
+        """
+        Helper method for download_bucket to hard link an unchanged object into a new version. The linked file is
+        read-only, see _publish_staging_dir. Falls back to a copy that keeps the mtime (so the manifest still matches)
+        & the mode when the versions are on another filesystem
+
+        :param source_file_path: the path to the object in the current version
+        :param target_file_path: the path to the object in the new version
+        :return: None
+        """
+        try:
+            os.link(source_file_path, target_file_path)
+        except OSError:
+            shutil.copy2(source_file_path, target_file_path)
 
     def upload_object(self, upload_file_path: str) -> str:
         """
@@ -87,11 +724,17 @@ class S3:
 
         return object_key
 
-    def upload_directory(self, upload_dir_path: str) -> List[str]:
+    def upload_directory(self, upload_dir_path: str, bundle: bool = False) -> List[str]:
         """
         Upload the directory from upload_dir_path to the S3 bucket
 
+        With bundle set to True, the directory is published as a single gzipped tar, the config bundle, and the bundle
+        manifest is then pointed to it. This is the layout the Config Service reads when its s3_bundle setting is on,
+        see download_bucket. The bundle is only uploaded when its content changed. The previous bundles are kept in the
+        bucket, so the hosts that are downloading them are not broken
+
         :param upload_dir_path: the path to the local directory you want to upload
+        :param bundle: set to True to upload the directory as a config bundle
         :return: a list containing the S3 key names of the directory content that you want to upload
         """
         util.check_dir_exists(dir_path=upload_dir_path, dir_type='upload', logger=self.logger)
@@ -99,6 +742,9 @@ class S3:
         if upload_dir_path[-1] != '/':
             upload_dir_path += '/'
 
+        if bundle:
+            return self._upload_bundle(upload_dir_path)
+
         result = []
         for dir_path, _, files in os.walk(upload_dir_path):
             for file_ in files:
@@ -111,6 +757,68 @@ class S3:
 
         return result
 
+    def _upload_bundle(self, upload_dir_path: str) -> List[str]:
+        """
+        Helper method for upload_directory to upload the directory as a config bundle. The manifest is uploaded last,
+        so it never points to a bundle that is not in the bucket yet
+
+        :param upload_dir_path: the path to the local directory you want to upload
+        :return: a list containing the S3 key names of the bundle & its manifest, empty if the bundle is unchanged
+        """
+        bundle_content = self._create_bundle(upload_dir_path)
+        sha256_digest = hashlib.sha256(bundle_content).hexdigest()
+
+        current_manifest = self._get_bundle_manifest()
+        if current_manifest is not None and current_manifest['sha256'] == sha256_digest:
+            self.logger.info('The config bundle of {} is unchanged, keeping version {}'.format(
+                upload_dir_path, current_manifest['version']))
+            return []
+
+        bundle_manifest: Dict[str, Any] = {
+            'version': current_manifest['version'] + 1 if current_manifest is not None else 1,
+            'sha256': sha256_digest,
+            'bundle_key': BUNDLE_KEY_FORMAT.format(sha256_digest),
+            'size': len(bundle_content),
+        }
+        self._bucket.put_object(Key=bundle_manifest['bundle_key'], Body=bundle_content)
+        self._bucket.put_object(Key=BUNDLE_MANIFEST_KEY,
+                                Body=json.dumps(bundle_manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+        self.logger.info('Uploaded directory: {} as config bundle version {}: {}'.format(
+            upload_dir_path, bundle_manifest['version'], bundle_manifest['bundle_key']))
+
+        return [bundle_manifest['bundle_key'], BUNDLE_MANIFEST_KEY]
+
+    @staticmethod
+    def _create_bundle(upload_dir_path: str) -> bytes:
+        """
+        Helper method for upload_directory to create the config bundle of a directory. The bundle only depends on the
+        names & contents of the files, so an unchanged directory always has the same bundle hash
+
+        :param upload_dir_path: the path to the local directory you want to upload
+        :return: the gzipped tar of the directory
+        """
+        bundle_buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=bundle_buffer, mode='wb', mtime=0) as gzip_file, \
+                tarfile.open(fileobj=gzip_file, mode='w', format=tarfile.PAX_FORMAT) as bundle_file:
+            for dir_path, dir_names, files in os.walk(upload_dir_path):
+                dir_names.sort()  # walk the child directories in order
+                for name in sorted(dir_names) + sorted(files):
+                    path = os.path.join(dir_path, name)
+                    tar_info = bundle_file.gettarinfo(path, S3._create_object_key(dir_path, upload_dir_path, name))
+                    tar_info.mtime = 0
+                    tar_info.uid = tar_info.gid = 0
+                    tar_info.uname = tar_info.gname = ''
+                    tar_info.mode = 0o755 if tar_info.isdir() else 0o644
+
+                    if tar_info.isfile():
+                        with open(path, 'rb') as file_:
+                            bundle_file.addfile(tar_info, file_)
+                    else:
+                        bundle_file.addfile(tar_info)
+
+        return bundle_buffer.getvalue()
+
     @staticmethod
     def _create_object_key(dir_path: str, upload_dir_path: str, object_file: str) -> str:
         """
@@ -0,0 +1,80 @@
+from dataclasses import dataclass
+from logging import Logger
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+from iris.utils.config_watcher import ConfigWatcher
+
+
+@dataclass
+class AWSSessionCache:
+    """
+    The AWSSessionCache keeps the boto3 sessions & resources of the Config Service across its runs. Building a session
+    parses the aws_credentials file & loads the service models, it is one of the most expensive things the Config
+    Service does, so a resource is only built once per service, aws profile, region & client config. Every cached
+    resource is dropped when the content of the aws_credentials file changes, so rotated credentials are picked up on
+    the next run
+
+    The resources are built on the Config Service's main thread, only their clients are shared with other threads
+
+    :param aws_creds_path: path to the aws_credentials file
+    :param logger: logger for forensics
+    """
+    aws_creds_path: str
+    logger: Logger
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the cached resources & the watcher of the aws_credentials file
+
+        :return: None
+        """
+        self._resources: Dict[Tuple[str, str, str, Optional[str]], Any] = {}
+        self._creds_watcher = ConfigWatcher(paths=[self.aws_creds_path], logger=self.logger)
+        self.sessions_created = 0
+
+    def get_resource(self, service_name: str, profile_name: str, region_name: str,
+                     config: Optional[Config] = None) -> Any:
+        """
+        Get the boto3 resource of a service for an aws profile, region & client config, built on the first call
+
+        :param service_name: the name of the aws service, ie s3 or ec2
+        :param profile_name: the aws profile in the aws_credentials file
+        :param region_name: the aws region
+        :param config: the botocore Config of the resource's client. A resource is built for each distinct config
+        :return: the boto3 resource
+        """
+        if self._creds_watcher.has_changed():
+            if self._resources:
+                self.logger.info('The aws_credentials changed, dropping {} cached aws resources'.format(
+                    len(self._resources)))
+                self._resources.clear()
+            self._creds_watcher.mark_applied()
+
+        resource_key = (service_name, profile_name, region_name, self._get_config_key(config))
+        resource = self._resources.get(resource_key)
+        if resource is None:
+            session = boto3.Session(profile_name=profile_name, region_name=region_name)
+            resource = session.resource(service_name, config=config)
+            self._resources[resource_key] = resource
+            self.sessions_created += 1
+            self.logger.info('Created the boto3 {} resource of aws profile {} in {}'.format(
+                service_name, profile_name, region_name))
+
+        return resource
+
+    @staticmethod
+    def _get_config_key(config: Optional[Config]) -> Optional[str]:
+        """
+        Helper method for get_resource to key a resource by the settings of its client config. A botocore Config has
+        no __eq__ or __hash__, and the callers build a new (equal) Config on each run
+
+        :param config: the botocore Config of the resource's client
+        :return: the settings of the config as a string, or None if there is no config
+        """
+        if config is None:
+            return None
+
+        return repr(sorted(vars(config).items()))
@@ -3,7 +3,7 @@ from dataclasses import dataclass
 from logging import Logger
 from typing import Any, Tuple, Dict, List
 
-from iris.config_service.configs import GlobalConfig, Metric, Profile
+from iris.config_service.configs import DEFAULT_MAX_OUTPUT_BYTES, GlobalConfig, Metric, Profile
 from iris.utils import util
 
 
@@ -98,8 +98,20 @@ class Linter:
             metric_type=metric_body['metric_type'],
             execution_frequency=metric_body['execution_frequency'],
             export_method=metric_body['export_method'],
-            bash_command=metric_body['bash_command'], help=metric_body['help'],
-            logger=self.logger
+            bash_command=metric_body.get('bash_command', ''),
+            help=metric_body['help'],
+            logger=self.logger,
+            argv=metric_body.get('argv'),
+            collector=metric_body.get('collector'),
+            collector_args=metric_body.get('collector_args'),
+            extract=metric_body.get('extract'),
+            output_format=metric_body.get('output_format', 'value'),
+            max_output_bytes=metric_body.get('max_output_bytes', DEFAULT_MAX_OUTPUT_BYTES),
+            max_cpu_seconds=metric_body.get('max_cpu_seconds'),
+            max_rss_mb=metric_body.get('max_rss_mb'),
+            nice=metric_body.get('nice'),
+            ioclass=metric_body.get('ioclass'),
+            overlap=metric_body.get('overlap', 'skip')
         )
 
     def _json_to_profile(self, profile_configs_path: str) -> Profile:
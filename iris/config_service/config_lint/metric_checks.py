@@ -0,0 +1,123 @@
+import re
+from logging import Logger
+from typing import Any, Dict
+
+# the checks of the Metric fields that configure the Scheduler's collectors, extract steps & output formats. They only
+# depend on the config, so the Config Service lints the metrics without importing the Scheduler modules
+
+# the native collectors of the Scheduler, see iris/scheduler/collectors.py
+valid_collectors = frozenset({'process_table', 'fd_count', 'loadavg', 'meminfo', 'logged_in_users'})
+
+# the args that each collector accepts in its collector_args
+valid_collector_args = {
+    'process_table': frozenset({'field', 'pattern', 'state', 'aggregate'}),
+    'fd_count': frozenset({'field'}),
+    'loadavg': frozenset({'period'}),
+    'meminfo': frozenset({'field'}),
+    'logged_in_users': frozenset({'unique'}),
+}
+
+# the fields of a ProcessInfo that a process_table query can match its pattern against
+valid_process_match_fields = frozenset({'comm', 'cmdline', 'user'})
+# the aggregations a process_table query can apply to the matching processes
+valid_process_aggregates = frozenset({'count', 'cpu_percent', 'mem_percent', 'rss_bytes'})
+# the values of /proc/sys/fs/file-nr that a fd_count metric can expose. open is allocated - unused
+valid_fd_count_fields = frozenset({'open', 'allocated', 'max'})
+# the load average periods (in minutes) of /proc/loadavg
+valid_loadavg_periods = (1, 5, 15)
+
+# the aggregations an extract step can apply to the values of the matching lines, see iris/scheduler/extract.py
+valid_extract_aggregates = frozenset({'sum', 'count', 'min', 'max', 'first'})
+valid_extract_args = frozenset({'pattern', 'column', 'aggregate'})
+
+# the output formats of a metric's command, see iris/scheduler/output_formats.py
+valid_output_formats = frozenset({'value', 'labeled', 'prometheus', 'json'})
+
+
+def check_collector_args(collector: str, collector_args: Dict[str, Any], logger: Logger) -> bool:
+    """
+    Check if the collector exists and its args are valid. Used when the Metric is linted
+
+    :param collector: the name of the collector
+    :param collector_args: the args/query of the collector
+    :param logger: logger for forensics
+    :return: True if valid, else logs the error and raises ValueError
+    """
+    err_msg = None
+    if collector not in valid_collectors:
+        err_msg = 'Invalid collector: {} not one of valid collectors: {}'.format(collector, valid_collectors)
+
+    elif set(collector_args) - valid_collector_args[collector]:
+        unknown_args = set(collector_args) - valid_collector_args[collector]
+        err_msg = 'Invalid {} collector args: {}'.format(collector, ', '.join(sorted(unknown_args)))
+
+    elif collector == 'process_table':
+        match_field = collector_args.get('field', 'comm')
+        aggregate = collector_args.get('aggregate', 'count')
+
+        if match_field not in valid_process_match_fields:
+            err_fmt = 'Invalid process_table query field: {} not one of valid fields: {}'
+            err_msg = err_fmt.format(match_field, valid_process_match_fields)
+        elif aggregate not in valid_process_aggregates:
+            err_fmt = 'Invalid process_table query aggregate: {} not one of valid aggregates: {}'
+            err_msg = err_fmt.format(aggregate, valid_process_aggregates)
+        else:
+            try:
+                re.compile(collector_args.get('pattern', ''))
+            except re.error as e:
+                err_msg = 'Invalid process_table query pattern: {}. Err: {}'.format(collector_args['pattern'], e)
+
+    elif collector == 'fd_count' and collector_args.get('field', 'open') not in valid_fd_count_fields:
+        err_fmt = 'Invalid fd_count field: {} not one of valid fields: {}'
+        err_msg = err_fmt.format(collector_args['field'], valid_fd_count_fields)
+
+    elif collector == 'loadavg' and collector_args.get('period', 1) not in valid_loadavg_periods:
+        err_fmt = 'Invalid loadavg period: {} not one of valid periods: {}'
+        err_msg = err_fmt.format(collector_args['period'], valid_loadavg_periods)
+
+    elif collector == 'meminfo' and not isinstance(collector_args.get('field'), str):
+        err_msg = 'Invalid meminfo field: {}. Must be a /proc/meminfo field, ie MemAvailable'.format(
+            collector_args.get('field'))
+
+    elif collector == 'logged_in_users' and not isinstance(collector_args.get('unique', False), bool):
+        err_msg = 'Invalid logged_in_users unique: {}. Must be a boolean'.format(collector_args['unique'])
+
+    if err_msg:
+        logger.error(err_msg)
+        raise ValueError(err_msg)
+
+    return True
+
+
+def check_extract_args(extract: Dict[str, Any], logger: Logger) -> bool:
+    """
+    Check if the extract step of a Metric is valid. Used when the Metric is linted
+
+    :param extract: the extract step. pattern (a regex searched in each line of the command output), column (the 1
+    based whitespace separated column of the matching lines, like awk's $N) & aggregate
+    :param logger: logger for forensics
+    :return: True if valid, else logs the error and raises ValueError
+    """
+    err_msg = None
+    unknown_args = set(extract) - valid_extract_args
+    column = extract.get('column', 1)
+    aggregate = extract.get('aggregate', 'sum')
+
+    if unknown_args:
+        err_msg = 'Invalid extract args: {}'.format(', '.join(sorted(unknown_args)))
+    elif not isinstance(column, int) or isinstance(column, bool) or column < 1:
+        err_msg = 'Invalid extract column: {} must be an int >= 1'.format(column)
+    elif aggregate not in valid_extract_aggregates:
+        err_msg = 'Invalid extract aggregate: {} not one of valid aggregates: {}'.format(
+            aggregate, valid_extract_aggregates)
+    else:
+        try:
+            re.compile(extract.get('pattern', ''))
+        except re.error as e:
+            err_msg = 'Invalid extract pattern: {}. Err: {}'.format(extract['pattern'], e)
+
+    if err_msg:
+        logger.error(err_msg)
+        raise ValueError(err_msg)
+
+    return True
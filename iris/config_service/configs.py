@@ -1,8 +1,15 @@
-from dataclasses import dataclass
+import shlex
+import shutil
+from dataclasses import InitVar, dataclass, field
 from logging import Logger
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
 
+from iris.config_service.config_lint import metric_checks
 from iris.utils import util
+from iris.utils.util import add_slots
+
+# the default max bytes of a metric command's stdout (& of the stderr tail) that the Scheduler keeps
+DEFAULT_MAX_OUTPUT_BYTES = 2 ** 20
 
 
 @dataclass
@@ -42,60 +49,232 @@ class GlobalConfig:
         return template.format(self.exec_timeout, self.min_exec_freq, self.max_exec_freq)
 
 
-@dataclass
+@add_slots
+@dataclass(frozen=True)
 class Metric:
     """
-    A Metric object that contains all of the metadata of the check/metric that needs to be executed/ran
+    A Metric object that contains all of the metadata of the check/metric that needs to be executed/ran. Metrics are
+    immutable & slotted records, as a host keeps thousands of them, use dataclasses.replace to derive a changed Metric
 
-    :param gc: the GlobalConfig object
+    :param gc: the GlobalConfig object the Metric is checked against & its execution_timeout is resolved from. It is
+    not kept on the Metric
     :param name: the metric name
     :param metric_type: the type of the metric, see valid_metric_types above
     :param execution_frequency: the metric_execution frequency
     :param export_method: the export method the metric uses to expose itself, see valid_export_methods above
     :param bash_command: the bash command that Iris actually runs to get the result of this metric
     :param help: the help string that describes what the metric does
-    :param logger: logger for forensics
+    :param logger: logger for forensics, only used to check the Metric
+    :param argv: the program & arguments that Iris runs directly (without /bin/sh) to get the result of this metric.
+    Optional, it is derived from bash_command when the command has no shell syntax, see _get_exec_argv
+    :param collector: the native collector that Iris runs in process (instead of a command) to get the result of this
+    metric. Optional, see iris/scheduler/collectors.py
+    :param collector_args: the args/query of the collector
+    :param extract: the step that extracts the result of this metric from the output of its command, so metrics that
+    share a command can share a single run of it. Optional, see iris/scheduler/extract.py
+    :param output_format: how the output of the command is parsed. value (default) for a single number, else labeled,
+    prometheus or json for many labeled samples of the metric, see iris/scheduler/output_formats.py
+    :param max_output_bytes: the max bytes of stdout the command may output. The command is stopped once it outputs
+    more, and only the last max_output_bytes of its stderr are kept
+    :param max_cpu_seconds: the max cpu seconds the command may use before it is killed. Optional
+    :param max_rss_mb: the max memory in MB the command may allocate. Optional
+    :param nice: the nice value (0 to 19) the command runs with, so it can't starve the host's workload. Optional
+    :param ioclass: the io scheduling class (best-effort or idle) the command runs with. Optional
+    :param overlap: what the Scheduler does when the metric comes due while its previous run is still running, see
+    valid_overlaps. skip (default) drops the new run, queue-one runs it once the previous run finishes (at most one run
+    is queued) and kill-previous stops the previous run and starts the new one
     """
-    gc: GlobalConfig
+    gc: InitVar[GlobalConfig]
     name: str
     metric_type: str
     execution_frequency: int
     export_method: str
     bash_command: str
     help: str
-    logger: Logger
+    logger: InitVar[Logger]
+    argv: Optional[List[str]] = None
+    collector: Optional[str] = None
+    collector_args: Optional[Dict[str, Any]] = None
+    extract: Optional[Dict[str, Any]] = None
+    output_format: str = 'value'
+    max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES
+    max_cpu_seconds: Optional[int] = None
+    max_rss_mb: Optional[int] = None
+    nice: Optional[int] = None
+    ioclass: Optional[str] = None
+    overlap: str = 'skip'
+    execution_timeout: float = field(init=False)  # resolved from the execution_frequency & the GlobalConfig
+
+    # frozen only guards the fields from reassignment, the argv, collector_args & extract are mutable lists/dicts, so
+    # the Metric is explicitly unhashable instead of getting a dataclass __hash__ that raises on them
+    __hash__ = None  # type: ignore
 
     valid_metric_types = frozenset({'counter', 'gauge', 'histogram', 'summary'})
+    valid_ioclasses = frozenset({'best-effort', 'idle'})
+    valid_overlaps = frozenset({'skip', 'queue-one', 'kill-previous'})
     valid_export_methods = frozenset({'textfile', 'pushgateway'})
 
-    def __post_init__(self) -> None:
+    # characters that need /bin/sh to be interpreted (pipes, redirects, expansions, quoting, globs, subshells, etc)
+    shell_syntax_chars = frozenset('|&;<>()$`\\"\'*?[]{}\n')
+    # shell builtins & keywords that either have no binary or behave differently when run without a shell
+    shell_builtins = frozenset({
+        '.', ':', '!', '[', '[[', 'alias', 'bg', 'break', 'builtin', 'case', 'cd', 'command', 'continue', 'declare',
+        'eval', 'exec', 'exit', 'export', 'fg', 'for', 'function', 'getopts', 'hash', 'if', 'jobs', 'let', 'local',
+        'read', 'readonly', 'return', 'select', 'set', 'shift', 'source', 'time', 'times', 'trap', 'type', 'typeset',
+        'ulimit', 'umask', 'unalias', 'unset', 'until', 'wait', 'while'
+    })
+
+    def __post_init__(self, gc: GlobalConfig, logger: Logger) -> None:
         """
-        Check if the format of the Metric is correct
+        Check if the format of the Metric is correct & resolve its execution_timeout. The derived fields are set with
+        object.__setattr__ since the Metric is frozen
 
+        :param gc: the GlobalConfig object
+        :param logger: logger for forensics
         :return: None, raises ValueError if the fields are not set correctly
         """
         if self.metric_type not in self.valid_metric_types:
             err_fmt = 'Invalid metric: {}, metric_type: {} not one of valid types: {}'
             err_msg = err_fmt.format(self.name, self.metric_type, self.valid_metric_types)
-            self.logger.error(err_msg)
+            logger.error(err_msg)
             raise ValueError(err_msg)
 
         if self.export_method not in self.valid_export_methods:
             err_fmt = 'Invalid metric: {}, export_method: {} not in valid methods: {}'
             err_msg = err_fmt.format(self.name, self.export_method, self.valid_export_methods)
-            self.logger.error(err_msg)
+            logger.error(err_msg)
             raise ValueError(err_msg)
 
-        if not self.gc.min_exec_freq <= self.execution_frequency <= self.gc.max_exec_freq:
+        if not gc.min_exec_freq <= self.execution_frequency <= gc.max_exec_freq:
             err_fmt = 'Invalid metric: {}, exec_freq: {} not between {} & {}'
-            err_msg = err_fmt.format(self.name, self.execution_frequency, self.gc.min_exec_freq, self.gc.max_exec_freq)
-            self.logger.error(err_msg)
+            err_msg = err_fmt.format(self.name, self.execution_frequency, gc.min_exec_freq, gc.max_exec_freq)
+            logger.error(err_msg)
             raise ValueError(err_msg)
 
-        if self.execution_frequency <= self.gc.exec_timeout:
-            self.execution_timeout = self.execution_frequency - 1
+        if self.execution_frequency <= gc.exec_timeout:
+            object.__setattr__(self, 'execution_timeout', self.execution_frequency - 1)
+        else:
+            object.__setattr__(self, 'execution_timeout', gc.exec_timeout)
+
+        if self.collector is not None:
+            if self.bash_command or self.argv:
+                err_msg = 'Invalid metric: {}, set either a collector or a bash_command/argv'.format(self.name)
+                logger.error(err_msg)
+                raise ValueError(err_msg)
+
+            collector_args = self.collector_args or {}
+            object.__setattr__(self, 'collector_args', collector_args)
+            metric_checks.check_collector_args(self.collector, collector_args, logger)
+
+        elif self.argv is not None:
+            if not self.argv or not all(isinstance(arg, str) and arg for arg in self.argv):
+                err_fmt = 'Invalid metric: {}, argv: {} must be a list of non empty strings'
+                err_msg = err_fmt.format(self.name, self.argv)
+                logger.error(err_msg)
+                raise ValueError(err_msg)
+
+            if not self.bash_command:
+                object.__setattr__(self, 'bash_command', ' '.join(shlex.quote(arg) for arg in self.argv))
+
+        elif self.bash_command:
+            object.__setattr__(self, 'argv', self._get_exec_argv(self.bash_command))
+
         else:
-            self.execution_timeout = self.gc.exec_timeout
+            err_msg = 'Invalid metric: {}, either bash_command, argv or collector must be set'.format(self.name)
+            logger.error(err_msg)
+            raise ValueError(err_msg)
+
+        if self.extract is not None:
+            if self.collector is not None:
+                err_msg = 'Invalid metric: {}, an extract step only applies to a bash_command/argv'.format(self.name)
+                logger.error(err_msg)
+                raise ValueError(err_msg)
+
+            metric_checks.check_extract_args(self.extract, logger)
+
+        if self.output_format not in metric_checks.valid_output_formats:
+            err_fmt = 'Invalid metric: {}, output_format: {} not one of valid formats: {}'
+            err_msg = err_fmt.format(self.name, self.output_format, metric_checks.valid_output_formats)
+            logger.error(err_msg)
+            raise ValueError(err_msg)
+
+        if not isinstance(self.max_output_bytes, int) or self.max_output_bytes < 1:
+            err_msg = 'Invalid metric: {}, max_output_bytes: {} must be an int >= 1'.format(
+                self.name, self.max_output_bytes)
+            logger.error(err_msg)
+            raise ValueError(err_msg)
+
+        self._check_resource_limits(logger)
+
+        if self.overlap not in self.valid_overlaps:
+            err_msg = 'Invalid metric: {}, overlap: {} not one of valid overlaps: {}'.format(
+                self.name, self.overlap, self.valid_overlaps)
+            logger.error(err_msg)
+            raise ValueError(err_msg)
+
+        if self.output_format != 'value' and (self.collector is not None or self.extract is not None):
+            err_msg = 'Invalid metric: {}, output_format: {} only applies to a bash_command/argv without an ' \
+                      'extract step'.format(self.name, self.output_format)
+            logger.error(err_msg)
+            raise ValueError(err_msg)
+
+    def _check_resource_limits(self, logger: Logger) -> None:
+        """
+        Helper method to check the optional resource limits of the Metric, see iris/scheduler/metric_process.py
+
+        :param logger: logger for forensics
+        :return: None, raises ValueError if the fields are not set correctly
+        """
+        err_msg = None
+        for limit_name in ('max_cpu_seconds', 'max_rss_mb'):
+            limit = getattr(self, limit_name)
+            if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+                err_msg = 'Invalid metric: {}, {}: {} must be an int >= 1'.format(self.name, limit_name, limit)
+
+        if self.nice is not None and (not isinstance(self.nice, int) or not 0 <= self.nice <= 19):
+            err_msg = 'Invalid metric: {}, nice: {} must be an int between 0 & 19'.format(self.name, self.nice)
+
+        if self.ioclass is not None and self.ioclass not in self.valid_ioclasses:
+            err_fmt = 'Invalid metric: {}, ioclass: {} not one of valid classes: {}'
+            err_msg = err_fmt.format(self.name, self.ioclass, self.valid_ioclasses)
+
+        if self.has_resource_limits() and self.collector is not None:
+            err_msg = 'Invalid metric: {}, resource limits only apply to a bash_command/argv'.format(self.name)
+
+        if err_msg:
+            logger.error(err_msg)
+            raise ValueError(err_msg)
+
+    def has_resource_limits(self) -> bool:
+        """
+        Check if the Metric sets any resource limit
+
+        :return: True if the Metric sets max_cpu_seconds, max_rss_mb, nice or ioclass, else False
+        """
+        return any(limit is not None for limit in (self.max_cpu_seconds, self.max_rss_mb, self.nice, self.ioclass))
+
+    def _get_exec_argv(self, bash_command: str) -> Optional[List[str]]:
+        """
+        Helper method to detect if the bash_command is a single program with arguments that can be executed directly,
+        which saves the Scheduler a /bin/sh fork/exec on every run of the metric
+
+        :param bash_command: the bash command of the metric
+        :return: the argv list of the command if it has no shell syntax and its program is on the PATH, else None
+        """
+        if any(char in self.shell_syntax_chars for char in bash_command):
+            return None
+
+        argv = bash_command.split()
+        if not argv or argv[0] in self.shell_builtins or '=' in argv[0]:
+            return None
+
+        if any(arg[0] in '~#' for arg in argv):  # tilde expansion & comments
+            return None
+
+        if not shutil.which(argv[0]):  # let /bin/sh report the missing command like it always has
+            return None
+
+        return argv
 
     def __str__(self) -> str:
         """
@@ -106,16 +285,15 @@ class Metric:
         template = 'Metric {} of type {}. It runs every {} secs. The command is: {}'
         return template.format(self.name, self.metric_type, self.execution_frequency, self.bash_command)
 
-    def to_json(self) -> Dict[str, str]:
+    def to_json(self) -> Dict[str, Any]:
         """
         Get the json format of this Metric. Used when we figure out which metrics the ec2 host must run and we need to
-        create the local_config.json for the Scheduler to read and run.
+        create the local_config.json for the Scheduler to read and run. The Metric is left untouched & its field values
+        are not copied, so the dict must not be modified
 
         :return: a dict containing representation of the Metric and its fields
         """
-        self.__dict__.pop('gc')
-        self.__dict__.pop('logger')
-        return self.__dict__
+        return {field_name: getattr(self, field_name) for field_name in self.__slots__}  # type: ignore
 
 
 @dataclass
@@ -1,11 +1,16 @@
+import hashlib
 import json
 import os
-import tempfile
 import time
+from multiprocessing.connection import Connection
+from typing import List, Optional, Tuple
 
 from iris.config_service.aws.ec2_tags import EC2Tags, MissingIrisTagsError
-from iris.config_service.aws.s3 import S3
+from iris.config_service.aws.s3 import S3, S3SyncStats
+from iris.config_service.aws.session_cache import AWSSessionCache
 from iris.config_service.config_lint.linter import Linter
+from iris.config_service.snapshot import ConfigSnapshot, get_file_digest
+from iris.utils.config_notifier import ConfigPublisher
 from iris.utils.iris_logging import get_logger
 from iris.utils.prom_helpers import PromStrBuilder, PromFileWriter
 
@@ -13,7 +18,10 @@ from iris.utils.prom_helpers import PromStrBuilder, PromFileWriter
 def run_config_service(aws_creds_path: str, s3_region_name: str, s3_bucket_env: str, s3_bucket_name: str,
                        s3_download_to_path: str, ec2_region_name: str, ec2_dev_instance_id: str, ec2_metadata_url: str,
                        local_config_path: str, prom_dir_path: str, run_frequency: float, log_path: str,
-                       log_debug_path: str, dev_mode: bool) -> None:
+                       log_debug_path: str, dev_mode: bool,
+                       config_change_connections: Optional[List[Connection]] = None,
+                       local_config_snapshot_path: Optional[str] = None, kept_download_versions: int = 3,
+                       s3_download_workers: int = 10, s3_bundle: bool = False) -> None:
     """
     Run the Config Service with each of its components (S3, Linter, EC2Tags)
 
@@ -33,10 +41,34 @@ def run_config_service(aws_creds_path: str, s3_region_name: str, s3_bucket_env:
     :param log_path: the path to the config_service log file
     :param log_debug_path: the path to the iris.debug file that triggers when we want to enable verbose logging
     :param dev_mode: set to True when you want to run in dev mode, see readme & iris.cfg
+    :param config_change_connections: the send ends of the pipes that notify the Scheduler & the Garbage Collector
+    when the local_config changed, see ConfigPublisher
+    :param local_config_snapshot_path: the path we want to write the precompiled ConfigSnapshot of the local_config to.
+    None only writes the local_config json
+    :param kept_download_versions: the number of versions of the s3_download_to_path directory that are kept for
+    rollback, see S3.download_bucket
+    :param s3_download_workers: the number of s3 objects downloaded at once
+    :param s3_bundle: set to True to sync the configs from the config bundle of the bucket, see S3.upload_directory
     :return: None
     """
     logger = get_logger('iris.config_service', log_path, log_debug_path)
 
+    config_publisher = ConfigPublisher(connections=config_change_connections or [], logger=logger)
+    s3_sync_stats = S3SyncStats(logger=logger)
+    # the boto3 sessions & resources are built once and reused by every run, until the aws_credentials change
+    aws_session_cache = AWSSessionCache(aws_creds_path=aws_creds_path, logger=logger)
+
+    def validate_download(staged_download_path: str) -> None:
+        # lint the staged configs, so a broken bucket never replaces the configs the Scheduler & GC are running with
+        staged_linter = Linter(logger)
+        staged_global_config = staged_linter.lint_global_config(
+            os.path.join(staged_download_path, 'global_config.json'))
+        staged_linter.lint_metrics_config(staged_global_config, os.path.join(staged_download_path, 'metrics.json'))
+        staged_linter.lint_profile_configs(os.path.join(staged_download_path, 'profiles'))
+
+    # the (global_config, local_config) digests of the snapshot known to be on disk, None until it was checked
+    current_snapshot_digests: Optional[Tuple[str, str]] = None
+
     general_error_flag = False
     missing_iris_tags_error_flag = False
     while True:
@@ -44,7 +76,7 @@ def run_config_service(aws_creds_path: str, s3_region_name: str, s3_bucket_env:
         try:
             logger.info('Resuming the Config_Service')
 
-            logger.info('Downloading content from s3 bucket: {} to dir: {}'.format(s3_bucket_name, s3_download_to_path))
+            logger.info('Syncing content from s3 bucket: {} to dir: {}'.format(s3_bucket_name, s3_download_to_path))
 
             s3 = S3(
                 aws_creds_path=aws_creds_path,
@@ -52,10 +84,15 @@ def run_config_service(aws_creds_path: str, s3_region_name: str, s3_bucket_env:
                 bucket_environment=s3_bucket_env,
                 bucket_name=s3_bucket_name,
                 dev_mode=dev_mode,
-                logger=logger
+                logger=logger,
+                sync_stats=s3_sync_stats,
+                kept_versions=kept_download_versions,
+                download_workers=s3_download_workers,
+                bundle=s3_bundle,
+                session_cache=aws_session_cache
             )
 
-            s3.download_bucket(s3_download_to_path)
+            s3.download_bucket(s3_download_to_path, validate_download)
 
             # run linter to transform downloaded s3 configs into Python objects. Also lints the configs for errors
             global_config_path = os.path.join(s3_download_to_path, 'global_config.json')
@@ -83,7 +120,8 @@ def run_config_service(aws_creds_path: str, s3_region_name: str, s3_bucket_env:
                 ec2_metadata_url=ec2_metadata_url,
                 dev_instance_id=ec2_dev_instance_id,
                 dev_mode=dev_mode,
-                logger=logger
+                logger=logger,
+                session_cache=aws_session_cache
             )
 
             ec2_iris_tags = ec2.get_iris_tags()
@@ -98,21 +136,56 @@ def run_config_service(aws_creds_path: str, s3_region_name: str, s3_bucket_env:
                 raise KeyError(err_msg)
 
             local_config_metrics = {}
+            snapshot_metrics = {}
             for prof_metric in profiles[iris_profile].metrics:
                 if prof_metric not in metrics:
                     err_msg = 'Metric {} in profile {} not defined in metrics config'.format(prof_metric, iris_profile)
                     logger.error(err_msg)
                     raise KeyError(err_msg)
 
+                snapshot_metrics[prof_metric] = metrics[prof_metric]
                 local_config_metrics[prof_metric] = metrics[prof_metric].to_json()
 
             logger.info('Generated the local_config object')
 
-            with tempfile.NamedTemporaryFile('w', delete=False) as tmpfile:
-                json.dump(local_config_metrics, tmpfile, indent=2)
-            os.rename(tmpfile.name, local_config_path)
+            local_config_content = json.dumps(local_config_metrics, indent=2)
 
-            logger.info('Finished writing to local_config file at {}'.format(local_config_path))
+            snapshot_digests = (
+                get_file_digest(global_config_path),
+                hashlib.sha256(local_config_content.encode('utf-8')).hexdigest()
+            )
+
+            def write_snapshot() -> None:
+                nonlocal current_snapshot_digests
+                if local_config_snapshot_path is None:
+                    return
+
+                snapshot = ConfigSnapshot(
+                    global_config_digest=snapshot_digests[0],
+                    local_config_digest=snapshot_digests[1],
+                    metrics=snapshot_metrics
+                )
+                snapshot.write(local_config_snapshot_path)
+                current_snapshot_digests = snapshot_digests
+                logger.info('Finished writing the local_config snapshot at {}'.format(local_config_snapshot_path))
+
+            def snapshot_stale() -> bool:
+                # the snapshot on disk is only read back after a restart of the service or a global_config change
+                nonlocal current_snapshot_digests
+                if local_config_snapshot_path is None or current_snapshot_digests == snapshot_digests:
+                    return False
+
+                if ConfigSnapshot.load(local_config_snapshot_path, *snapshot_digests, logger=logger) is None:
+                    return True
+
+                current_snapshot_digests = snapshot_digests
+                return False
+
+            # only written (and the scheduler & garbage collector notified) when the resolved metric set changed. The
+            # snapshot is written first, so the consumers never see a local_config without its snapshot. It is also
+            # rewritten on its own when it is missing or stale, ie after a global_config only change or an Iris upgrade
+            if config_publisher.publish(local_config_path, local_config_content, write_snapshot, snapshot_stale):
+                logger.info('Finished writing to local_config file at {}'.format(local_config_path))
 
             general_error_flag = False
             missing_iris_tags_error_flag = False
@@ -151,6 +224,10 @@ def run_config_service(aws_creds_path: str, s3_region_name: str, s3_bucket_env:
             prom_writer.write_prom_file(general_error_prom_file_path, general_error_prom_string)
             prom_writer.write_prom_file(missing_iris_tags_prom_file_path, missing_iris_tags_prom_string)
 
+            # expose the objects & bytes the s3 syncs fetched, skipped & deleted, so we see the S3 traffic Iris saves
+            s3_sync_prom_file_path = os.path.join(prom_dir_path, 'iris_config_service_s3_sync.prom')
+            prom_writer.write_prom_file(s3_sync_prom_file_path, *s3_sync_stats.get_prom_strings())
+
             logger.info('Sleeping the Config_Service for {}\n'.format(run_frequency))
 
             time.sleep(run_frequency)
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import pickle
+from dataclasses import dataclass
+from logging import Logger
+from typing import Dict, Optional
+
+from iris.config_service.config_lint.linter import Linter
+from iris.config_service.configs import Metric
+from iris.utils.config_watcher import ConfigWatcher
+from iris.utils.prom_helpers import PromStrBuilder
+
+# bumped whenever the layout of the ConfigSnapshot or of the Metric objects changes, so consumers running another
+# version of Iris fall back to linting the local_config instead of loading objects they can't use
+SNAPSHOT_FORMAT_VERSION = 3
+
+
+@dataclass
+class ConfigSnapshot:
+    """
+    A ConfigSnapshot is the precompiled form of the local_config: the validated Metric objects (with their resolved
+    execution_timeout) and the prom file name & prom header of each metric, pickled by the Config Service next to the
+    local_config. The Scheduler & the Garbage Collector load it instead of re-linting the local_config, the
+    local_config json stays the human readable view. The snapshot is tied to the exact global_config & local_config it
+    was built from by their content hashes, so a stale snapshot or a hand edited local_config is never trusted
+
+    The snapshot is a pickle, it must only be loaded from the iris_root_path that only the Iris services write to
+
+    :param global_config_digest: the sha256 hex digest of the global_config the metrics were validated against
+    :param local_config_digest: the sha256 hex digest of the local_config json the snapshot was built with
+    :param metrics: the validated Metric objects of the local_config, by name
+    :param format_version: the SNAPSHOT_FORMAT_VERSION the snapshot was written with
+    """
+    global_config_digest: str
+    local_config_digest: str
+    metrics: Dict[str, Metric]
+    format_version: int = SNAPSHOT_FORMAT_VERSION
+
+    def __post_init__(self) -> None:
+        """
+        Precompute the prom file name & the prom header (its HELP & TYPE lines) of each metric. They are pickled with
+        the snapshot, so the Scheduler doesn't format them on every run
+
+        :return: None
+        """
+        self.prom_file_names = {name: '{}.prom'.format(name) for name in self.metrics}
+        self.prom_headers = {
+            name: PromStrBuilder.create_prom_header(name, metric.help, metric.metric_type)
+            for name, metric in self.metrics.items()
+        }
+
+    def write(self, snapshot_path: str) -> None:
+        """
+        Atomically write the snapshot to snapshot_path
+
+        :param snapshot_path: the path to write the snapshot to
+        :return: None
+        """
+        tmp_file_path = '{}.tmp'.format(snapshot_path)
+        with open(tmp_file_path, 'wb') as snapshot_file:
+            pickle.dump(self, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_file_path, snapshot_path)  # Atomically update the snapshot file
+
+    @classmethod
+    def load(cls, snapshot_path: str, global_config_digest: Optional[str], local_config_digest: Optional[str],
+             logger: Logger) -> Optional['ConfigSnapshot']:
+        """
+        Load the snapshot at snapshot_path if it was built from the global_config & local_config with these digests
+
+        :param snapshot_path: the path to the snapshot
+        :param global_config_digest: the sha256 hex digest of the current global_config
+        :param local_config_digest: the sha256 hex digest of the current local_config
+        :param logger: logger for forensics
+        :return: the ConfigSnapshot, or None if it is missing, stale or unreadable
+        """
+        try:
+            with open(snapshot_path, 'rb') as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:  # ie a snapshot of an older Iris whose classes changed
+            logger.warning('Could not load the config snapshot {}. Err: {}'.format(snapshot_path, e))
+            return None
+
+        if not isinstance(snapshot, cls) or snapshot.format_version != SNAPSHOT_FORMAT_VERSION:
+            logger.warning('Ignoring the config snapshot {}, its format is outdated'.format(snapshot_path))
+            return None
+
+        if (snapshot.global_config_digest, snapshot.local_config_digest) != (global_config_digest, local_config_digest):
+            logger.info('Ignoring the config snapshot {}, it is stale'.format(snapshot_path))
+            return None
+
+        return snapshot
+
+
+def get_file_digest(path: str) -> str:
+    """
+    Get the content hash of a config file, the same hash the ConfigWatcher uses
+
+    :param path: the path to the config file
+    :return: the sha256 hex digest of the file
+    """
+    with open(path, 'rb') as config_file:
+        return hashlib.sha256(config_file.read()).hexdigest()
+
+
+def load_local_config(global_config_path: str, local_config_path: str, snapshot_path: Optional[str],
+                      config_watcher: ConfigWatcher, linter: Linter, logger: Logger) -> ConfigSnapshot:
+    """
+    Load the ConfigSnapshot of the local_config, or lint the global_config & local_config into a new (unwritten)
+    ConfigSnapshot if there is no snapshot of their current content
+
+    :param global_config_path: the path to the GlobalConfig object pulled down by the Config Service
+    :param local_config_path: the path to the local config object created by the Config Service
+    :param snapshot_path: the path to the ConfigSnapshot of the local_config. None always lints the local_config
+    :param config_watcher: the ConfigWatcher of the global_config & local_config, it has their current content hashes
+    :param linter: the Linter used when there is no usable snapshot
+    :param logger: logger for forensics
+    :return: the ConfigSnapshot of the local_config, its metrics are the Metric objects of the local_config by name
+    """
+    global_config_digest = config_watcher.get_hash(global_config_path)
+    local_config_digest = config_watcher.get_hash(local_config_path)
+    if snapshot_path is not None:
+        snapshot = ConfigSnapshot.load(
+            snapshot_path=snapshot_path,
+            global_config_digest=global_config_digest,
+            local_config_digest=local_config_digest,
+            logger=logger
+        )
+        if snapshot is not None:
+            logger.info('Loaded the local_config metrics from the config snapshot {}'.format(snapshot_path))
+            return snapshot
+
+    logger.info('Starting linter to transform the config files created by the config_service into python objs')
+
+    global_config_obj = linter.lint_global_config(global_config_path)
+    return ConfigSnapshot(
+        global_config_digest=global_config_digest or '',
+        local_config_digest=local_config_digest or '',
+        metrics=linter.lint_metrics_config(global_config_obj, local_config_path)
+    )
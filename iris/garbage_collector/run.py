@@ -1,17 +1,25 @@
 import os
-import time
-from typing import Tuple
+from multiprocessing.connection import Connection
+from typing import Dict, Optional, Tuple
 
 from iris.config_service.config_lint.linter import Linter
+from iris.config_service.configs import Metric
+from iris.config_service.snapshot import load_local_config
 from iris.garbage_collector.garbage_collector import GarbageCollector
+from iris.utils.config_notifier import ConfigSubscriber
+from iris.utils.config_watcher import ConfigWatcher
 from iris.utils.iris_logging import get_logger
 from iris.utils.prom_helpers import PromStrBuilder, PromFileWriter
 
 
 def run_garbage_collector(global_config_path: str, local_config_path: str, prom_dir_path: str, run_frequency: float,
-                          internal_metrics_whitelist: Tuple[str], log_path: str, log_debug_path: str, ) -> None:
+                          internal_metrics_whitelist: Tuple[str], log_path: str, log_debug_path: str,
+                          config_change_connection: Optional[Connection] = None,
+                          local_config_snapshot_path: Optional[str] = None) -> None:
     """
-    Run the Garbage Collector
+    Run the Garbage Collector. The configs are only re-linted when their content changed (see ConfigWatcher), and the
+    Garbage Collector runs as soon as the Config Service publishes a new local_config (see ConfigSubscriber). The
+    metrics are loaded from the ConfigSnapshot of the local_config when it is up to date (see load_local_config)
 
     :param global_config_path: the path to the GlobalConfig object pulled down by the Config Service
     :param local_config_path: the path to the local config object created by the Config Service
@@ -20,25 +28,38 @@ def run_garbage_collector(global_config_path: str, local_config_path: str, prom_
     :param internal_metrics_whitelist: a list of internal metrics that we don't want the Garbage Collector to delete
     :param log_path: the path to the scheduler log file
     :param log_debug_path: the path to the iris.debug file that triggers when we want to enable verbose logging
+    :param config_change_connection: the receive end of the pipe the Config Service notifies when the local_config
+    changed. None only runs the Garbage Collector every run_frequency seconds
+    :param local_config_snapshot_path: the path to the precompiled ConfigSnapshot of the local_config written by the
+    Config Service. None always lints the local_config
     :return: None
     """
     logger = get_logger('iris.garbage_collector', log_path, log_debug_path)
 
     prom_writer = PromFileWriter(logger=logger)
+    linter = Linter(logger=logger)
+    config_watcher = ConfigWatcher(paths=[global_config_path, local_config_path], logger=logger)
+    config_subscriber = ConfigSubscriber(connection=config_change_connection, logger=logger)
+    local_config_obj: Dict[str, Metric] = {}
     general_error_flag = False
     while True:
         try:
             logger.info('Resuming the Garbage_Collector')
 
-            logger.info('Starting linter to transform the configs created by the config_service into python objs')
-
-            linter = Linter(logger=logger)
-
-            try:
-                global_config_obj = linter.lint_global_config(global_config_path)
-                local_config_obj = linter.lint_metrics_config(global_config_obj, local_config_path)
-            except OSError:
-                local_config_obj = {}
+            if config_watcher.has_changed():
+                try:
+                    local_config_obj = load_local_config(
+                        global_config_path=global_config_path,
+                        local_config_path=local_config_path,
+                        snapshot_path=local_config_snapshot_path,
+                        config_watcher=config_watcher,
+                        linter=linter,
+                        logger=logger
+                    ).metrics
+                except OSError:
+                    local_config_obj = {}
+
+                config_watcher.mark_applied()
 
             gc = GarbageCollector(
                 local_config_obj=local_config_obj,
@@ -82,6 +103,7 @@ def run_garbage_collector(global_config_path: str, local_config_path: str, prom_
             prom_file_path = os.path.join(prom_dir_path, '{}.prom'.format(metric_name))
             prom_writer.write_prom_file(prom_file_path, prom_string)
 
-            logger.info('Sleeping the Garbage Collector for {} seconds\n'.format(run_frequency))
+            logger.info('Sleeping the Garbage Collector for {} seconds or until the local_config changes\n'.format(
+                run_frequency))
 
-            time.sleep(run_frequency)
+            config_subscriber.wait(run_frequency)
@@ -25,8 +25,14 @@ internal_metrics_whitelist = (
     'iris_main',
     'iris_config_service',
     'iris_config_service_error',
+    'iris_config_service_s3_sync',
     'iris_scheduler',
     'iris_scheduler_error',
+    'iris_scheduler_admission',
+    'iris_scheduler_command_cache',
+    'iris_scheduler_processes',
+    'iris_scheduler_stats',
+    'iris_scheduler_backoff',
     'iris_garbage_collector',
     'iris_garbage_collector_error',
     'iris_garbage_collector_deleted_stale_files',
@@ -61,6 +67,7 @@ def run_iris(logger: logging.Logger, iris_config: ConfigParser) -> None:
         aws_credentials_path = os.path.join(iris_root_path, 'aws_credentials')
         s3_download_to_path = os.path.join(iris_root_path, 'downloads')
         local_config_file_path = os.path.join(iris_root_path, 'local_config.json')
+        local_config_snapshot_path = os.path.join(iris_root_path, 'local_config.snapshot')
         global_config_file_path = os.path.join(s3_download_to_path, 'global_config.json')
         prom_dir_path = os.path.join(iris_root_path, 'prom_files')
 
@@ -94,6 +101,12 @@ def run_iris(logger: logging.Logger, iris_config: ConfigParser) -> None:
         prom_writer = PromFileWriter(logger=logger)
         prom_writer.write_prom_file(prom_file_path, prom_string)
 
+        # the config_service notifies the scheduler & garbage_collector over these pipes when the local_config changed,
+        # so they reload it right away instead of polling it
+        scheduler_config_connection, scheduler_config_publisher_connection = multiprocessing.Pipe(duplex=False)
+        garbage_collector_config_connection, garbage_collector_config_publisher_connection = multiprocessing.Pipe(
+            duplex=False)
+
         # run config_service process
         logger.info('Starting the Config_Service child process')
 
@@ -112,7 +125,14 @@ def run_iris(logger: logging.Logger, iris_config: ConfigParser) -> None:
             'run_frequency': config_service_settings.getfloat('run_frequency'),
             'log_path': config_service_log_path,
             'log_debug_path': log_debug_file_path,
-            'dev_mode': dev_mode
+            'dev_mode': dev_mode,
+            'config_change_connections': [
+                scheduler_config_publisher_connection, garbage_collector_config_publisher_connection
+            ],
+            'local_config_snapshot_path': local_config_snapshot_path,
+            'kept_download_versions': config_service_settings.getint('kept_download_versions'),
+            's3_download_workers': config_service_settings.getint('s3_download_workers'),
+            's3_bundle': config_service_settings.getboolean('s3_bundle'),
         }
         config_service_process = multiprocessing.Process(
             target=run_config_service,
@@ -131,9 +151,21 @@ def run_iris(logger: logging.Logger, iris_config: ConfigParser) -> None:
             'local_config_path': local_config_file_path,
             'prom_dir_path': prom_dir_path,
             'run_frequency': scheduler_settings.getfloat('run_frequency'),
+            'max_in_flight': scheduler_settings.getint('max_in_flight'),
+            'max_spawns_per_second': scheduler_settings.getfloat('max_spawns_per_second'),
+            'phase_spreading': scheduler_settings.getboolean('phase_spreading'),
+            'max_jitter': scheduler_settings.getfloat('max_jitter'),
+            'shell_pool_size': scheduler_settings.getint('shell_pool_size'),
+            'process_table_max_age': scheduler_settings.getfloat('process_table_max_age'),
+            'command_cache_window': scheduler_settings.getfloat('command_cache_window'),
+            'kill_grace_seconds': scheduler_settings.getfloat('kill_grace_seconds'),
+            'max_failure_backoff': scheduler_settings.getfloat('max_failure_backoff'),
+            'quarantine_threshold': scheduler_settings.getint('quarantine_threshold'),
             'internal_metrics_whitelist': internal_metrics_whitelist,
             'log_path': scheduler_log_path,
             'log_debug_path': log_debug_file_path,
+            'config_change_connection': scheduler_config_connection,
+            'local_config_snapshot_path': local_config_snapshot_path,
         }
         scheduler_process = multiprocessing.Process(
             target=run_scheduler,
@@ -155,6 +187,8 @@ def run_iris(logger: logging.Logger, iris_config: ConfigParser) -> None:
             'internal_metrics_whitelist': internal_metrics_whitelist,
             'log_path': garbage_collector_log_path,
             'log_debug_path': log_debug_file_path,
+            'config_change_connection': garbage_collector_config_connection,
+            'local_config_snapshot_path': local_config_snapshot_path,
         }
         garbage_collector_process = multiprocessing.Process(
             target=run_garbage_collector,
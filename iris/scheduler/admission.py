@@ -0,0 +1,136 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from logging import Logger
+from typing import AsyncIterator, List, Optional
+
+from iris.utils.prom_helpers import PromStrBuilder
+
+
+@dataclass
+class AdmissionController:
+    """
+    The AdmissionController decides when a due metric may spawn its subprocess. It caps how many metric subprocesses
+    run at once and how many are spawned per second, so that a burst of due metrics (ie after a restart) is queued
+    instead of turning into a fork storm on the host
+
+    :param max_in_flight: the max number of metric subprocesses running at once. 0 means no limit
+    :param max_spawns_per_second: the max number of metric subprocesses spawned per second. 0 means no limit
+    :param logger: logger for forensics
+    """
+    max_in_flight: int
+    max_spawns_per_second: float
+    logger: Logger
+
+    def __post_init__(self) -> None:
+        """
+        Check if the limits of the AdmissionController are correct and initialize its counters
+
+        :return: None, raises ValueError if the fields are not set correctly
+        """
+        if self.max_in_flight < 0 or self.max_spawns_per_second < 0:
+            err_fmt = 'Invalid AdmissionController limits: max_in_flight: {} & max_spawns_per_second: {} must be >= 0'
+            err_msg = err_fmt.format(self.max_in_flight, self.max_spawns_per_second)
+            self.logger.error(err_msg)
+            raise ValueError(err_msg)
+
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.in_flight = 0
+        self.admitted_total = 0
+        self.wait_seconds_total = 0.0
+
+        self._next_spawn_time = 0.0
+        self._in_flight_semaphore: Optional[asyncio.Semaphore] = None  # created in the event loop, see admit
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[float]:
+        """
+        Wait until a metric subprocess may be spawned. The caller holds its in-flight slot until the context exits
+
+        :return: the seconds the caller waited to be admitted
+        """
+        if self.max_in_flight and self._in_flight_semaphore is None:
+            self._in_flight_semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        queued_at = time.monotonic()
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        acquired = False
+        try:
+            if self._in_flight_semaphore:
+                await self._in_flight_semaphore.acquire()
+                acquired = True
+
+            if self.max_spawns_per_second:
+                # reserve the next free spawn slot, slots are 1 / max_spawns_per_second seconds apart
+                now = time.monotonic()
+                spawn_time = max(now, self._next_spawn_time)
+                self._next_spawn_time = spawn_time + 1 / self.max_spawns_per_second
+                await asyncio.sleep(spawn_time - now)
+
+        except BaseException:
+            if acquired and self._in_flight_semaphore:
+                self._in_flight_semaphore.release()
+            raise
+
+        finally:
+            self.queue_depth -= 1
+
+        wait_seconds = time.monotonic() - queued_at
+        self.admitted_total += 1
+        self.wait_seconds_total += wait_seconds
+        self.in_flight += 1
+
+        if wait_seconds >= 1:
+            self.logger.warning('Waited {:.3f}s to admit a metric subprocess'.format(wait_seconds))
+
+        try:
+            yield wait_seconds
+        finally:
+            self.in_flight -= 1
+            if acquired and self._in_flight_semaphore:
+                self._in_flight_semaphore.release()
+
+    def get_prom_strings(self) -> List[str]:
+        """
+        Get the AdmissionController counters in the prom format so we can size the limits
+
+        :return: a list of strings that build up to the prom string we need to write
+        """
+        prom_builders = [
+            PromStrBuilder(
+                metric_name='iris_scheduler_admission_queue_depth',
+                metric_result=self.queue_depth,
+                help_str='the number of metrics currently waiting to spawn their subprocess',
+                type_str='gauge'
+            ),
+            PromStrBuilder(
+                metric_name='iris_scheduler_admission_max_queue_depth',
+                metric_result=self.max_queue_depth,
+                help_str='the largest number of metrics that have waited to spawn their subprocess at once',
+                type_str='gauge'
+            ),
+            PromStrBuilder(
+                metric_name='iris_scheduler_admission_in_flight',
+                metric_result=self.in_flight,
+                help_str='the number of metric subprocesses currently running',
+                type_str='gauge'
+            ),
+            PromStrBuilder(
+                metric_name='iris_scheduler_admissions_total',
+                metric_result=self.admitted_total,
+                help_str='the number of metric subprocesses admitted',
+                type_str='counter'
+            ),
+            PromStrBuilder(
+                metric_name='iris_scheduler_admission_wait_seconds_total',
+                metric_result=round(self.wait_seconds_total, 6),
+                help_str='the total seconds metrics have waited to spawn their subprocess',
+                type_str='counter'
+            ),
+        ]
+
+        return [prom_builder.create_prom_string() for prom_builder in prom_builders]
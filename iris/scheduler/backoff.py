@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from logging import Logger
+from typing import Dict, List, Optional, Set
+
+from iris.utils.prom_helpers import PromStrBuilder
+
+# 2 ** MAX_BACKOFF_EXPONENT periods is longer than any sane max_backoff, so the delay can't overflow
+MAX_BACKOFF_EXPONENT = 32
+
+
+@dataclass
+class FailureBackoff:
+    """
+    The FailureBackoff delays the runs of metrics that keep failing (non zero return code or timeout). Each consecutive
+    failure doubles the delay between the runs of the metric, up to max_backoff seconds. A metric that fails
+    quarantine_threshold times in a row is quarantined: it doesn't run again until its config changes. A success
+    resets the backoff of the metric
+
+    :param max_backoff: the max seconds between the runs of a failing metric. 0 disables the backoff
+    :param quarantine_threshold: the number of consecutive failures after which a metric is quarantined. 0 disables
+    the quarantine
+    :param logger: logger for forensics
+    """
+    max_backoff: float
+    quarantine_threshold: int
+    logger: Logger
+
+    def __post_init__(self) -> None:
+        """
+        Check the limits and initialize the per metric backoff state
+
+        :return: None, raises ValueError if the fields are not set correctly
+        """
+        if self.max_backoff < 0 or self.quarantine_threshold < 0:
+            err_msg = 'Invalid FailureBackoff max_backoff: {} & quarantine_threshold: {} must be >= 0'.format(
+                self.max_backoff, self.quarantine_threshold)
+            self.logger.error(err_msg)
+            raise ValueError(err_msg)
+
+        self.consecutive_failures: Dict[str, int] = {}
+        self.backoff_delays: Dict[str, float] = {}
+        self.quarantined: Set[str] = set()
+
+    def record_result(self, metric_name: str, execution_frequency: float, failed: bool) -> Optional[float]:
+        """
+        Record the result of a metric run
+
+        :param metric_name: the name of the metric
+        :param execution_frequency: the execution_frequency of the metric
+        :param failed: True if the run failed (non zero return code or timeout)
+        :return: the seconds from the start of the run to the next run of the metric, or None if the metric is
+        quarantined. The delay is the execution_frequency if the metric isn't backing off
+        """
+        if not failed:
+            if metric_name in self.consecutive_failures:
+                self.logger.info('Metric {} recovered after {} consecutive failures'.format(
+                    metric_name, self.consecutive_failures[metric_name]))
+                self.reset(metric_name)
+            return execution_frequency
+
+        consecutive_failures = self.consecutive_failures.get(metric_name, 0) + 1
+        self.consecutive_failures[metric_name] = consecutive_failures
+
+        if self.quarantine_threshold and consecutive_failures >= self.quarantine_threshold:
+            if metric_name not in self.quarantined:
+                self.quarantined.add(metric_name)
+                self.backoff_delays.pop(metric_name, None)
+                self.logger.warning('Quarantined metric {} after {} consecutive failures. It runs again once its '
+                                    'config changes'.format(metric_name, consecutive_failures))
+            return None
+
+        delay = execution_frequency
+        if self.max_backoff:
+            backoff = execution_frequency * 2 ** min(consecutive_failures, MAX_BACKOFF_EXPONENT)
+            delay = max(execution_frequency, min(backoff, self.max_backoff))
+            self.backoff_delays[metric_name] = delay
+            self.logger.warning('Metric {} failed {} times in a row. Backing off its next run by {}s'.format(
+                metric_name, consecutive_failures, delay))
+
+        return delay
+
+    def is_quarantined(self, metric_name: str) -> bool:
+        """
+        Check if a metric is quarantined
+
+        :param metric_name: the name of the metric
+        :return: True if the metric is quarantined, else False
+        """
+        return metric_name in self.quarantined
+
+    def reset(self, metric_name: str) -> bool:
+        """
+        Reset the backoff of a metric, ie when it succeeded or its config changed
+
+        :param metric_name: the name of the metric
+        :return: True if the metric was quarantined, else False
+        """
+        self.consecutive_failures.pop(metric_name, None)
+        self.backoff_delays.pop(metric_name, None)
+        if metric_name in self.quarantined:
+            self.quarantined.discard(metric_name)
+            return True
+
+        return False
+
+    def forget_metrics(self, metric_names: List[str]) -> None:
+        """
+        Drop the backoff state of the metrics that were removed from the Scheduler
+
+        :param metric_names: the names of the removed metrics
+        :return: None
+        """
+        for metric_name in metric_names:
+            self.reset(metric_name)
+
+    def get_prom_strings(self) -> List[str]:
+        """
+        Get the backoff state of the failing metrics in the prom format, one sample per failing metric, so the failing
+        checks stay visible while they barely run
+
+        :return: a list of strings that build up to the prom string we need to write
+        """
+        prom_builders = [
+            PromStrBuilder(
+                metric_name='iris_scheduler_metric_consecutive_failures',
+                metric_result=len(self.consecutive_failures),
+                help_str='the number of consecutive failed runs of each failing metric',
+                type_str='gauge',
+                samples=[({'metric': name}, count) for name, count in sorted(self.consecutive_failures.items())]
+            ),
+            PromStrBuilder(
+                metric_name='iris_scheduler_metric_backoff_seconds',
+                metric_result=len(self.backoff_delays),
+                help_str='the seconds between the runs of each metric that is backing off',
+                type_str='gauge',
+                samples=[({'metric': name}, delay) for name, delay in sorted(self.backoff_delays.items())]
+            ),
+            PromStrBuilder(
+                metric_name='iris_scheduler_metric_quarantined',
+                metric_result=len(self.quarantined),
+                help_str='set to 1 for each metric that is quarantined until its config changes',
+                type_str='gauge',
+                samples=[({'metric': name}, 1) for name in sorted(self.quarantined)]
+            ),
+        ]
+
+        return [prom_builder.create_prom_string() for prom_builder in prom_builders]
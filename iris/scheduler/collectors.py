@@ -0,0 +1,330 @@
+import asyncio
+import os
+import pwd
+import re
+import struct
+import time
+from dataclasses import dataclass
+from logging import Logger
+from typing import Any, Dict, List, Optional
+
+from iris.config_service.config_lint.metric_checks import valid_collectors, valid_loadavg_periods
+
+# the layout of a struct utmp record on Linux (see utmp(5)): ut_type, ut_pid, ut_line, ut_id, ut_user, ...
+utmp_struct = struct.Struct('hi32s4s32s256shhiii4i20s')
+# the ut_type of a utmp record for a logged in user
+utmp_user_process = 7
+
+
+@dataclass
+class ProcessInfo:
+    """
+    A ProcessInfo is a single row of the ProcessTable, with the same meaning as the columns of `ps aux`
+
+    :param pid: the pid of the process
+    :param user: the name of the user that owns the process
+    :param comm: the executable name of the process
+    :param cmdline: the full command line of the process, [comm] for kernel threads
+    :param state: the state of the process (ie R, S, D, Z)
+    :param cpu_percent: the cpu time of the process divided by its elapsed time, in percent
+    :param mem_percent: the resident memory of the process divided by the host's total memory, in percent
+    :param rss_bytes: the resident memory of the process in bytes
+    """
+    pid: int
+    user: str
+    comm: str
+    cmdline: str
+    state: str
+    cpu_percent: float
+    mem_percent: float
+    rss_bytes: int
+
+
+@dataclass
+class ProcessTable:
+    """
+    The ProcessTable is a cached snapshot of every process on the host. /proc is scanned at most once per max_age
+    seconds (the scheduling window), so every ps/grep-style metric in the window is answered from the same scan
+    instead of forking its own `ps aux | grep ... | awk ...` pipeline
+
+    :param max_age: the seconds a scan is reused for
+    :param logger: logger for forensics
+    :param proc_path: the path to the proc filesystem
+    """
+    max_age: float
+    logger: Logger
+    proc_path: str = '/proc'
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the empty snapshot & the constants needed to compute ps-style cpu/mem percentages
+
+        :return: None
+        """
+        self.scan_count = 0
+        self._processes: List[ProcessInfo] = []
+        self._scanned_at: Optional[float] = None
+        self._scan_task: Optional[asyncio.Future] = None
+        self._usernames: Dict[int, str] = {}
+        self._clock_ticks = os.sysconf('SC_CLK_TCK')
+        self._page_size = os.sysconf('SC_PAGE_SIZE')
+
+    async def get_processes(self) -> List[ProcessInfo]:
+        """
+        Get the snapshot of the process table, scanning /proc (in a thread) if the snapshot is older than max_age.
+        Concurrent callers share a single scan
+
+        :return: a list of ProcessInfo, one per process
+        """
+        if self._scanned_at is not None and time.monotonic() - self._scanned_at < self.max_age:
+            return self._processes
+
+        if self._scan_task is None:
+            self._scan_task = asyncio.get_event_loop().run_in_executor(None, self.scan)
+
+        try:
+            self._processes = await asyncio.shield(self._scan_task)
+            self._scanned_at = time.monotonic()
+        finally:
+            self._scan_task = None
+
+        return self._processes
+
+    async def query(self, collector_args: Dict[str, Any]) -> float:
+        """
+        Answer a process_table query against the snapshot, see metric_checks.check_collector_args for the query args
+
+        :param collector_args: the query. field & pattern (a regex searched in the field), state & aggregate
+        :return: the aggregated value of the matching processes
+        """
+        match_field = collector_args.get('field', 'comm')
+        pattern = re.compile(collector_args.get('pattern', ''))
+        state = collector_args.get('state')
+        aggregate = collector_args.get('aggregate', 'count')
+
+        processes = [
+            process for process in await self.get_processes()
+            if pattern.search(getattr(process, match_field)) and (state is None or process.state == state)
+        ]
+
+        if aggregate == 'count':
+            return len(processes)
+
+        return sum(getattr(process, aggregate) for process in processes)
+
+    def scan(self) -> List[ProcessInfo]:
+        """
+        Scan /proc once and build a ProcessInfo for every process. Processes that exit during the scan are skipped
+
+        :return: a list of ProcessInfo, one per process
+        """
+        with open(os.path.join(self.proc_path, 'uptime')) as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        mem_total_bytes = self._read_mem_total_bytes()
+
+        processes = []
+        for pid_dir in os.listdir(self.proc_path):
+            if not pid_dir.isdigit():
+                continue
+
+            try:
+                processes.append(self._read_process(int(pid_dir), uptime, mem_total_bytes))
+            except (OSError, IndexError, ValueError):
+                continue  # the process exited while we were reading it
+
+        self.scan_count += 1
+        self.logger.info('Scanned {} processes in {}'.format(len(processes), self.proc_path))
+
+        return processes
+
+    def _read_process(self, pid: int, uptime: float, mem_total_bytes: int) -> ProcessInfo:
+        """
+        Helper method for scan to read a single process from /proc/<pid>/stat & /proc/<pid>/cmdline
+
+        :param pid: the pid of the process
+        :param uptime: the uptime of the host in seconds
+        :param mem_total_bytes: the total memory of the host in bytes
+        :return: the ProcessInfo of the process
+        """
+        pid_path = os.path.join(self.proc_path, str(pid))
+
+        with open(os.path.join(pid_path, 'stat')) as stat_file:
+            stat = stat_file.read()
+        with open(os.path.join(pid_path, 'cmdline'), 'rb') as cmdline_file:
+            cmdline_bytes = cmdline_file.read()
+
+        # the comm is wrapped in parentheses and may itself contain spaces & parentheses
+        comm = stat[stat.index('(') + 1:stat.rindex(')')]
+        stat_fields = stat[stat.rindex(')') + 2:].split()
+
+        cpu_seconds = (int(stat_fields[11]) + int(stat_fields[12])) / self._clock_ticks
+        elapsed_seconds = uptime - int(stat_fields[19]) / self._clock_ticks
+        rss_bytes = int(stat_fields[21]) * self._page_size
+
+        cmdline = cmdline_bytes.replace(b'\0', b' ').decode('utf-8', 'replace').strip()
+
+        return ProcessInfo(
+            pid=pid,
+            user=self._get_username(os.stat(pid_path).st_uid),
+            comm=comm,
+            cmdline=cmdline or '[{}]'.format(comm),
+            state=stat_fields[0],
+            cpu_percent=100 * cpu_seconds / elapsed_seconds if elapsed_seconds > 0 else 0.0,
+            mem_percent=100 * rss_bytes / mem_total_bytes if mem_total_bytes else 0.0,
+            rss_bytes=rss_bytes
+        )
+
+    def _read_mem_total_bytes(self) -> int:
+        """
+        Helper method for scan to read the total memory of the host from /proc/meminfo
+
+        :return: the total memory of the host in bytes
+        """
+        with open(os.path.join(self.proc_path, 'meminfo')) as meminfo_file:
+            for line in meminfo_file:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) * 1024
+
+        return 0
+
+    def _get_username(self, uid: int) -> str:
+        """
+        Helper method for _read_process to get (and cache) the user name of a uid
+
+        :param uid: the uid that owns the process
+        :return: the user name, or the uid if it has no passwd entry
+        """
+        if uid not in self._usernames:
+            try:
+                self._usernames[uid] = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                self._usernames[uid] = str(uid)
+
+        return self._usernames[uid]
+
+
+@dataclass
+class Collectors:
+    """
+    The Collectors run the native, in-process collectors of metrics that set a collector instead of a bash_command.
+    They run in the Scheduler's event loop and don't spawn a subprocess. Apart from the process_table, each collector
+    reads a single small kernel/utmp file that replaces an expensive shell check:
+
+    - fd_count: /proc/sys/fs/file-nr instead of `lsof -n | wc -l`
+    - loadavg: /proc/loadavg instead of `uptime | awk ...`
+    - meminfo: a /proc/meminfo field (in bytes if the field is in kB) instead of `free | awk ...`
+    - logged_in_users: the utmp user sessions instead of `who | wc -l`
+
+    :param process_table_max_age: the seconds a process table scan is shared by the process_table metrics
+    :param logger: logger for forensics
+    :param proc_path: the path to the proc filesystem
+    :param utmp_path: the path to the utmp file
+    """
+    process_table_max_age: float
+    logger: Logger
+    proc_path: str = '/proc'
+    utmp_path: str = '/var/run/utmp'
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the caches that the collectors share
+
+        :return: None
+        """
+        self.process_table = ProcessTable(
+            max_age=self.process_table_max_age, logger=self.logger, proc_path=self.proc_path)
+
+    async def collect(self, collector: str, collector_args: Dict[str, Any]) -> float:
+        """
+        Run a collector
+
+        :param collector: the name of the collector, see valid_collectors
+        :param collector_args: the args/query of the collector
+        :return: the value of the metric
+        """
+        if collector == 'process_table':
+            return await self.process_table.query(collector_args)
+
+        if collector == 'fd_count':
+            return self.get_fd_count(collector_args.get('field', 'open'))
+
+        if collector == 'loadavg':
+            return self.get_loadavg(collector_args.get('period', 1))
+
+        if collector == 'meminfo':
+            return self.get_meminfo(collector_args['field'])
+
+        if collector == 'logged_in_users':
+            return self.get_logged_in_users(collector_args.get('unique', False))
+
+        err_msg = 'Invalid collector: {} not one of valid collectors: {}'.format(collector, valid_collectors)
+        self.logger.error(err_msg)
+        raise ValueError(err_msg)
+
+    def get_fd_count(self, field: str) -> int:
+        """
+        Get the number of file handles of the host from /proc/sys/fs/file-nr
+
+        :param field: open (allocated - unused), allocated or max, see valid_fd_count_fields
+        :return: the number of file handles
+        """
+        with open(os.path.join(self.proc_path, 'sys', 'fs', 'file-nr')) as file_nr_file:
+            allocated, unused, max_handles = (int(value) for value in file_nr_file.read().split())
+
+        if field == 'allocated':
+            return allocated
+        if field == 'max':
+            return max_handles
+
+        return allocated - unused
+
+    def get_loadavg(self, period: int) -> float:
+        """
+        Get the load average of the host from /proc/loadavg
+
+        :param period: the load average period in minutes, see valid_loadavg_periods
+        :return: the load average
+        """
+        with open(os.path.join(self.proc_path, 'loadavg')) as loadavg_file:
+            loadavgs = loadavg_file.read().split()
+
+        return float(loadavgs[valid_loadavg_periods.index(period)])
+
+    def get_meminfo(self, field: str) -> int:
+        """
+        Get a field of /proc/meminfo
+
+        :param field: the name of the field, ie MemAvailable
+        :return: the value of the field, in bytes if the field is in kB. Raises ValueError if the field doesn't exist
+        """
+        with open(os.path.join(self.proc_path, 'meminfo')) as meminfo_file:
+            for line in meminfo_file:
+                name, _, value = line.partition(':')
+                if name == field:
+                    value_fields = value.split()
+                    return int(value_fields[0]) * (1024 if value_fields[1:] == ['kB'] else 1)
+
+        err_msg = 'No field {} in {}'.format(field, os.path.join(self.proc_path, 'meminfo'))
+        self.logger.error(err_msg)
+        raise ValueError(err_msg)
+
+    def get_logged_in_users(self, unique: bool) -> int:
+        """
+        Get the number of logged in users from the utmp file, the same count as `who | wc -l`
+
+        :param unique: set to True to count each user once instead of each of their sessions
+        :return: the number of logged in users/sessions
+        """
+        try:
+            with open(self.utmp_path, 'rb') as utmp_file:
+                utmp = utmp_file.read()
+        except FileNotFoundError:
+            return 0  # like who, no utmp file means no user sessions
+
+        users = []
+        for offset in range(0, len(utmp) - utmp_struct.size + 1, utmp_struct.size):
+            record = utmp_struct.unpack_from(utmp, offset)
+            if record[0] == utmp_user_process:
+                users.append(record[4].split(b'\0', 1)[0])
+
+        return len(set(users)) if unique else len(users)
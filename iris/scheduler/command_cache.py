@@ -0,0 +1,163 @@
+import asyncio
+import functools
+import shlex
+import time
+from dataclasses import dataclass
+from logging import Logger
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from iris.config_service.configs import Metric
+from iris.utils.prom_helpers import PromStrBuilder
+
+
+@dataclass
+class CommandCache:
+    """
+    The CommandCache deduplicates the runs of identical commands. Metrics whose commands normalize to the same key
+    (see get_command_key) share a single run: a metric that is due while the command is running waits for that run,
+    and a metric that is due less than window seconds after the command finished reuses its output. Each metric then
+    applies its own extract step to the shared output, see iris/scheduler/extract.py
+
+    A run is only cancelled (ie its process killed) when every metric waiting on it was cancelled
+
+    :param window: the seconds the output of a finished command is reused for. 0 only shares running commands
+    :param logger: logger for forensics
+    """
+    window: float
+    logger: Logger
+
+    def __post_init__(self) -> None:
+        """
+        Check if the window of the CommandCache is correct and initialize its counters
+
+        :return: None, raises ValueError if the fields are not set correctly
+        """
+        if self.window < 0:
+            err_msg = 'Invalid CommandCache window: {} must be >= 0'.format(self.window)
+            self.logger.error(err_msg)
+            raise ValueError(err_msg)
+
+        self.runs_total = 0
+        self.saved_runs_total = 0
+
+        self._running: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[str, int] = {}  # key -> the number of metrics waiting on the running command
+        self._finished: Dict[str, Tuple[float, Any]] = {}  # key -> (finish time, output)
+
+    @staticmethod
+    def get_command_key(metric: Metric) -> str:
+        """
+        Get the normalized command of a metric: its argv (so `ls  -l` and `ls -l` share a key), else its bash_command
+        without the surrounding whitespace. Shell commands are not tokenized further since whitespace inside them can
+        be meaningful (ie escaped spaces, quoted strings & heredocs)
+
+        The execution settings of the metric (execution_timeout, max_output_bytes & resource limits) are part of the
+        key, so only metrics that would run the command the same way share a run of it. They are appended after a NUL
+        byte, which can't be part of a command
+
+        :param metric: the Metric
+        :return: the normalized command & execution settings
+        """
+        if metric.argv:
+            command = ' '.join(shlex.quote(arg) for arg in metric.argv)
+        else:
+            command = metric.bash_command.strip()
+
+        execution_settings = (
+            metric.execution_timeout, metric.max_output_bytes, metric.max_cpu_seconds, metric.max_rss_mb, metric.nice,
+            metric.ioclass
+        )
+
+        return '{}\0{}'.format(command, execution_settings)
+
+    async def run(self, key: str, run_command: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Get the output of a command, running it only if it isn't running already and it didn't finish in the window
+
+        :param key: the normalized command, see get_command_key
+        :param run_command: the coroutine function that runs the command and returns its output
+        :return: a tuple of the output of the command and whether the output was shared with another metric
+        """
+        now = time.monotonic()
+        finished = self._finished.get(key)
+        if finished is not None and now - finished[0] < self.window:
+            self.saved_runs_total += 1
+            return finished[1], True
+
+        if key in self._running:
+            self.saved_runs_total += 1
+            return await self._wait(key, self._running[key]), True
+
+        self.runs_total += 1
+        running = asyncio.ensure_future(run_command())
+        # the run is forgotten once it is done, not when this metric stops waiting on it, since the run keeps going
+        # for the other metrics that wait on it if this metric's task is cancelled
+        running.add_done_callback(functools.partial(self._on_run_done, key))
+        self._running[key] = running
+        self._waiters[key] = 0
+
+        return await self._wait(key, running), False
+
+    def _on_run_done(self, key: str, running: asyncio.Future) -> None:
+        """
+        Helper method for run to forget a command once its run is done, and keep its output for the window if it
+        finished
+
+        :param key: the normalized command, see get_command_key
+        :param running: the future of the done run
+        :return: None
+        """
+        if self._running.get(key) is running:
+            del self._running[key]
+            del self._waiters[key]
+
+        if self.window and not running.cancelled() and running.exception() is None:
+            finish_time = time.monotonic()
+            self._finished = {
+                finished_key: finished for finished_key, finished in self._finished.items()
+                if finish_time - finished[0] < self.window
+            }
+            self._finished[key] = (finish_time, running.result())
+
+    async def _wait(self, key: str, running: asyncio.Future) -> Any:
+        """
+        Helper method for run to wait on a running command. The wait is shielded so the metrics waiting on the run
+        still get its output if one of their tasks is cancelled, the run is cancelled once no metric waits on it
+
+        :param key: the normalized command, see get_command_key
+        :param running: the future of the running command
+        :return: the output of the command
+        """
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(running)
+        except asyncio.CancelledError:
+            if self._running.get(key) is running and self._waiters[key] == 1:
+                running.cancel()
+            raise
+        finally:
+            if self._running.get(key) is running:
+                self._waiters[key] -= 1
+
+    def get_prom_strings(self) -> List[str]:
+        """
+        Get the CommandCache counters in the prom format so we can see how many subprocesses the deduplication saves
+
+        :return: a list of strings that build up to the prom string we need to write
+        """
+        prom_builders = [
+            PromStrBuilder(
+                metric_name='iris_scheduler_command_runs_total',
+                metric_result=self.runs_total,
+                help_str='the number of metric commands that were run',
+                type_str='counter'
+            ),
+            PromStrBuilder(
+                metric_name='iris_scheduler_command_saved_runs_total',
+                metric_result=self.saved_runs_total,
+                help_str='the number of metric command runs saved by sharing the output of an identical command',
+                type_str='counter'
+            ),
+        ]
+
+        return [prom_builder.create_prom_string() for prom_builder in prom_builders]
@@ -0,0 +1,37 @@
+import re
+from typing import Any, Dict
+
+
+def extract_value(extract: Dict[str, Any], output: str) -> float:
+    """
+    Apply the extract step of a Metric to the output of its command, ie the grep & awk of
+    `ps aux | grep ^quickio | awk '{sum += $3} END {print sum}'` applied to the shared `ps aux` output
+
+    :param extract: the extract step, see metric_checks.check_extract_args
+    :param output: the output of the command
+    :return: the aggregated value of the matching lines. Raises ValueError if a matching column is not a number
+    """
+    pattern = re.compile(extract.get('pattern', ''))
+    column = extract.get('column', 1)
+    aggregate = extract.get('aggregate', 'sum')
+
+    matching_lines = [line for line in output.splitlines() if pattern.search(line)]
+    if aggregate == 'count':
+        return len(matching_lines)
+
+    values = []
+    for line in matching_lines:
+        columns = line.split()
+        if len(columns) >= column:
+            values.append(float(columns[column - 1]))
+
+    if aggregate == 'sum':
+        return sum(values)
+    if not values:
+        raise ValueError('No line of the output matches the extract step: {}'.format(extract))
+    if aggregate == 'min':
+        return min(values)
+    if aggregate == 'max':
+        return max(values)
+
+    return values[0]
@@ -0,0 +1,258 @@
+import asyncio
+import ctypes
+import os
+import platform
+import resource
+import subprocess
+import threading
+from dataclasses import dataclass
+from logging import Logger
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+# the ioprio_set syscall numbers, python has no binding for it
+ioprio_set_syscalls = {'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'armv7l': 314}
+# the io scheduling classes a metric may use (see ionice(1)). realtime is not allowed, it could starve the host
+ioprio_classes = {'best-effort': 2, 'idle': 3}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_BEST_EFFORT_LOWEST = 7
+
+
+def get_preexec_fn(max_cpu_seconds: Optional[int], max_rss_mb: Optional[int], nice: Optional[int],
+                   ioclass: Optional[str], logger: Logger) -> Optional[Callable[[], None]]:
+    """
+    Get the function that applies a metric's resource limits in the forked child, right before its command is executed
+
+    :param max_cpu_seconds: the max cpu seconds (RLIMIT_CPU) the command may use, it gets a SIGXCPU once it does
+    :param max_rss_mb: the max memory (RLIMIT_DATA, RLIMIT_RSS is not enforced by Linux) the command may allocate
+    :param nice: the nice value (scheduling priority) of the command
+    :param ioclass: the io scheduling class of the command, see ioprio_classes
+    :param logger: logger for forensics
+    :return: the function to run in the child, or None if the metric has no resource limits
+    """
+    if max_cpu_seconds is None and max_rss_mb is None and nice is None and ioclass is None:
+        return None
+
+    libc = None
+    ioprio_set_args: Tuple[int, ...] = ()
+    if ioclass is not None:
+        syscall_number = ioprio_set_syscalls.get(platform.machine())
+        if syscall_number is None:
+            logger.warning('Ignoring ioclass: {}. ioprio_set is unknown on {}'.format(ioclass, platform.machine()))
+        else:
+            libc = ctypes.CDLL(None, use_errno=True)  # loaded in the parent, the child must not import/load anything
+            ioprio = ioprio_classes[ioclass] << IOPRIO_CLASS_SHIFT | IOPRIO_BEST_EFFORT_LOWEST
+            ioprio_set_args = (syscall_number, IOPRIO_WHO_PROCESS, 0, ioprio)
+
+    def preexec_fn() -> None:
+        if max_cpu_seconds is not None:
+            # the hard limit gives the command a second to handle its SIGXCPU before the kernel SIGKILLs it
+            resource.setrlimit(resource.RLIMIT_CPU, (max_cpu_seconds, max_cpu_seconds + 1))
+        if max_rss_mb is not None:
+            max_bytes = max_rss_mb * 2 ** 20
+            resource.setrlimit(resource.RLIMIT_DATA, (max_bytes, max_bytes))
+        if nice is not None:
+            os.setpriority(os.PRIO_PROCESS, 0, nice)
+        if libc is not None:
+            libc.syscall(*ioprio_set_args)
+
+    return preexec_fn
+
+
+@dataclass
+class MetricProcess:
+    """
+    A MetricProcess is the subprocess of a metric command, with its stdout & stderr piped to asyncio StreamReaders
+
+    The command is spawned by Popen. Only a command with resource limits (see get_preexec_fn) runs a preexec_fn in the
+    child. The exit of the subprocess is noticed as soon as its pidfd is readable (or by a thread blocked on os.waitid
+    when the system has no pidfd) but the subprocess is left a zombie until reap is called. The zombie keeps its pid,
+    & so the id of its process group, from being reused, so the processes the command left behind can be looked up &
+    killed by process group without hitting an unrelated process group. Reaping it with os.wait4 gets the cpu time &
+    max rss of the command (and of the children it waited for, ie the processes of a pipeline)
+
+    :param pid: the pid of the subprocess
+    :param stdout: the reader of the subprocess stdout
+    :param stderr: the reader of the subprocess stderr
+    :param transports: the read pipe transports of stdout & stderr
+    :param exited: the future of the return code of the subprocess, set once it exited
+    """
+    pid: int
+    stdout: asyncio.StreamReader
+    stderr: asyncio.StreamReader
+    transports: List[asyncio.BaseTransport]
+    exited: asyncio.Future
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the exit status of the subprocess, set once it exited & once it is reaped
+
+        :return: None
+        """
+        self.returncode: Optional[int] = None
+        self.rusage: Optional[resource.struct_rusage] = None
+        self._reap_on_exit = False
+        if self.exited.done():  # the command exited while its pipes were connected, a callback would run too late
+            self._set_exit_status(self.exited)
+        else:
+            self.exited.add_done_callback(self._set_exit_status)
+
+    @classmethod
+    async def start(cls, args: Union[str, List[str]], shell: bool,
+                    preexec_fn: Optional[Callable[[], None]] = None) -> 'MetricProcess':
+        """
+        Start a subprocess in its own session (so it leads its own process group) with its stdout & stderr piped to
+        asyncio StreamReaders
+
+        :param args: the argv of the command, or the command string if shell is True
+        :param shell: set to True to run the command with /bin/sh
+        :param preexec_fn: the function to run in the child before the command is executed, see get_preexec_fn
+        :return: the started MetricProcess. Raises OSError (or SubprocessError if preexec_fn failed) if the command
+        can't be executed
+        """
+        loop = asyncio.get_event_loop()
+        stdout_read_fd, stdout_write_fd = os.pipe()
+        stderr_read_fd, stderr_write_fd = os.pipe()
+        try:
+            popen = subprocess.Popen(
+                args,
+                shell=shell,
+                stdin=subprocess.DEVNULL,
+                stdout=stdout_write_fd,
+                stderr=stderr_write_fd,
+                start_new_session=True,
+                preexec_fn=preexec_fn
+            )
+        except BaseException:
+            os.close(stdout_read_fd)
+            os.close(stderr_read_fd)
+            raise
+        finally:
+            os.close(stdout_write_fd)
+            os.close(stderr_write_fd)
+
+        exited = cls._watch_exit(loop, popen)
+        stdout, stdout_transport = await cls._connect_reader(loop, stdout_read_fd)
+        stderr, stderr_transport = await cls._connect_reader(loop, stderr_read_fd)
+
+        return cls(pid=popen.pid, stdout=stdout, stderr=stderr, transports=[stdout_transport, stderr_transport],
+                   exited=exited)
+
+    @staticmethod
+    def _watch_exit(loop: asyncio.AbstractEventLoop, popen: subprocess.Popen) -> asyncio.Future:
+        """
+        Helper method for start to notice the exit of the subprocess without reaping it. The exit is read with
+        os.waitid(WNOWAIT) when the pidfd of the subprocess is readable, or by a thread blocked on it when the system
+        has no pidfd (python < 3.9 or linux < 5.3)
+
+        :param loop: the event loop
+        :param popen: the Popen of the subprocess
+        :return: the future of the return code of the subprocess
+        """
+        exited = loop.create_future()
+
+        def set_exited(wait_result: Any) -> None:
+            if wait_result.si_code == os.CLD_EXITED:
+                popen.returncode = wait_result.si_status
+            else:  # killed or dumped by a signal
+                popen.returncode = -wait_result.si_status
+            if not exited.done():
+                exited.set_result(popen.returncode)
+
+        pidfd_open = getattr(os, 'pidfd_open', None)  # python >= 3.9
+        try:
+            pidfd = pidfd_open(popen.pid) if pidfd_open is not None else None
+        except OSError:  # linux < 5.3
+            pidfd = None
+
+        if pidfd is not None:
+            def on_exit() -> None:
+                wait_result = os.waitid(os.P_PID, popen.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+                if wait_result is not None:
+                    loop.remove_reader(pidfd)
+                    os.close(pidfd)
+                    set_exited(wait_result)
+
+            loop.add_reader(pidfd, on_exit)
+        else:
+            def wait_for_exit() -> None:
+                wait_result = os.waitid(os.P_PID, popen.pid, os.WEXITED | os.WNOWAIT)
+                try:
+                    loop.call_soon_threadsafe(set_exited, wait_result)
+                except RuntimeError:  # the loop was closed while the command ran
+                    pass
+
+            threading.Thread(target=wait_for_exit, name='waitid-{}'.format(popen.pid), daemon=True).start()
+
+        return exited
+
+    @staticmethod
+    async def _connect_reader(loop: asyncio.AbstractEventLoop,
+                              read_fd: int) -> Tuple[asyncio.StreamReader, asyncio.BaseTransport]:
+        """
+        Helper method for start to connect the read end of a pipe to an asyncio StreamReader
+
+        :param loop: the event loop
+        :param read_fd: the read end of the pipe
+        :return: a tuple of the StreamReader & the transport of the pipe
+        """
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, 'rb', 0))
+
+        return reader, transport
+
+    def _set_exit_status(self, exited: asyncio.Future) -> None:
+        """
+        Helper method that records the return code of the subprocess once it exited, and reaps it if reap was called
+        before it exited
+
+        :param exited: the future of the return code of the subprocess
+        :return: None
+        """
+        if not exited.cancelled() and exited.exception() is None:
+            self.returncode = exited.result()
+            if self._reap_on_exit:
+                self.reap()
+
+    def poll(self) -> Optional[int]:
+        """
+        Get the return code of the subprocess if it exited, without blocking
+
+        :return: the return code of the subprocess (-N if it was killed by signal N), None if it is still running
+        """
+        return self.returncode
+
+    async def wait(self) -> int:
+        """
+        Wait for the subprocess to exit. Cancelling the wait doesn't stop the exit from being recorded
+
+        :return: the return code of the subprocess
+        """
+        return await asyncio.shield(self.exited)
+
+    def reap(self) -> None:
+        """
+        Reap the zombie of the subprocess & record its rusage, once the processes it left in its process group were
+        dealt with. A subprocess that didn't exit yet is reaped as soon as it exits
+
+        :return: None
+        """
+        if self.returncode is None:
+            self._reap_on_exit = True
+            return
+
+        if self.rusage is None:
+            try:
+                _, _, self.rusage = os.wait4(self.pid, 0)  # the zombie is reaped right away
+            except ChildProcessError:  # already reaped
+                pass
+
+    def close(self) -> None:
+        """
+        Close the stdout & stderr pipes, ie when a process that left the subprocess' process group still holds them
+
+        :return: None
+        """
+        for transport in self.transports:
+            transport.close()
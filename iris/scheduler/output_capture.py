@@ -0,0 +1,122 @@
+import asyncio
+from typing import List, Tuple
+
+# the max bytes read from a metric's stdout/stderr pipe at once
+READ_CHUNK_BYTES = 2 ** 16
+
+
+async def read_head(stream: asyncio.StreamReader, max_bytes: int) -> Tuple[bytes, bool]:
+    """
+    Read a stream until EOF, keeping at most its first max_bytes. Reading stops as soon as the stream exceeds
+    max_bytes, so the caller can stop the process that writes to it instead of draining it
+
+    :param stream: the stream to read, ie the stdout of a metric's subprocess
+    :param max_bytes: the max number of bytes to keep
+    :return: a tuple of the first (up to max_bytes) bytes of the stream and whether the stream exceeded max_bytes
+    """
+    chunks: List[bytes] = []
+    size = 0
+    while True:
+        chunk = await stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            return b''.join(chunks), False
+
+        if size + len(chunk) > max_bytes:
+            chunks.append(chunk[:max_bytes - size])
+            return b''.join(chunks), True
+
+        chunks.append(chunk)
+        size += len(chunk)
+
+
+async def read_tail(stream: asyncio.StreamReader, max_bytes: int) -> Tuple[bytes, bool]:
+    """
+    Read a stream until EOF, keeping only its last max_bytes (ie the error at the end of a noisy stderr)
+
+    :param stream: the stream to read, ie the stderr of a metric's subprocess
+    :param max_bytes: the max number of bytes to keep
+    :return: a tuple of the last (up to max_bytes) bytes of the stream and whether older bytes were dropped
+    """
+    tail = bytearray()
+    truncated = False
+    while True:
+        chunk = await stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            return bytes(tail), truncated
+
+        tail += chunk
+        if len(tail) > max_bytes:
+            del tail[:len(tail) - max_bytes]
+            truncated = True
+
+
+async def discard(stream: asyncio.StreamReader) -> int:
+    """
+    Read a stream until EOF without keeping any of it, so the pipe of a stopped subprocess is closed
+
+    :param stream: the stream to drain
+    :return: the number of bytes discarded
+    """
+    discarded = 0
+    while True:
+        chunk = await stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            return discarded
+
+        discarded += len(chunk)
+
+
+async def read_frame(stream: asyncio.StreamReader, delimiter: bytes, max_bytes: int,
+                     keep_tail: bool = False) -> Tuple[bytes, bytes, bool]:
+    """
+    Read a stream until a delimiter followed by a newline (ie the framing of a command's output in a ShellWorker),
+    keeping at most max_bytes of the output before the delimiter. By default reading stops as soon as the output
+    exceeds max_bytes, so the caller can stop the process that writes to it. With keep_tail the stream is read until
+    the delimiter and only the last max_bytes of the output are kept
+
+    :param stream: the stream to read, ie the stdout of a ShellWorker
+    :param delimiter: the delimiter that ends the output
+    :param max_bytes: the max number of bytes of output to keep
+    :param keep_tail: set to True to keep the last max_bytes of the output instead of stopping
+    :return: a tuple of the output, the bytes between the delimiter and the newline (ie the exit status of the command)
+             and whether the output exceeded max_bytes. The output is empty if it exceeded max_bytes without keep_tail.
+             Raises asyncio.IncompleteReadError if the stream ends before the delimiter
+    """
+    buffer = bytearray()
+    exceeded = False
+    search_start = 0
+    while True:
+        chunk = await stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            raise asyncio.IncompleteReadError(bytes(buffer), None)
+
+        buffer += chunk
+        delimiter_start = buffer.find(delimiter, search_start)
+        if delimiter_start == -1:
+            # keep enough bytes to find a delimiter split across chunks
+            search_start = max(len(buffer) - len(delimiter) + 1, 0)
+            excess = len(buffer) - max_bytes - len(delimiter)
+            if excess > 0:
+                if not keep_tail:
+                    return b'', b'', True
+
+                del buffer[:excess]
+                search_start -= excess
+                exceeded = True
+            continue
+
+        # the newline after the delimiter may be its own last byte
+        frame_end = buffer.find(b'\n', delimiter_start + len(delimiter) - 1)
+        if frame_end == -1:
+            search_start = delimiter_start
+            continue
+
+        output = bytes(buffer[:delimiter_start])
+        if len(output) > max_bytes:
+            if not keep_tail:
+                return b'', b'', True
+
+            output = output[-max_bytes:]
+            exceeded = True
+
+        return output, bytes(buffer[delimiter_start + len(delimiter):frame_end]), exceeded
@@ -0,0 +1,128 @@
+import json
+import re
+from typing import Dict, List, Tuple
+
+from iris.config_service.config_lint.metric_checks import valid_output_formats
+
+# the max number of samples a single metric run may output, so a runaway command can't blow up the prom files
+MAX_SAMPLES = 1000
+
+Sample = Tuple[Dict[str, str], float]
+
+label_name_regex = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*$')
+# the labels Iris sets on every sample of a metric (see MetricResult.get_prom_strings), a sample can't overwrite them
+reserved_label_names = frozenset({'execution_frequency'})
+# a sample line of the prometheus exposition format: name{label="value",...} value [timestamp]
+prometheus_sample_regex = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)(?:\s+-?\d+)?$')
+prometheus_label_regex = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"\s*,?')
+
+
+def parse_samples(output_format: str, output: str, metric_name: str) -> List[Sample]:
+    """
+    Parse the output of a metric's command into the samples of the metric family
+
+    - labeled: one sample per line, `label=value... number`, ie `device=sda mount=/data 12.5`
+    - prometheus: the prometheus exposition format. Only the samples named metric_name (or iris_<metric_name>) are
+      kept, so the command can't write other metric families into the metric's prom file
+    - json: a list of {"labels": {"label": "value"...}, "value": number} objects
+
+    :param output_format: the output format of the metric, one of valid_output_formats except value
+    :param output: the output of the metric's command
+    :param metric_name: the name of the metric
+    :return: a list of (labels, value) samples. Raises ValueError if the output doesn't match the output format or a
+    sample sets one of the reserved_label_names
+    """
+    if output_format == 'labeled':
+        samples = [_parse_labeled_line(line) for line in output.splitlines() if line.strip()]
+
+    elif output_format == 'prometheus':
+        sample_names = {metric_name, 'iris_{}'.format(metric_name)}
+        samples = []
+        for line in output.splitlines():
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            sample_match = prometheus_sample_regex.match(line)
+            if not sample_match:
+                raise ValueError('Invalid prometheus sample line: {}'.format(line))
+
+            name, labels_string, value = sample_match.groups()
+            if name in sample_names:
+                samples.append((_parse_prometheus_labels(labels_string or ''), float(value)))
+
+    elif output_format == 'json':
+        try:
+            json_samples = json.loads(output)
+            samples = [
+                ({str(name): str(value) for name, value in json_sample.get('labels', {}).items()},
+                 float(json_sample['value']))
+                for json_sample in json_samples
+            ]
+        except (AttributeError, KeyError, TypeError, json.JSONDecodeError) as e:
+            err_fmt = 'Invalid json samples. Must be a list of {{"labels": {{...}}, "value": number}} objects. Err: {}'
+            raise ValueError(err_fmt.format(e))
+
+    else:
+        raise ValueError('Invalid output format: {} not one of valid formats: {}'.format(
+            output_format, valid_output_formats))
+
+    if len(samples) > MAX_SAMPLES:
+        raise ValueError('The output has {} samples, more than the max of {}'.format(len(samples), MAX_SAMPLES))
+
+    label_sets = set()
+    for labels, _ in samples:
+        invalid_label_names = [name for name in labels if not label_name_regex.match(name)]
+        if invalid_label_names:
+            raise ValueError('Invalid label names: {}'.format(', '.join(invalid_label_names)))
+
+        reserved_names = sorted(reserved_label_names.intersection(labels))
+        if reserved_names:
+            raise ValueError('Reserved label names: {}'.format(', '.join(reserved_names)))
+
+        label_set = frozenset(labels.items())
+        if label_set in label_sets:
+            raise ValueError('Duplicate samples with labels: {}'.format(labels))
+        label_sets.add(label_set)
+
+    return samples
+
+
+def _parse_labeled_line(line: str) -> Sample:
+    """
+    Helper method for parse_samples to parse a `label=value... number` line
+
+    :param line: the line of the output
+    :return: the (labels, value) sample of the line
+    """
+    fields = line.split()
+    labels = {}
+    for field in fields[:-1]:
+        name, separator, value = field.partition('=')
+        if not separator:
+            raise ValueError('Invalid labeled line: {}. Must be label=value... number'.format(line))
+        labels[name] = value
+
+    return labels, float(fields[-1])
+
+
+def _parse_prometheus_labels(labels_string: str) -> Dict[str, str]:
+    """
+    Helper method for parse_samples to parse the labels of a prometheus sample line
+
+    :param labels_string: the labels between the braces of the sample line, ie device="sda",mount="/data"
+    :return: the labels of the sample
+    """
+    labels = {}
+    position = 0
+    labels_string = labels_string.rstrip()
+    while position < len(labels_string):
+        label_match = prometheus_label_regex.match(labels_string, position)
+        if not label_match:
+            raise ValueError('Invalid prometheus labels: {}'.format(labels_string))
+
+        name, value = label_match.groups()
+        labels[name] = re.sub(r'\\(.)', lambda escaped: '\n' if escaped.group(1) == 'n' else escaped.group(1), value)
+        position = label_match.end()
+
+    return labels
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import signal
+import time
+from dataclasses import dataclass
+from logging import Logger
+from typing import Dict, List
+
+from iris.utils.prom_helpers import PromStrBuilder
+
+
+def signal_process_group(pgid: int, sig: int) -> bool:
+    """
+    Send a signal to every process of a process group
+
+    :param pgid: the id of the process group, the pid of the metric's subprocess (it leads its own session)
+    :param sig: the signal to send
+    :return: True if the process group exists, else False
+    """
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        return False
+
+    return True
+
+
+def get_process_group_members(pgid: int, proc_path: str = '/proc') -> List[int]:
+    """
+    Get the pids of the live processes of a process group by scanning /proc. Zombies are skipped, their parent (or
+    init) reaps them, ie the metric's subprocess that exited is left a zombie until its process group was looked up,
+    see MetricProcess
+
+    :param pgid: the id of the process group
+    :param proc_path: the path to the proc filesystem
+    :return: a list of the pids of the live processes of the process group
+    """
+    members = []
+    for pid_dir in os.listdir(proc_path):
+        if not pid_dir.isdigit():
+            continue
+
+        try:
+            with open(os.path.join(proc_path, pid_dir, 'stat')) as stat_file:
+                stat = stat_file.read()
+            stat_fields = stat[stat.rindex(')') + 2:].split()
+            if int(stat_fields[2]) == pgid and stat_fields[0] != 'Z':
+                members.append(int(pid_dir))
+        except (OSError, IndexError, ValueError):
+            continue  # the process exited while we were reading it
+
+    return members
+
+
+async def terminate_process_group(pgid: int, grace_seconds: float) -> bool:
+    """
+    Terminate every process of a process group: SIGTERM, then SIGKILL whatever is still alive after grace_seconds
+
+    :param pgid: the id of the process group
+    :param grace_seconds: the seconds the processes have to exit after the SIGTERM
+    :return: True if the process group had to be killed with SIGKILL, else False
+    """
+    if not signal_process_group(pgid, signal.SIGTERM):
+        return False
+
+    deadline = time.monotonic() + grace_seconds
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        if not signal_process_group(pgid, 0) or not get_process_group_members(pgid):
+            return False
+
+    return signal_process_group(pgid, signal.SIGKILL)
+
+
+@dataclass
+class ProcessGroupStats:
+    """
+    The ProcessGroupStats count, per metric, the subprocesses the Scheduler had to kill (the command timed out or
+    exceeded its max_output_bytes) and the orphaned processes it cleaned up (processes left in the metric's process
+    group after its command exited, ie `sleep 100 &`)
+
+    :param logger: logger for forensics
+    """
+    logger: Logger
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the counters
+
+        :return: None
+        """
+        self.killed_totals: Dict[str, int] = {}
+        self.orphaned_totals: Dict[str, int] = {}
+
+    def record_killed(self, metric_name: str) -> None:
+        """
+        Count a metric subprocess that was killed
+
+        :param metric_name: the name of the metric
+        :return: None
+        """
+        self.killed_totals[metric_name] = self.killed_totals.get(metric_name, 0) + 1
+
+    def record_orphaned(self, metric_name: str, orphaned_count: int) -> None:
+        """
+        Count the orphaned processes of a metric that were cleaned up
+
+        :param metric_name: the name of the metric
+        :param orphaned_count: the number of orphaned processes
+        :return: None
+        """
+        self.orphaned_totals[metric_name] = self.orphaned_totals.get(metric_name, 0) + orphaned_count
+        self.logger.warning('Cleaned up {} orphaned processes of metric {}'.format(orphaned_count, metric_name))
+
+    def forget_metrics(self, metric_names: List[str]) -> None:
+        """
+        Drop the counters of the metrics that were removed from the Scheduler, so their series stop being exported
+
+        :param metric_names: the names of the removed metrics
+        :return: None
+        """
+        for metric_name in metric_names:
+            self.killed_totals.pop(metric_name, None)
+            self.orphaned_totals.pop(metric_name, None)
+
+    def get_prom_strings(self) -> List[str]:
+        """
+        Get the per metric counters in the prom format, one sample per metric
+
+        :return: a list of strings that build up to the prom string we need to write
+        """
+        prom_builders = [
+            PromStrBuilder(
+                metric_name='iris_scheduler_killed_processes_total',
+                metric_result=sum(self.killed_totals.values()),
+                help_str='the number of metric subprocesses killed because they timed out or output too much',
+                type_str='counter',
+                samples=[({'metric': name}, total) for name, total in sorted(self.killed_totals.items())]
+            ),
+            PromStrBuilder(
+                metric_name='iris_scheduler_orphaned_processes_total',
+                metric_result=sum(self.orphaned_totals.values()),
+                help_str='the number of processes left behind by metric commands that were cleaned up',
+                type_str='counter',
+                samples=[({'metric': name}, total) for name, total in sorted(self.orphaned_totals.items())]
+            ),
+        ]
+
+        return [prom_builder.create_prom_string() for prom_builder in prom_builders]
@@ -1,31 +1,124 @@
+import asyncio
 import os
-import time
-from typing import Tuple
+import socket
+from logging import Logger
+from multiprocessing.connection import Connection
+from typing import Optional, Tuple
 
 from iris.config_service.config_lint.linter import Linter
+from iris.config_service.snapshot import load_local_config
 from iris.scheduler.scheduler import Scheduler
+from iris.utils.config_notifier import ConfigSubscriber
+from iris.utils.config_watcher import ConfigWatcher
 from iris.utils.iris_logging import get_logger
 from iris.utils.prom_helpers import PromStrBuilder, PromFileWriter
 
 
 def run_scheduler(global_config_path: str, local_config_path: str, prom_dir_path: str, run_frequency: float,
-                  internal_metrics_whitelist: Tuple[str], log_path: str, log_debug_path: str) -> None:
+                  max_in_flight: int, max_spawns_per_second: float, phase_spreading: bool, max_jitter: float,
+                  shell_pool_size: int, process_table_max_age: float, command_cache_window: float,
+                  kill_grace_seconds: float, max_failure_backoff: float, quarantine_threshold: int,
+                  internal_metrics_whitelist: Tuple[str], log_path: str, log_debug_path: str,
+                  config_change_connection: Optional[Connection] = None,
+                  local_config_snapshot_path: Optional[str] = None) -> None:
     """
-    Run the Scheduler
+    Run the Scheduler. The Scheduler engine runs each metric on its own cadence, while the config refresher reloads
+    the local_config every run_frequency seconds and hands the metrics to the engine
 
     :param global_config_path: the path to the GlobalConfig object pulled down by the Config Service
     :param local_config_path: the path to the local config object created by the Config Service
     :param prom_dir_path: the path to the prom files directory that we write metric results to
-    :param run_frequency: the frequency to which we run the scheduler
+    :param run_frequency: the frequency to which we reload the local_config and write the Scheduler's own metrics
+    :param max_in_flight: the max number of metric subprocesses running at once. 0 means no limit
+    :param max_spawns_per_second: the max number of metric subprocesses spawned per second. 0 means no limit
+    :param phase_spreading: set to True to give each metric a deterministic per host phase, see
+    Scheduler.get_phase_offset
+    :param max_jitter: the max random seconds that each run of a metric is delayed by. 0 disables jitter
+    :param shell_pool_size: the number of long-lived bash coprocesses that run the metric commands. 0 disables the
+    shell pool and spawns a new subprocess for every run
+    :param process_table_max_age: the seconds a /proc scan is shared by the process_table collector metrics
+    :param command_cache_window: the seconds the output of a finished command is reused by metrics with the same
+    command. 0 only shares commands that are still running
+    :param kill_grace_seconds: the seconds the processes of a timed out metric have to exit after a SIGTERM before they
+    are killed with a SIGKILL
+    :param max_failure_backoff: the max seconds between the runs of a metric that keeps failing. 0 disables the
+    backoff
+    :param quarantine_threshold: the number of consecutive failures after which a metric stops running until its
+    config changes. 0 disables the quarantine
     :param internal_metrics_whitelist: a list of internal metrics that we don't want to count in the
     iris_custom_metrics_count metric
     :param log_path: the path to the scheduler log file
     :param log_debug_path: the path to the iris.debug file that triggers when we want to enable verbose logging
+    :param config_change_connection: the receive end of the pipe the Config Service notifies when the local_config
+    changed, see ConfigSubscriber. None only reloads the local_config every run_frequency seconds
+    :param local_config_snapshot_path: the path to the precompiled ConfigSnapshot of the local_config written by the
+    Config Service. None always lints the local_config
     :return: None
     """
     logger = get_logger('iris.scheduler', log_path, log_debug_path)
 
+    scheduler = Scheduler(
+        metrics=[],
+        prom_dir_path=prom_dir_path,
+        logger=logger,
+        max_in_flight=max_in_flight,
+        max_spawns_per_second=max_spawns_per_second,
+        phase_seed=socket.gethostname() if phase_spreading else None,  # the hostname is unique across the fleet
+        max_jitter=max_jitter,
+        shell_pool_size=shell_pool_size,
+        process_table_max_age=process_table_max_age,
+        command_cache_window=command_cache_window,
+        kill_grace_seconds=kill_grace_seconds,
+        max_failure_backoff=max_failure_backoff,
+        quarantine_threshold=quarantine_threshold
+    )
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(asyncio.gather(
+        scheduler.run_forever(),
+        refresh_scheduler(
+            scheduler=scheduler,
+            global_config_path=global_config_path,
+            local_config_path=local_config_path,
+            prom_dir_path=prom_dir_path,
+            run_frequency=run_frequency,
+            internal_metrics_whitelist=internal_metrics_whitelist,
+            logger=logger,
+            config_subscriber=ConfigSubscriber(connection=config_change_connection, logger=logger),
+            local_config_snapshot_path=local_config_snapshot_path
+        )
+    ))
+
+
+async def refresh_scheduler(scheduler: Scheduler, global_config_path: str, local_config_path: str, prom_dir_path: str,
+                            run_frequency: float, internal_metrics_whitelist: Tuple[str], logger: Logger,
+                            config_subscriber: Optional[ConfigSubscriber] = None,
+                            local_config_snapshot_path: Optional[str] = None) -> None:
+    """
+    Periodically reload the local_config into the running Scheduler engine and write the Scheduler's own metrics. The
+    config files are only re-linted when their content changed (see ConfigWatcher), and only the diff of the metrics is
+    applied to the running schedule (see Scheduler.update_metrics). The refresher wakes up as soon as the Config
+    Service publishes a new local_config (see ConfigSubscriber), instead of waiting for the next run_frequency. The
+    metrics are loaded from the ConfigSnapshot of the local_config when it is up to date (see load_local_config)
+
+    :param scheduler: the running Scheduler engine
+    :param global_config_path: the path to the GlobalConfig object pulled down by the Config Service
+    :param local_config_path: the path to the local config object created by the Config Service
+    :param prom_dir_path: the path to the prom files directory that we write metric results to
+    :param run_frequency: the frequency to which we reload the local_config and write the Scheduler's own metrics
+    :param internal_metrics_whitelist: a list of internal metrics that we don't want to count in the
+    iris_custom_metrics_count metric
+    :param logger: logger for forensics
+    :param config_subscriber: the ConfigSubscriber notified when the local_config changed. None only reloads the
+    local_config every run_frequency seconds
+    :param local_config_snapshot_path: the path to the precompiled ConfigSnapshot of the local_config written by the
+    Config Service. None always lints the local_config
+    :return: None
+    """
+    config_subscriber = config_subscriber or ConfigSubscriber(connection=None, logger=logger)
     error_flag = 0
+    linter = Linter(logger)
+    config_watcher = ConfigWatcher(paths=[global_config_path, local_config_path], logger=logger)
     while True:
         try:
             sleep_total = 0  # the accumulated sleep time for checking the global_config and local_config
@@ -41,21 +134,36 @@ def run_scheduler(global_config_path: str, local_config_path: str, prom_dir_path
                     msg = 'The scheduler is still waiting on the config_service for the global_config/local_config file'
                     logger.warning(msg)
                     sleep_total += sleep_increment
-                    time.sleep(sleep_increment)
-
-            # run linter to transform the local_config file created by the config_service into objects for the scheduler
-            logger.info('Starting linter to transform the config files created by the config_service into python objs')
-
-            linter = Linter(logger)
-            global_config_obj = linter.lint_global_config(global_config_path)
-            local_config_obj = linter.lint_metrics_config(global_config_obj, local_config_path)
-            metrics_list = list(local_config_obj.values())
-
-            logger.info('Read local_config file metrics {}'.format(', '.join([metric.name for metric in metrics_list])))
-
-            # run scheduler to asynchronously execute each metric and asynchronously write to the metric's prom file
-            scheduler = Scheduler(metrics_list, prom_dir_path, logger=logger)
-            scheduler.run()
+                    await asyncio.sleep(sleep_increment)
+
+            if config_watcher.has_changed():
+                # load the precompiled snapshot of the local_config created by the config_service, or run the linter to
+                # transform the local_config file into objects for the scheduler
+                config_snapshot = load_local_config(
+                    global_config_path=global_config_path,
+                    local_config_path=local_config_path,
+                    snapshot_path=local_config_snapshot_path,
+                    config_watcher=config_watcher,
+                    linter=linter,
+                    logger=logger
+                )
+                metrics_list = list(config_snapshot.metrics.values())
+
+                logger.info('Read local_config file metrics {}'.format(
+                    ', '.join([metric.name for metric in metrics_list])))
+
+                # hand the metrics to the scheduler engine, which runs each of them on its own cadence
+                metrics_diff = scheduler.update_metrics(
+                    metrics_list, config_snapshot.prom_file_names, config_snapshot.prom_headers)
+                for action, metric_names in [('Scheduled new', metrics_diff.added),
+                                             ('Removed', metrics_diff.removed),
+                                             ('Updated changed', metrics_diff.changed)]:
+                    if metric_names:
+                        logger.info('{} metrics {}'.format(action, ', '.join(metric_names)))
+
+                config_watcher.mark_applied()
+            else:
+                logger.info('The config files are unchanged, skipping the reload of the local_config')
 
             error_flag = 0
 
@@ -98,6 +206,28 @@ def run_scheduler(global_config_path: str, local_config_path: str, prom_dir_path
             prom_file_path = os.path.join(prom_dir_path, '{}.prom'.format(metric_name))
             prom_writer.write_prom_file(prom_file_path, prom_string)
 
-            logger.info('Sleeping the Scheduler for {} seconds\n'.format(run_frequency))
+            # expose the admission queue depth & wait time so we can size max_in_flight & max_spawns_per_second
+            prom_file_path = os.path.join(prom_dir_path, 'iris_scheduler_admission.prom')
+            prom_writer.write_prom_file(prom_file_path, *scheduler.admission.get_prom_strings())
+
+            # expose how many metric commands ran & how many runs were saved by sharing identical commands
+            prom_file_path = os.path.join(prom_dir_path, 'iris_scheduler_command_cache.prom')
+            prom_writer.write_prom_file(prom_file_path, *scheduler.command_cache.get_prom_strings())
+
+            # expose the per metric killed & orphaned process counts so we can find the metrics that leak processes
+            prom_file_path = os.path.join(prom_dir_path, 'iris_scheduler_processes.prom')
+            prom_writer.write_prom_file(prom_file_path, *scheduler.process_group_stats.get_prom_strings())
+
+            # expose the per metric timing histograms & the engine ticks so we know how close the checks run to their
+            # execution_timeout and how far behind the scheduler is
+            prom_file_path = os.path.join(prom_dir_path, 'iris_scheduler_stats.prom')
+            prom_writer.write_prom_file(prom_file_path, *scheduler.stats.get_prom_strings())
+
+            # expose the failing metrics that are backing off or quarantined, so they stay visible while they barely run
+            prom_file_path = os.path.join(prom_dir_path, 'iris_scheduler_backoff.prom')
+            prom_writer.write_prom_file(prom_file_path, *scheduler.backoff.get_prom_strings())
+
+            logger.info('Sleeping the Scheduler config refresher for {} seconds or until the local_config '
+                        'changes\n'.format(run_frequency))
 
-            time.sleep(run_frequency)
+            await config_subscriber.wait_async(run_frequency)
@@ -1,55 +1,115 @@
 import asyncio
+import hashlib
+import heapq
+import itertools
+import math
 import os
+import random
+import subprocess
 import time
-from dataclasses import dataclass
+from dataclasses import InitVar, dataclass, field
 from logging import Logger
-from typing import List, Dict
+from typing import Any, List, Dict, Optional, Tuple
 
 from iris.config_service.configs import Metric
+from iris.scheduler.admission import AdmissionController
+from iris.scheduler.backoff import FailureBackoff
+from iris.scheduler.collectors import Collectors
+from iris.scheduler.command_cache import CommandCache
+from iris.scheduler.extract import extract_value
+from iris.scheduler.metric_process import MetricProcess, get_preexec_fn
+from iris.scheduler.output_capture import discard, read_head, read_tail
+from iris.scheduler.output_formats import Sample, parse_samples
+from iris.scheduler.process_group import ProcessGroupStats, get_process_group_members, terminate_process_group
+from iris.scheduler.shell_pool import ShellPool
+from iris.scheduler.stats import SchedulerStats
 from iris.utils.prom_helpers import PromStrBuilder, PromFileWriter
+from iris.utils.util import add_slots
 
 
-@dataclass
+@add_slots
+@dataclass(frozen=True)
 class MetricResult:
     """
-    A MetricResult object contains all of the metadata related to the actual execution of the Metric command
+    A MetricResult object contains all of the metadata related to the actual execution of the Metric command. Like the
+    Metric, it is an immutable & slotted record, the Scheduler keeps the last one of each metric
 
     :param metric: a Metric object that contains the metadata needed to run the metric
     :param pid: the pid of the subprocess running this metric
     :param timeout: a boolean value that states whether the metric timedout or not
     :param return_code: the return code of running the bash command
     :param shell_output: the string output of running the bash command. This is visible in logs in debug mode
-    :param logger: logger for forensics
+    :param logger: logger for forensics, only used to parse the shell_output
+    :param scheduling_lag: the seconds between when the metric was due and when it actually started running
+    :param user_cpu_seconds: the user cpu time of the command (& of the children it waited for), from wait4's rusage.
+    None if it is unknown, ie the command ran in the ShellPool
+    :param system_cpu_seconds: the system cpu time of the command (& of the children it waited for). None if unknown
+    :param max_rss_bytes: the max resident memory of the command or of the largest child it waited for. None if unknown
+    :param spawn_latency: the seconds it took to spawn the subprocess of the command. None if no subprocess was spawned
     """
     metric: Metric
     pid: int
     timeout: bool
     return_code: int
     shell_output: str
-    logger: Logger
+    logger: InitVar[Logger]
+    scheduling_lag: float = 0.0
+    user_cpu_seconds: Optional[float] = None
+    system_cpu_seconds: Optional[float] = None
+    max_rss_bytes: Optional[int] = None
+    spawn_latency: Optional[float] = None
+    samples: Optional[List[Sample]] = field(init=False)  # the parsed samples of a multi sample output_format
+    prom_result_value: float = field(init=False)
+
+    # explicitly unhashable like its Metric, the samples are a mutable list
+    __hash__ = None  # type: ignore
 
     err_msg_format = 'Metric {} must output a number via command {}. Current result {}'
+    extract_err_msg_format = 'Metric {} failed to extract a number from the output of command {}. Err: {}'
 
-    def __post_init__(self) -> None:
+    def __post_init__(self, logger: Logger) -> None:
         """
-        Check if the format of the MetricResult is correct
+        Check if the format of the MetricResult is correct. The output of a metric with a multi sample output_format is
+        parsed into its samples, and its prom_result_value is the number of samples
 
+        :param logger: logger for forensics
         :return: None, raises ValueError if the fields are not set correctly
         """
-        if self.return_code != 0:
-            self.prom_result_value = -1.0
-        else:
+        samples: Optional[List[Sample]] = None
+        prom_result_value = -1.0
+        if self.metric.output_format != 'value':
+            samples = []
+            if self.return_code == 0:
+                try:
+                    samples = parse_samples(self.metric.output_format, self.shell_output, self.metric.name)
+                    prom_result_value = float(len(samples))
+                except ValueError as e:
+                    err_fmt = 'Metric {} must output {} samples via command {}. Err: {}'
+                    logger.error(err_fmt.format(self.metric.name, self.metric.output_format,
+                                                self.metric.bash_command, e))
+
+        elif self.return_code == 0:
             try:
-                self.prom_result_value = float(self.shell_output)
-            except ValueError:
-                err_msg = self.err_msg_format.format(self.metric.name, self.metric.bash_command, self.shell_output)
-                self.logger.error(err_msg)
-                self.prom_result_value = -1.0
+                if self.metric.extract is not None:
+                    prom_result_value = float(extract_value(self.metric.extract, self.shell_output))
+                else:
+                    prom_result_value = float(self.shell_output)
+            except ValueError as e:
+                if self.metric.extract is not None:
+                    err_msg = self.extract_err_msg_format.format(self.metric.name, self.metric.bash_command, e)
+                else:
+                    err_msg = self.err_msg_format.format(self.metric.name, self.metric.bash_command, self.shell_output)
+                logger.error(err_msg)
+
+        object.__setattr__(self, 'samples', samples)  # the MetricResult is frozen
+        object.__setattr__(self, 'prom_result_value', prom_result_value)
 
-    def get_prom_strings(self) -> List[str]:
+    def get_prom_strings(self, prom_header: Optional[str] = None) -> List[str]:
         """
         Get the MetricResult in the prom format for when we need to write these results to a .prom file
 
+        :param prom_header: the precomputed HELP & TYPE lines of the metric (see ConfigSnapshot). Optional, they are
+        formatted from the metric if it is not set
         :return: a list of strings that build up to the prom string we need to write
         """
         main_metric_builder = PromStrBuilder(
@@ -57,7 +117,9 @@ class MetricResult:
             metric_result=self.prom_result_value,
             help_str=self.metric.help,
             type_str=self.metric.metric_type,
-            labels={'execution_frequency': self.metric.execution_frequency}
+            labels={'execution_frequency': self.metric.execution_frequency},
+            samples=self.samples,
+            header=prom_header
         )
         return_code_builder = PromStrBuilder(
             metric_name='iris_{}_returncode'.format(self.metric.name),
@@ -65,8 +127,18 @@ class MetricResult:
             help_str='the execution return code',
             type_str='gauge',
         )
+        scheduling_lag_builder = PromStrBuilder(
+            metric_name='iris_{}_scheduling_lag_seconds'.format(self.metric.name),
+            metric_result=round(self.scheduling_lag, 6),
+            help_str='the seconds between the intended and the actual start of the execution',
+            type_str='gauge',
+        )
 
-        return [main_metric_builder.create_prom_string(), return_code_builder.create_prom_string()]
+        return [
+            main_metric_builder.create_prom_string(),
+            return_code_builder.create_prom_string(),
+            scheduling_lag_builder.create_prom_string()
+        ]
 
     def __str__(self) -> str:
         """
@@ -78,6 +150,43 @@ class MetricResult:
         return template_str.format(self.metric.name, self.pid, self.return_code, self.shell_output)
 
 
+@dataclass
+class MetricsDiff:
+    """
+    A MetricsDiff is the diff that Scheduler.update_metrics applied to the running schedule
+
+    :param added: the names of the metrics that were added to the schedule
+    :param removed: the names of the metrics that were removed from the schedule
+    :param changed: the names of the metrics whose config changed
+    """
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+
+
+@dataclass
+class MetricRunState:
+    """
+    A MetricRunState is the Scheduler's in-memory record of a metric's runs. It is the source of truth for when a metric
+    runs next, so the Scheduler never has to stat the metric's prom file. All times are in time.monotonic() seconds
+
+    :param prom_file_path: the path to the prom file that the metric's results are written to
+    :param next_due: the time at which the metric should run next
+    :param last_start: the time at which the last run of the metric started
+    :param last_finish: the time at which the last run of the metric finished
+    :param last_result: the MetricResult of the last run of the metric
+    :param running_task: the task of the run of the metric that is in flight, if any
+    :param queued_start: the intended start of the run that is queued behind the running one (overlap: queue-one)
+    """
+    prom_file_path: str
+    next_due: float
+    last_start: Optional[float] = None
+    last_finish: Optional[float] = None
+    last_result: Optional[MetricResult] = None
+    running_task: Optional[asyncio.Future] = None
+    queued_start: Optional[float] = None
+
+
 @dataclass
 class Scheduler:
     """
@@ -86,123 +195,806 @@ class Scheduler:
     created this local_config by matching the ihr:iris:profile tag of the ec2 host to the correct profile json
     config pulled from S3
 
+    The Scheduler is a long-lived engine (see run_forever). It keeps a min-heap of each metric's next due time and
+    wakes up exactly at the earliest deadline, so every metric runs on its own cadence instead of on a fixed tick
+
     :param metrics: the list of metrics/local_config_object the Scheduler needs to run
     :param prom_dir_path: the path to the prom files directory that we write metric results to
     :param logger: logger for forensics
+    :param max_in_flight: the max number of metric subprocesses running at once. 0 means no limit
+    :param max_spawns_per_second: the max number of metric subprocesses spawned per second. 0 means no limit
+    :param phase_seed: the host identity that spreads the metrics' phases, see get_phase_offset. None disables phase
+    spreading
+    :param max_jitter: the max random seconds that each run of a metric is delayed by. 0 disables jitter
+    :param shell_pool_size: the number of long-lived bash coprocesses that run the metric commands, see ShellPool.
+    0 disables the pool and spawns a new subprocess for every run
+    :param process_table_max_age: the seconds a /proc scan is shared by the process_table collector metrics
+    :param command_cache_window: the seconds the output of a finished command is reused by metrics with the same
+    command, see CommandCache. 0 only shares commands that are still running
+    :param kill_grace_seconds: the seconds the processes of a stopped metric have to exit after a SIGTERM before they
+    are killed with a SIGKILL
+    :param max_failure_backoff: the max seconds between the runs of a metric that keeps failing, see FailureBackoff.
+    0 disables the backoff
+    :param quarantine_threshold: the number of consecutive failures after which a metric stops running until its
+    config changes. 0 disables the quarantine
     """
     metrics: List[Metric]
     prom_dir_path: str
     logger: Logger
+    max_in_flight: int = 0
+    max_spawns_per_second: float = 0
+    phase_seed: Optional[str] = None
+    max_jitter: float = 0
+    shell_pool_size: int = 0
+    process_table_max_age: float = 5
+    command_cache_window: float = 0
+    kill_grace_seconds: float = 2
+    max_failure_backoff: float = 0
+    quarantine_threshold: int = 0
 
-    def run(self) -> List[MetricResult]:
+    def __post_init__(self) -> None:
         """
-        Run the list of metrics specified in the local_config_file/object
+        Initialize the admission control, the run state table, the schedule (a min-heap of (next_due, sequence,
+        metric_name) entries) and schedule the metrics
 
-        :return: a list of MetricResults. See MetricResult class above
+        :return: None, raises ValueError if the fields are not set correctly
+        """
+        if self.max_jitter < 0:
+            err_msg = 'Invalid Scheduler max_jitter: {} must be >= 0'.format(self.max_jitter)
+            self.logger.error(err_msg)
+            raise ValueError(err_msg)
+
+        self.admission = AdmissionController(
+            max_in_flight=self.max_in_flight,
+            max_spawns_per_second=self.max_spawns_per_second,
+            logger=self.logger
+        )
+        self.shell_pool = ShellPool(size=self.shell_pool_size, logger=self.logger) if self.shell_pool_size else None
+        self.collectors = Collectors(process_table_max_age=self.process_table_max_age, logger=self.logger)
+        self.command_cache = CommandCache(window=self.command_cache_window, logger=self.logger)
+        self.process_group_stats = ProcessGroupStats(logger=self.logger)
+        self.stats = SchedulerStats(logger=self.logger)
+        self.backoff = FailureBackoff(
+            max_backoff=self.max_failure_backoff,
+            quarantine_threshold=self.quarantine_threshold,
+            logger=self.logger
+        )
+        self.run_states: Dict[str, MetricRunState] = {}
+        self._schedule: List[Tuple[float, int, str]] = []
+        self._schedule_sequence = itertools.count()  # breaks ties between metrics that are due at the same time
+        self._metrics_by_name: Dict[str, Metric] = {}
+        self._prom_headers: Dict[str, str] = {}
+        self._running_tasks: Dict[asyncio.Future, str] = {}
+        self._schedule_changed: Optional[asyncio.Event] = None
+
+        self.update_metrics(self.metrics)
+
+    def update_metrics(self, metrics: List[Metric], prom_file_names: Optional[Dict[str, str]] = None,
+                       prom_headers: Optional[Dict[str, str]] = None) -> MetricsDiff:
         """
-        prom_file_paths_and_metrics = self.get_prom_files_to_write().items()
-        tasks = [self.run_metric_task(prom_path, metric) for prom_path, metric in prom_file_paths_and_metrics]
+        Apply the diff between the metrics the Scheduler runs and the given metrics to the running schedule. Unchanged
+        metrics keep their Metric object, run state & in-flight run. Removed metrics are dropped from the schedule and
+        new metrics get a run state seeded from their prom file (see _seed_run_state). Changed metrics keep their run
+        state, see _apply_metric_change
+
+        :param metrics: the list of metrics/local_config_object the Scheduler needs to run
+        :param prom_file_names: the precomputed prom file name of each metric, by name (see ConfigSnapshot). Optional,
+        the names of the metrics missing from it are formatted
+        :param prom_headers: the precomputed prom header of each metric, by name (see ConfigSnapshot). Optional, the
+        headers of the metrics missing from it are formatted on every run
+        :return: the MetricsDiff of the added, removed & changed metrics
+        """
+        previous_metrics = self._metrics_by_name
+        self._metrics_by_name = {}
+        self._prom_headers = prom_headers or {}
+        prom_file_names = prom_file_names or {}
+
+        now = time.monotonic()
+        metrics_diff = MetricsDiff()
+        for metric in metrics:
+            previous_metric = previous_metrics.get(metric.name)
+            if metric.name not in self.run_states:
+                self.run_states[metric.name] = self._seed_run_state(metric, now, prom_file_names.get(metric.name))
+                if self.phase_seed is not None:
+                    run_state = self.run_states[metric.name]
+                    run_state.next_due = self._align_to_phase(metric, run_state.next_due, now)
+                self._push_schedule(metric.name, self.run_states[metric.name].next_due)
+                metrics_diff.added.append(metric.name)
+
+            elif previous_metric is not None and previous_metric == metric:
+                metric = previous_metric
+
+            elif previous_metric is not None:
+                self._apply_metric_change(metric, now)
+                metrics_diff.changed.append(metric.name)
+
+            self._metrics_by_name[metric.name] = metric
+        self.metrics = list(self._metrics_by_name.values())
+
+        # the heap entries of removed metrics are discarded once they are popped, see pop_due_metrics
+        metrics_diff.removed = [name for name in self.run_states if name not in self._metrics_by_name]
+        for metric_name in metrics_diff.removed:
+            del self.run_states[metric_name]
+        self.stats.forget_metrics(metrics_diff.removed)
+        self.process_group_stats.forget_metrics(metrics_diff.removed)
+        self.backoff.forget_metrics(metrics_diff.removed)
+
+        if self._schedule_changed is not None and (metrics_diff.added or metrics_diff.changed):
+            self._schedule_changed.set()
+
+        return metrics_diff
+
+    def _apply_metric_change(self, metric: Metric, now: float) -> None:
+        """
+        Helper method for update_metrics to reschedule a metric whose config changed. Its next run uses the new
+        config. Its failure backoff is reset (a quarantined metric runs right away) and its next run is pulled in if
+        its execution_frequency got shorter
 
-        loop = asyncio.get_event_loop()
-        result = loop.run_until_complete(asyncio.gather(*tasks))
+        :param metric: the changed Metric
+        :param now: the current time.monotonic() time
+        :return: None
+        """
+        run_state = self.run_states[metric.name]
+        if self.backoff.reset(metric.name):
+            self.logger.info('Lifted the quarantine of metric {}, its config changed'.format(metric.name))
+            self._push_schedule(metric.name, now)
+            return
 
-        self.logger.info('Finished writing to all prom files at: {}'.format(self.prom_dir_path))
+        next_due = (run_state.last_start if run_state.last_start is not None else now) + metric.execution_frequency
+        if next_due < run_state.next_due:
+            self._push_schedule(metric.name, max(next_due, now))
 
-        return result  # type: ignore
+    def _seed_run_state(self, metric: Metric, now: float, prom_file_name: Optional[str] = None) -> MetricRunState:
+        """
+        Helper method for update_metrics to create the run state of a newly scheduled metric. This is the only time the
+        Scheduler looks at the metric's prom file: its last modified time tells us when the metric last finished (ie
+        before Iris restarted), so we don't rerun every metric on startup. A missing prom file means the metric is due
+
+        :param metric: the newly scheduled Metric
+        :param now: the current time.monotonic() time
+        :param prom_file_name: the precomputed prom file name of the metric. Optional, it is formatted if it is not set
+        :return: the MetricRunState of the metric
+        """
+        prom_file_path = os.path.join(self.prom_dir_path, prom_file_name or '{}.prom'.format(metric.name))
+        run_state = MetricRunState(prom_file_path=prom_file_path, next_due=now)
+
+        try:
+            elapsed_time = time.time() - os.stat(prom_file_path).st_mtime
+        except OSError:
+            self.logger.info('Creating the new prom file at: {}'.format(prom_file_path))
+            return run_state
+
+        run_state.last_finish = now - elapsed_time
+        if elapsed_time < metric.execution_frequency:
+            self.logger.info('Not running metric: {} yet. Execution frequency not met.'.format(metric.name))
+            run_state.next_due = now + metric.execution_frequency - elapsed_time
 
-    def get_prom_files_to_write(self) -> Dict[str, Metric]:
+        return run_state
+
+    def get_phase_offset(self, metric: Metric) -> float:
         """
-        Determine which metrics to run by checking if the last modified time of the metric's prom file is greater than
-        or equal to the metric's execution frequency. This ensures that we don't always run every metric when the
-        Scheduler wakes up
+        Get the deterministic phase offset of a metric on this host: a hash of the phase_seed (the host identity) and
+        the metric name modulo the metric's execution frequency. The metric runs when the wall clock time modulo its
+        execution frequency equals the offset, so the metrics of a host (and the same metric across the fleet) don't
+        all run in the same instant after a restart or a deploy
 
-        :return: a dict with key: a Metric's prom_file_path, val: the actual Metric object
+        :param metric: the Metric we want the phase offset of
+        :return: the phase offset in seconds, between 0 and the metric's execution frequency
         """
-        prom_files_to_write = {}
-        for metric in self.metrics:
-            prom_file_path = os.path.join(self.prom_dir_path, '{}.prom'.format(metric.name))
+        phase_key = '{}:{}'.format(self.phase_seed, metric.name).encode('utf-8')
+        phase_hash = int(hashlib.sha1(phase_key).hexdigest(), 16)
 
-            if os.path.isfile(prom_file_path):
-                prom_file_last_mod_time = os.stat(prom_file_path).st_mtime
-                elapsed_time = time.time() - prom_file_last_mod_time
+        return phase_hash % (metric.execution_frequency * 1000) / 1000
 
-                if elapsed_time >= metric.execution_frequency:
-                    prom_files_to_write[prom_file_path] = metric
-                else:
-                    self.logger.info('Not running metric: {} yet. Execution frequency not met.'.format(metric.name))
-            else:
-                self.logger.info('Creating the new prom file at: {}'.format(prom_file_path))
-                prom_files_to_write[prom_file_path] = metric
+    def _align_to_phase(self, metric: Metric, due: float, now: float) -> float:
+        """
+        Helper method to delay a metric's due time to its next phase slot, see get_phase_offset
+
+        :param metric: the Metric we want to align
+        :param due: the time.monotonic() time the metric would be due without phase spreading
+        :param now: the current time.monotonic() time
+        :return: the time.monotonic() time of the metric's first phase slot at or after due
+        """
+        due_wall_time = time.time() + (due - now)
+        return due + (self.get_phase_offset(metric) - due_wall_time) % metric.execution_frequency
+
+    def _get_jitter(self, metric: Metric) -> float:
+        """
+        Helper method to get the random delay of a single run of a metric. The jitter is bounded by max_jitter and by
+        the slack between the metric's execution timeout and frequency, so a jittered run still finishes before the
+        metric is due again
+
+        :param metric: the Metric that is about to run
+        :return: the jitter in seconds
+        """
+        max_jitter = min(self.max_jitter, metric.execution_frequency - metric.execution_timeout)
+        return random.uniform(0, max_jitter) if max_jitter > 0 else 0.0
+
+    async def run_forever(self) -> None:
+        """
+        Run the scheduling engine until it is cancelled. The engine sleeps until the earliest next due time in the
+        schedule (or until the schedule changes) and then starts each due metric as its own task
+
+        :return: None
+        """
+        self._schedule_changed = asyncio.Event()
+
+        while True:
+            delay = self._schedule[0][0] - time.monotonic() if self._schedule else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._schedule_changed.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._schedule_changed.clear()
+                continue
+
+            self.dispatch_due_metrics()
+
+    def dispatch_due_metrics(self) -> List[str]:
+        """
+        Start a task for each metric whose next due time has passed, see pop_due_metrics. Each run is delayed by a
+        random jitter when max_jitter is set. The tick is recorded in the SchedulerStats. A metric whose previous run
+        is still in flight is handled by its overlap policy, see _handle_overlap
+
+        :return: a list of the names of the metrics that were started
+        """
+        due_metrics = self.pop_due_metrics()
+        if due_metrics:
+            earliest_due = min(intended_start for _, intended_start in due_metrics)
+            self.stats.record_tick(len(due_metrics), max(time.monotonic() - earliest_due, 0.0))
+
+        dispatched_metrics = []
+        for metric, intended_start in due_metrics:
+            run_state = self.run_states[metric.name]
+            intended_start += self._get_jitter(metric)
+
+            if run_state.running_task is not None and not self._handle_overlap(metric, run_state, intended_start):
+                continue
+
+            self._start_metric_task(metric, run_state, intended_start)
+            dispatched_metrics.append(metric.name)
+
+        return dispatched_metrics
+
+    def _handle_overlap(self, metric: Metric, run_state: MetricRunState, intended_start: float) -> bool:
+        """
+        Helper method for dispatch_due_metrics to apply the overlap policy of a metric that came due while its
+        previous run is still in flight, so slow checks can't pile up processes. Skipped, queued & killed runs are
+        counted in the SchedulerStats
+
+        - skip: the new run is dropped
+        - queue-one: the new run starts once the previous run finishes. A run that comes due while one is already
+          queued is dropped
+        - kill-previous: the previous run is cancelled (its process group is stopped) and the new run starts now
+
+        :param metric: the Metric that came due
+        :param run_state: the MetricRunState of the metric
+        :param intended_start: the time.monotonic() time the new run is due
+        :return: True if the new run should start now, else False
+        """
+        if metric.overlap == 'kill-previous':
+            run_state.running_task.cancel()  # type: ignore
+            run_state.running_task = None
+            self.stats.record_overlap(metric.name, 'killed')
+            self.logger.warning('Metric {} came due while its previous run is in flight. Killed the previous '
+                                'run'.format(metric.name))
+            return True
+
+        if metric.overlap == 'queue-one' and run_state.queued_start is None:
+            run_state.queued_start = intended_start
+            self.stats.record_overlap(metric.name, 'queued')
+            self.logger.warning('Metric {} came due while its previous run is in flight. Queued the new '
+                                'run'.format(metric.name))
+            return False
+
+        self.stats.record_overlap(metric.name, 'skipped')
+        self.logger.warning('Metric {} came due while its previous run is in flight. Skipped the new run'.format(
+            metric.name))
+        return False
+
+    def _start_metric_task(self, metric: Metric, run_state: MetricRunState, intended_start: float) -> None:
+        """
+        Helper method to start a run of a metric as its own task
+
+        :param metric: the Metric to run
+        :param run_state: the MetricRunState of the metric
+        :param intended_start: the time.monotonic() time the run is due
+        :return: None
+        """
+        task = asyncio.ensure_future(self.run_metric_task(run_state.prom_file_path, metric, intended_start))
+        self._running_tasks[task] = metric.name
+        run_state.running_task = task
+        task.add_done_callback(self._on_metric_task_done)
+
+    def pop_due_metrics(self) -> List[Tuple[Metric, float]]:
+        """
+        Pop each metric whose next due time has passed off the schedule and push its following due time. The next due
+        time is computed from the intended start time, not the actual one, so metrics do not drift
+
+        :return: a list of (metric, intended start time) tuples of the due metrics
+        """
+        now = time.monotonic()
+        due_metrics = []
+        while self._schedule and self._schedule[0][0] <= now:
+            intended_start, _, metric_name = heapq.heappop(self._schedule)
+            run_state = self.run_states.get(metric_name)
+            if run_state is None or run_state.next_due != intended_start:
+                continue  # stale entry of a metric that was removed from the schedule
+
+            metric = self._metrics_by_name[metric_name]
+            due_metrics.append((metric, intended_start))
+
+            next_due = intended_start + metric.execution_frequency
+            if next_due <= now:  # the engine fell behind by a whole period, don't burst to catch up
+                next_due = now + metric.execution_frequency
+            self._push_schedule(metric_name, next_due)
+
+        return due_metrics
+
+    def _push_schedule(self, metric_name: str, next_due: float) -> None:
+        """
+        Helper method to set the next due time (in time.monotonic() seconds) of a metric
+
+        :param metric_name: the name of the metric to schedule
+        :param next_due: the time at which the metric should run next
+        :return: None
+        """
+        self.run_states[metric_name].next_due = next_due
+        heapq.heappush(self._schedule, (next_due, next(self._schedule_sequence), metric_name))
+
+    def _on_metric_task_done(self, task: asyncio.Future) -> None:
+        """
+        Helper method that forgets a finished metric task and logs the error it raised, if any. The run the metric
+        queued behind this one (overlap: queue-one) is started, unless the metric was removed or quarantined
+
+        :param task: the finished task created in _start_metric_task
+        :return: None
+        """
+        metric_name = self._running_tasks.pop(task)
+        if not task.cancelled() and task.exception():
+            self.logger.error('Metric {} task has an err: {}'.format(metric_name, task.exception()))
+
+        run_state = self.run_states.get(metric_name)
+        if run_state is None or run_state.running_task is not task:
+            return  # the metric was removed, or this run was killed by a newer run of the metric
+
+        run_state.running_task = None
+        if run_state.queued_start is not None:
+            queued_start, run_state.queued_start = run_state.queued_start, None
+            if not self.backoff.is_quarantined(metric_name):
+                self._start_metric_task(self._metrics_by_name[metric_name], run_state, queued_start)
+
+    def run(self) -> List[MetricResult]:
+        """
+        Run the metrics specified in the local_config_file/object that are currently due once
+
+        :return: a list of MetricResults. See MetricResult class above
+        """
+        due_metrics = self.pop_due_metrics()
+        tasks = [
+            self.run_metric_task(self.run_states[metric.name].prom_file_path, metric, intended_start)
+            for metric, intended_start in due_metrics
+        ]
+
+        loop = asyncio.get_event_loop()
+        result = loop.run_until_complete(asyncio.gather(*tasks))
+
+        self.logger.info('Finished writing to all prom files at: {}'.format(self.prom_dir_path))
 
-        return prom_files_to_write
+        return result  # type: ignore
 
-    async def run_metric_task(self, prom_file_path: str, metric: Metric) -> MetricResult:
+    async def run_metric_task(self, prom_file_path: str, metric: Metric,
+                              intended_start: Optional[float] = None) -> MetricResult:
         """
         Asynchronously run a single Metric by creating a coroutine for the Async EventLoop to execute.
         This function also asynchronously writes (using aiofiles library) a MetricResult to its associated prom file.
         See iris/utils/prom_helpers.py
 
+        The metric waits until its intended start and for the AdmissionController to admit it before its subprocess
+        is spawned, unless it shares the output of an identical command (see _run_command). Metrics with a native
+        collector run in process and skip the admission. A run of a metric that was removed from the schedule while it
+        was in flight records nothing
+
         :param prom_file_path: the path to the prom file that we write the MetricResult to
         :param metric: the Metric we want to asynchronously schedule and run
+        :param intended_start: the time.monotonic() time the metric was due. Used to report the scheduling lag
         :return: the MetricResult after executing the Metric
         """
-        metric_result = await self._create_metric_task(metric)
-        result_prom_strings = metric_result.get_prom_strings()
+        run_state = self.run_states.get(metric.name)
+        if intended_start is not None and intended_start > time.monotonic():
+            await asyncio.sleep(intended_start - time.monotonic())
+
+        scheduling_lag = self._start_run(run_state, intended_start)
+        start = time.monotonic()
+        if metric.collector:
+            metric_result = await self._run_collector(metric, metric.collector, scheduling_lag)
+        else:
+            metric_result = await self._run_command(metric, scheduling_lag)
+
+        duration = time.monotonic() - start
+        if self.run_states.get(metric.name) is not run_state:
+            self.logger.warning('Metric {} was removed from the schedule while it ran, dropping its result'.format(
+                metric.name))
+            return metric_result
+
+        self.stats.record_run(
+            metric_name=metric.name,
+            execution_timeout=metric.execution_timeout,
+            duration=duration,
+            scheduling_lag=scheduling_lag,
+            spawn_latency=metric_result.spawn_latency,
+            cpu_seconds=(metric_result.user_cpu_seconds + metric_result.system_cpu_seconds
+                         if metric_result.user_cpu_seconds is not None and metric_result.system_cpu_seconds is not None
+                         else None)
+        )
+
+        if run_state:
+            run_state.last_finish = time.monotonic()
+            run_state.last_result = metric_result
+            self._apply_backoff(metric, run_state, metric_result)
+
+        # the precomputed header only matches the current config of the metric, not the one of a run of a changed metric
+        prom_header = self._prom_headers.get(metric.name) if self._metrics_by_name.get(metric.name) is metric else None
+        result_prom_strings = metric_result.get_prom_strings(prom_header)
 
         prom_writer = PromFileWriter(logger=self.logger)
         await prom_writer.write_prom_file(prom_file_path, *result_prom_strings, is_async=True)  # type: ignore
 
         return metric_result
 
-    async def _create_metric_task(self, metric: Metric) -> MetricResult:
+    def _apply_backoff(self, metric: Metric, run_state: MetricRunState, metric_result: MetricResult) -> None:
+        """
+        Helper method for run_metric_task to delay the next run of a failing metric, or to take it off the schedule
+        once it is quarantined, see FailureBackoff
+
+        :param metric: the Metric that ran
+        :param run_state: the MetricRunState of the metric
+        :param metric_result: the MetricResult of the run
+        :return: None
+        """
+        failed = metric_result.timeout or metric_result.return_code != 0
+        delay = self.backoff.record_result(metric.name, metric.execution_frequency, failed)
+        if delay is None:
+            run_state.next_due = math.inf  # its heap entry is discarded once it is popped, see pop_due_metrics
+            return
+
+        next_due = run_state.last_start + delay  # type: ignore
+        if next_due > run_state.next_due:
+            self._push_schedule(metric.name, next_due)
+
+    @staticmethod
+    def _start_run(run_state: Optional[MetricRunState], intended_start: Optional[float]) -> float:
+        """
+        Helper method for run_metric_task to record the start of a metric's run in its run state
+
+        :param run_state: the MetricRunState of the metric. None if the metric isn't scheduled (ie in tests)
+        :param intended_start: the time.monotonic() time the metric was due
+        :return: the scheduling lag, the seconds between when the metric was due and when it actually started running
+        """
+        start = time.monotonic()
+        if run_state:
+            run_state.last_start = start
+
+        return start - intended_start if intended_start is not None else 0.0
+
+    async def _run_collector(self, metric: Metric, collector: str, scheduling_lag: float) -> MetricResult:
+        """
+        Helper method for run_metric_task to run the metric's native collector in the event loop, see Collectors
+
+        :param metric: the Metric we want to collect
+        :param collector: the name of the metric's collector
+        :param scheduling_lag: the seconds between when the metric was due and when it actually started running
+        :return: the MetricResult after collecting the Metric. The return_code is 1 if the collector failed
+        """
+        try:
+            shell_output = str(await self.collectors.collect(collector, metric.collector_args or {}))
+            return_code = 0
+        except (OSError, ValueError) as e:
+            shell_output = 'Collector {} failed. Err: {}'.format(collector, e)
+            return_code = 1
+
+        metric_result = MetricResult(
+            metric=metric,
+            pid=0,
+            timeout=False,
+            return_code=return_code,
+            shell_output=shell_output,
+            logger=self.logger,
+            scheduling_lag=scheduling_lag
+        )
+        if return_code:
+            self.logger.error(metric_result)
+        else:
+            self.logger.info(metric_result)
+
+        return metric_result
+
+    async def _run_command(self, metric: Metric, scheduling_lag: float) -> MetricResult:
+        """
+        Helper method for run_metric_task to run the metric's command through the CommandCache. The command is only
+        spawned (once admitted) if no identical command is running or finished in the cache window, else the metric
+        gets a MetricResult of its own from the shared output
+
+        :param metric: the Metric we want to run
+        :param scheduling_lag: the seconds between when the metric was due and when it actually started running
+        :return: the MetricResult after executing the Metric
+        """
+        async def run_command() -> MetricResult:
+            async with self.admission.admit():
+                return await self._create_metric_task(metric, scheduling_lag)
+
+        command_result, shared = await self.command_cache.run(CommandCache.get_command_key(metric), run_command)
+        if not shared:
+            return command_result
+
+        metric_result = MetricResult(
+            metric=metric,
+            pid=command_result.pid,
+            timeout=command_result.timeout,
+            return_code=command_result.return_code,
+            shell_output=command_result.shell_output,
+            logger=self.logger,
+            scheduling_lag=scheduling_lag
+        )
+        self.logger.info('{}. Shared the output of metric: {}'.format(metric_result, command_result.metric.name))
+
+        return metric_result
+
+    async def _create_metric_task(self, metric: Metric, scheduling_lag: float = 0.0) -> MetricResult:
         """
         Helper method for run_metric_task. This actually creates the async coroutine that runs the metric by calling
-        asyncio.create_subprocess_shell(cmd=metric.bash_command.....)
+        MetricProcess.start(metric.argv.....) for commands without shell syntax, else
+        MetricProcess.start(metric.bash_command, shell=True.....). The metric's resource limits (max_cpu_seconds,
+        max_rss_mb, nice, ioclass) are applied in the child before its command is executed, & the cpu time & max rss of
+        the command are recorded in the MetricResult, see MetricProcess
 
-        If the Metric times out, then the return_code of the MetricResult is set to -1.
+        If the Metric times out, then the return_code of the MetricResult is set to -1. If the program of the metric's
+        argv can't be executed, then the return_code is set to 127 (or 126) like /bin/sh would. If the Metric outputs
+        more than its max_output_bytes, then it is stopped and the return_code is set to -1, see _read_output
 
         Since bash commands that have pipes (ps aux | grep iris | grep -v grep | wc -l) spawn child processes for each
         sub command, we must ensure that each child process is cleaned up if the command times out. To do this, we set
-        preexec_fn=os.setsid in create_subprocess shell(...) and call os.killpg(...) to guarantee no dangling child
-        process.
+        start_new_session=True (os.setsid) in MetricProcess.start(...) and call os.killpg(...) to guarantee no
+        dangling child process, see _stop_process_group. The processes a command leaves behind after it exited (ie
+        `sleep 100 &`) are cleaned up the same way, before the subprocess is reaped so its process group id can't have
+        been reused by an unrelated process group.
         See https://stackoverflow.com/questions/4789837/how-to-terminate-a-python-subprocess-launched-with-shell-true
 
         THX PETE for finding this solution
 
+        When the Scheduler has a ShellPool, the metric runs in one of the pool's bash coprocesses instead, unless it has
+        resource limits (they would apply to the whole coprocess)
+
         :param metric: the Metric we want to asynchronously run in the subprocess shell
+        :param scheduling_lag: the seconds between when the metric was due and when it actually started running
         :return: the MetricResult after executing the Metric
         """
-        pipe = asyncio.subprocess.PIPE
-        proc = await asyncio.create_subprocess_shell(cmd=metric.bash_command, stdout=pipe, stderr=pipe)
-
-        self.logger.info('Running metric: {}. pid: {}'.format(metric.name, proc.pid))
-        task = asyncio.create_task(proc.communicate())
+        if self.shell_pool and not metric.has_resource_limits():
+            return await self._run_in_shell_pool(self.shell_pool, metric, scheduling_lag)
 
+        preexec_fn = get_preexec_fn(metric.max_cpu_seconds, metric.max_rss_mb, metric.nice, metric.ioclass, self.logger)
+        spawn_start = time.monotonic()
         try:
-            result = await asyncio.wait_for(task, timeout=metric.execution_timeout)
-            shell_output = result[0].decode('utf-8').strip() if result[0] else result[1].decode('utf-8').strip()
+            if metric.argv:
+                proc = await MetricProcess.start(metric.argv, shell=False, preexec_fn=preexec_fn)
+            else:
+                proc = await MetricProcess.start(metric.bash_command, shell=True, preexec_fn=preexec_fn)
+        except (OSError, subprocess.SubprocessError) as e:  # ie the program of the argv was removed from the host
+            if isinstance(e, OSError):
+                return_code = 126 if isinstance(e, PermissionError) else 127
+                shell_output = '{}: {}'.format(metric.argv[0] if metric.argv else metric.bash_command, e.strerror)
+            else:  # the resource limits could not be applied
+                return_code = 126
+                shell_output = 'Failed to apply the resource limits of the metric. Err: {}'.format(e)
 
             metric_result = MetricResult(
                 metric=metric,
-                pid=proc.pid,
+                pid=0,
                 timeout=False,
-                return_code=proc.returncode,
+                return_code=return_code,
                 shell_output=shell_output,
-                logger=self.logger
+                logger=self.logger,
+                scheduling_lag=scheduling_lag
             )
-            self.logger.info(metric_result)
+            self.logger.error(metric_result)
+            return metric_result
+
+        spawn_latency = time.monotonic() - spawn_start
+        log_msg = 'Running metric: {}. pid: {}. scheduling lag: {:.3f}s. spawn latency: {:.4f}s'.format(
+            metric.name, proc.pid, scheduling_lag, spawn_latency)
+        self.logger.info(log_msg)
+
+        try:
+            stdout, stderr, output_exceeded = await asyncio.wait_for(
+                self._read_output(proc, metric.max_output_bytes), timeout=metric.execution_timeout)
+
+        except asyncio.CancelledError:
+            # the run was killed by the overlap policy of the metric (kill-previous), see Scheduler._handle_overlap
+            await self._stop_process_group(metric, proc)
+            raise
 
         except asyncio.TimeoutError:
+            await self._stop_process_group(metric, proc)
             metric_result = MetricResult(
                 metric=metric,
                 pid=proc.pid,
                 timeout=True,
                 return_code=-1,
                 shell_output='TIMEOUT',
-                logger=self.logger
+                logger=self.logger,
+                scheduling_lag=scheduling_lag,
+                spawn_latency=spawn_latency,
+                **self._get_resource_usage(proc)
+            )
+            self.logger.error(metric_result)
+            return metric_result
+
+        if output_exceeded:
+            await self._stop_process_group(metric, proc)
+            metric_result = MetricResult(
+                metric=metric,
+                pid=proc.pid,
+                timeout=False,
+                return_code=-1,
+                shell_output='OUTPUT EXCEEDED {} BYTES'.format(metric.max_output_bytes),
+                logger=self.logger,
+                scheduling_lag=scheduling_lag,
+                spawn_latency=spawn_latency,
+                **self._get_resource_usage(proc)
             )
             self.logger.error(metric_result)
+            return metric_result
+
+        # the command exited, but may have left processes behind (ie `sleep 100 &`). They are looked up before the
+        # subprocess is reaped, as its zombie keeps its process group id from being reused by an unrelated group
+        if get_process_group_members(proc.pid):
+            await self._stop_process_group(metric, proc)
+        proc.reap()
+
+        raw_output: bytes = stdout if stdout else stderr
+        shell_output = raw_output.decode('utf-8', 'replace')
+        metric_result = MetricResult(
+            metric=metric,
+            pid=proc.pid,
+            timeout=False,
+            return_code=proc.returncode,  # type: ignore
+            shell_output=shell_output.strip(),
+            logger=self.logger,
+            scheduling_lag=scheduling_lag,
+            spawn_latency=spawn_latency,
+            **self._get_resource_usage(proc)
+        )
+        if proc.rusage is not None:
+            self.logger.info('{}. CPU: {:.3f}s user, {:.3f}s system. Max RSS: {} KB'.format(
+                metric_result, proc.rusage.ru_utime, proc.rusage.ru_stime, proc.rusage.ru_maxrss))
+        else:
+            self.logger.info(metric_result)
+
+        return metric_result
+
+    @staticmethod
+    def _get_resource_usage(proc: MetricProcess) -> Dict[str, Any]:
+        """
+        Helper method for _create_metric_task to get the MetricResult resource usage fields of a reaped MetricProcess
+
+        :param proc: the MetricProcess of the metric
+        :return: a dict of the user_cpu_seconds, system_cpu_seconds & max_rss_bytes of the process. Empty if the
+        process wasn't reaped (ie it didn't exit after its process group was killed)
+        """
+        if proc.rusage is None:
+            return {}
+
+        return {
+            'user_cpu_seconds': proc.rusage.ru_utime,
+            'system_cpu_seconds': proc.rusage.ru_stime,
+            'max_rss_bytes': proc.rusage.ru_maxrss * 1024  # ru_maxrss is in KB on Linux
+        }
+
+    @staticmethod
+    async def _read_output(proc: MetricProcess, max_output_bytes: int) -> Tuple[bytes, bytes, bool]:
+        """
+        Helper method for _create_metric_task to read the output of a metric's subprocess incrementally instead of
+        buffering all of it (like proc.communicate() does), so a command that dumps a large log can't balloon the
+        Scheduler's memory. The head of stdout (the result) and the tail of stderr (the error) are kept
+
+        :param proc: the subprocess of the metric
+        :param max_output_bytes: the max bytes of stdout & of the stderr tail that are kept
+        :return: a tuple of stdout, stderr & whether stdout exceeded max_output_bytes. If it did, reading stops right
+        away and the subprocess is still running, else the subprocess has exited
+        """
+        stdout_task = asyncio.ensure_future(read_head(proc.stdout, max_output_bytes))
+        stderr_task = asyncio.ensure_future(read_tail(proc.stderr, max_output_bytes))
+        try:
+            stdout, output_exceeded = await stdout_task
+            if output_exceeded:
+                return stdout, b'', True
+
+            stderr, _ = await stderr_task
+            await proc.wait()
+
+            return stdout, stderr, False
+
+        finally:
+            stdout_task.cancel()
+            stderr_task.cancel()
+
+    async def _stop_process_group(self, metric: Metric, proc: MetricProcess) -> None:
+        """
+        Helper method for _create_metric_task to stop every process of a metric's process group (the metric's
+        subprocess leads its own session, so its pipeline children & their children share its process group) with a
+        SIGTERM, then a SIGKILL after kill_grace_seconds. The subprocess is then reaped, so no zombie remains
+
+        A subprocess that was still running is counted as killed, while the processes left in the process group after
+        the subprocess exited are counted as orphaned, see ProcessGroupStats
+
+        :param metric: the Metric of the subprocess
+        :param proc: the subprocess of the metric
+        :return: None
+        """
+        if proc.poll() is None:
+            self.process_group_stats.record_killed(metric.name)
+        else:
+            orphaned_processes = get_process_group_members(proc.pid)
+            if orphaned_processes:
+                self.process_group_stats.record_orphaned(metric.name, len(orphaned_processes))
 
-            proc.terminate()
+        if await terminate_process_group(proc.pid, self.kill_grace_seconds):
+            self.logger.warning('Killed the process group of metric {} after the SIGTERM grace period of {}s'.format(
+                metric.name, self.kill_grace_seconds))
+
+        try:
+            # drain the pipes so the subprocess transport closes, then reap the subprocess
+            await asyncio.wait_for(asyncio.gather(
+                discard(proc.stdout), discard(proc.stderr), proc.wait()
+            ), timeout=self.kill_grace_seconds)
+        except asyncio.TimeoutError:
+            err_msg = 'Metric {} pid: {} still holds its pipes open after its process group was killed. A process ' \
+                      'of the command left its process group'.format(metric.name, proc.pid)
+            self.logger.error(err_msg)
+            proc.close()
+        finally:
+            proc.reap()
+
+    async def _run_in_shell_pool(self, shell_pool: ShellPool, metric: Metric, scheduling_lag: float) -> MetricResult:
+        """
+        Helper method for _create_metric_task to run the metric's bash_command in a ShellPool worker. The worker stops
+        reading the command's stdout once it exceeds the metric's max_output_bytes. The worker of a timed out command
+        or of a command whose output exceeded is killed (with the command's process group) and replaced by the
+        ShellPool
+
+        :param shell_pool: the ShellPool of the Scheduler
+        :param metric: the Metric we want to asynchronously run in the ShellPool
+        :param scheduling_lag: the seconds between when the metric was due and when it actually started running
+        :return: the MetricResult after executing the Metric
+        """
+        shell_result = await shell_pool.run(metric.bash_command, metric.execution_timeout, metric.max_output_bytes)
+
+        shell_output: str
+        if shell_result.timeout:
+            shell_output = 'TIMEOUT'
+        elif shell_result.output_exceeded:
+            shell_output = 'OUTPUT EXCEEDED {} BYTES'.format(metric.max_output_bytes)
+        else:
+            raw_output: bytes = shell_result.stdout or shell_result.stderr
+            shell_output = raw_output.decode('utf-8', 'replace')
+
+        return_code = shell_result.return_code
+
+        metric_result = MetricResult(
+            metric=metric,
+            pid=shell_result.pid,
+            timeout=shell_result.timeout,
+            return_code=return_code,
+            shell_output=shell_output.strip(),
+            logger=self.logger,
+            scheduling_lag=scheduling_lag
+        )
+
+        log_msg = '{}. Ran in shell worker in {:.3f}s'.format(metric_result, shell_result.duration)
+        if return_code == -1:
+            self.logger.error(log_msg)
+        else:
+            self.logger.info(log_msg)
 
         return metric_result
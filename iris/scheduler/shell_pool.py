@@ -0,0 +1,248 @@
+import asyncio
+import os
+import shlex
+import signal
+import time
+import uuid
+from dataclasses import dataclass
+from logging import Logger
+from typing import Optional, List
+
+from iris.scheduler.output_capture import read_frame
+
+# the max bytes of a worker's stdout/stderr that its stream readers may buffer
+STREAM_LIMIT = 2 ** 20
+
+
+@dataclass
+class ShellResult:
+    """
+    A ShellResult contains the outcome of a command that ran in a ShellWorker
+
+    :param pid: the pid of the ShellWorker that ran the command
+    :param return_code: the exit status of the command. -1 if the command timed out, its output exceeded the max
+    bytes or the worker died
+    :param stdout: the stdout of the command
+    :param stderr: the stderr of the command, only its last max output bytes are kept
+    :param duration: the seconds between sending the command to the worker and receiving its exit status
+    :param timeout: a boolean value that states whether the command timed out or not
+    :param output_exceeded: a boolean value that states whether the stdout of the command exceeded the max bytes
+    """
+    pid: int
+    return_code: int
+    stdout: bytes
+    stderr: bytes
+    duration: float
+    timeout: bool
+    output_exceeded: bool = False
+
+
+@dataclass
+class ShellWorker:
+    """
+    A ShellWorker is a long-lived bash coprocess that runs commands sent over its stdin pipe. Each command runs in a
+    subshell (a fork of the small bash process instead of the large Python parent) and is followed by a unique
+    delimiter on stdout & stderr, which frames the command's output and carries its exit status
+
+    :param shell_path: the path to the bash binary
+    :param logger: logger for forensics
+    """
+    shell_path: str
+    logger: Logger
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the ShellWorker. The bash coprocess is started in the event loop, see start
+
+        :return: None
+        """
+        self._proc: Optional[asyncio.subprocess.Process] = None
+
+    @property
+    def pid(self) -> int:
+        """
+        Get the pid of the bash coprocess
+
+        :return: the pid of the bash coprocess, 0 if it isn't started
+        """
+        return self._proc.pid if self._proc else 0
+
+    def is_alive(self) -> bool:
+        """
+        Check if the bash coprocess is running
+
+        :return: True if alive, else False
+        """
+        return self._proc is not None and self._proc.returncode is None
+
+    async def start(self) -> int:
+        """
+        Start the bash coprocess in its own session, so a timed out command & its children can be killed as a group
+
+        :return: the pid of the bash coprocess
+        """
+        pipe = asyncio.subprocess.PIPE
+        self._proc = await asyncio.create_subprocess_exec(
+            self.shell_path, '--noprofile', '--norc',
+            stdin=pipe,
+            stdout=pipe,
+            stderr=pipe,
+            start_new_session=True,
+            limit=STREAM_LIMIT
+        )
+        self.logger.info('Started shell worker pid: {}'.format(self._proc.pid))
+
+        return self._proc.pid
+
+    async def run(self, command: str, timeout: float, max_output_bytes: int) -> ShellResult:
+        """
+        Run a command in the bash coprocess and wait for its framed output. Reading the stdout stops as soon as it
+        exceeds max_output_bytes, and only the last max_output_bytes of the stderr are kept
+
+        :param command: the bash command to run
+        :param timeout: the seconds after which the command is considered timed out
+        :param max_output_bytes: the max bytes of the command's stdout/stderr to read
+        :return: the ShellResult of the command. The worker must be killed if the command timed out, its output
+                 exceeded max_output_bytes or it failed
+        """
+        if not self.is_alive():
+            await self.start()
+
+        assert self._proc and self._proc.stdin and self._proc.stdout and self._proc.stderr
+
+        token = 'iris-{}'.format(uuid.uuid4().hex)
+        stdout_delimiter = '\n{} '.format(token).encode('utf-8')
+        stderr_delimiter = '\n{}\n'.format(token).encode('utf-8')
+
+        # eval turns syntax errors of the command into a non zero exit status instead of breaking the framing
+        job = '( eval {} ) </dev/null; printf \'\\n%s %d\\n\' {} "$?"; printf \'\\n%s\\n\' {} >&2\n'.format(
+            shlex.quote(command), token, token)
+
+        start = time.monotonic()
+        stderr_read = asyncio.ensure_future(read_frame(
+            self._proc.stderr, stderr_delimiter, max_output_bytes, keep_tail=True))
+        try:
+            self._proc.stdin.write(job.encode('utf-8'))
+            await self._proc.stdin.drain()
+
+            stdout, exit_status, output_exceeded = await asyncio.wait_for(
+                read_frame(self._proc.stdout, stdout_delimiter, max_output_bytes), timeout=timeout)
+            if output_exceeded:
+                return ShellResult(self.pid, -1, b'', b'', time.monotonic() - start, timeout=False,
+                                   output_exceeded=True)
+
+            stderr, _, _ = await asyncio.wait_for(stderr_read, timeout=max(timeout - (time.monotonic() - start), 0))
+            return_code = int(exit_status)
+
+        except asyncio.TimeoutError:
+            return ShellResult(self.pid, -1, b'', b'', time.monotonic() - start, timeout=True)
+
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            self.logger.error('Shell worker pid: {} failed to run command {}. Err: {}'.format(self.pid, command, e))
+            return ShellResult(self.pid, -1, b'', b'', time.monotonic() - start, timeout=False)
+
+        finally:
+            if stderr_read.done() and not stderr_read.cancelled():
+                stderr_read.exception()  # retrieve it, the stderr of a failed command is dropped
+            stderr_read.cancel()
+
+        return ShellResult(
+            pid=self.pid,
+            return_code=return_code,
+            stdout=stdout,
+            stderr=stderr,
+            duration=time.monotonic() - start,
+            timeout=False
+        )
+
+    async def kill(self) -> Optional[int]:
+        """
+        Kill the bash coprocess and every process of its session (ie the subshell of a timed out command)
+
+        :return: the exit code of the bash coprocess
+        """
+        if self._proc is None:
+            return None
+
+        if self._proc.returncode is None:
+            try:
+                os.killpg(self._proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        return_code = await self._proc.wait()
+        self.logger.info('Killed shell worker pid: {}'.format(self._proc.pid))
+
+        return return_code
+
+
+@dataclass
+class ShellPool:
+    """
+    The ShellPool is an execution backend for the Scheduler that dispatches metric commands to a small pool of
+    long-lived bash coprocesses instead of spawning a new shell from the Scheduler process on every run. A worker
+    whose command timed out or failed is killed and replaced with a new one
+
+    :param size: the max number of bash coprocesses
+    :param logger: logger for forensics
+    :param shell_path: the path to the bash binary
+    """
+    size: int
+    logger: Logger
+    shell_path: str = '/bin/bash'
+
+    def __post_init__(self) -> None:
+        """
+        Check if the size of the ShellPool is correct. Workers are started on demand, see run
+
+        :return: None, raises ValueError if the fields are not set correctly
+        """
+        if self.size < 1:
+            err_msg = 'Invalid ShellPool size: {} must be >= 1'.format(self.size)
+            self.logger.error(err_msg)
+            raise ValueError(err_msg)
+
+        self.workers: List[ShellWorker] = []
+        self._idle_workers: Optional[asyncio.Queue] = None  # created in the event loop, see run
+
+    async def run(self, command: str, timeout: float, max_output_bytes: int = STREAM_LIMIT) -> ShellResult:
+        """
+        Run a command on an idle worker, starting a new worker if none is idle and the pool isn't full
+
+        :param command: the bash command to run
+        :param timeout: the seconds after which the command is considered timed out
+        :param max_output_bytes: the max bytes of the command's stdout/stderr to read, see ShellWorker.run
+        :return: the ShellResult of the command
+        """
+        if self._idle_workers is None:
+            self._idle_workers = asyncio.Queue()
+
+        if self._idle_workers.empty() and len(self.workers) < self.size:
+            worker = ShellWorker(shell_path=self.shell_path, logger=self.logger)
+            self.workers.append(worker)
+        else:
+            worker = await self._idle_workers.get()
+
+        result = None
+        try:
+            result = await worker.run(command, timeout, max_output_bytes)
+        finally:
+            if result is None or result.return_code == -1:  # recycle the worker, its state is unknown
+                await worker.kill()
+                new_worker = ShellWorker(shell_path=self.shell_path, logger=self.logger)
+                self.workers = [new_worker if pool_worker is worker else pool_worker for pool_worker in self.workers]
+                worker = new_worker
+            self._idle_workers.put_nowait(worker)
+
+        return result
+
+    async def close(self) -> List[Optional[int]]:
+        """
+        Kill every worker of the pool
+
+        :return: a list of the exit codes of the workers
+        """
+        return_codes = [await worker.kill() for worker in self.workers]
+        self.workers = []
+
+        return return_codes
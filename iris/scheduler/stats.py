@@ -0,0 +1,233 @@
+import bisect
+from dataclasses import dataclass
+from logging import Logger
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from iris.utils.prom_helpers import PromHistogramBuilder, PromStrBuilder
+
+# the upper bounds (in seconds) of the histogram buckets of each measurement
+SPAWN_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CPU_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SCHEDULING_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+# the fraction of its execution_timeout a metric's run took, ie 0.9 is a run that almost timed out
+TIMEOUT_RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+# the number of metrics started by a single tick of the engine
+TICK_DISPATCHED_BUCKETS = (1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0)
+
+
+@dataclass
+class Histogram:
+    """
+    A Histogram counts the observed values into fixed buckets, like a prometheus client histogram. Observing a value
+    is a binary search & an increment, so it is cheap enough to run after every metric run
+
+    :param buckets: the sorted upper bounds of the buckets, the +Inf bucket is implied
+    """
+    buckets: Sequence[float]
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the bucket counts, the sum & the count of the observed values
+
+        :return: None
+        """
+        self.bucket_counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """
+        Count a value into its bucket
+
+        :param value: the observed value
+        :return: None
+        """
+        bucket_index = bisect.bisect_left(self.buckets, value)
+        if bucket_index < len(self.buckets):
+            self.bucket_counts[bucket_index] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_cumulative_buckets(self) -> List[Tuple[float, int]]:
+        """
+        Get the buckets in the prom format, where each bucket counts the values less than or equal to its upper bound
+
+        :return: a list of (upper bound, cumulative count) tuples, without the +Inf bucket
+        """
+        cumulative_buckets = []
+        cumulative_count = 0
+        for upper_bound, bucket_count in zip(self.buckets, self.bucket_counts):
+            cumulative_count += bucket_count
+            cumulative_buckets.append((upper_bound, cumulative_count))
+
+        return cumulative_buckets
+
+
+@dataclass
+class SchedulerStats:
+    """
+    The SchedulerStats keep running histograms of how long each metric's runs take (spawn latency, wall duration, cpu
+    time, scheduling lag & the fraction of the execution_timeout used) and of each tick of the engine, so we know how
+    close the checks run to their timeouts and how far behind the Scheduler is. It also counts the runs of each metric
+    that were skipped, queued or killed because the previous run of the metric was still in flight
+
+    :param logger: logger for forensics
+    """
+    logger: Logger
+
+    # the name, help & buckets of each per metric histogram family
+    metric_histogram_families = (
+        ('spawn_latency_seconds', 'the seconds it took to spawn the subprocess of a metric', SPAWN_LATENCY_BUCKETS),
+        ('duration_seconds', 'the wall seconds a metric run took, from its start to its result', DURATION_BUCKETS),
+        ('cpu_seconds', 'the user + system cpu seconds used by the subprocess of a metric', CPU_SECONDS_BUCKETS),
+        ('scheduling_lag_seconds', 'the seconds between when a metric was due and when it started',
+         SCHEDULING_LAG_BUCKETS),
+        ('timeout_ratio', 'the fraction of its execution_timeout a metric run took', TIMEOUT_RATIO_BUCKETS),
+    )
+    overlap_actions = ('skipped', 'queued', 'killed')
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the per metric histograms & the tick histograms and counters
+
+        :return: None
+        """
+        self.metric_histograms: Dict[str, Dict[str, Histogram]] = {
+            family: {} for family, _, _ in self.metric_histogram_families
+        }
+        self.tick_dispatched = Histogram(TICK_DISPATCHED_BUCKETS)
+        self.tick_lag = Histogram(SCHEDULING_LAG_BUCKETS)
+        self.ticks_total = 0
+        self.dispatched_total = 0
+        # overlap action (skipped, queued or killed) -> metric name -> the number of runs, see Scheduler._handle_overlap
+        self.overlap_totals: Dict[str, Dict[str, int]] = {action: {} for action in self.overlap_actions}
+
+    def record_run(self, metric_name: str, execution_timeout: float, duration: float, scheduling_lag: float,
+                   spawn_latency: Optional[float] = None, cpu_seconds: Optional[float] = None) -> None:
+        """
+        Record the timings of a metric run
+
+        :param metric_name: the name of the metric
+        :param execution_timeout: the execution_timeout of the metric
+        :param duration: the wall seconds the run took
+        :param scheduling_lag: the seconds between when the metric was due and when it started
+        :param spawn_latency: the seconds it took to spawn the metric's subprocess. None if no subprocess was spawned
+        (ie a collector, a shared command or a shell pool run)
+        :param cpu_seconds: the user + system cpu seconds of the metric's subprocess. None if it is unknown
+        :return: None
+        """
+        observations = {
+            'duration_seconds': duration,
+            'scheduling_lag_seconds': scheduling_lag,
+            'timeout_ratio': duration / execution_timeout if execution_timeout > 0 else 0.0,
+        }
+        if spawn_latency is not None:
+            observations['spawn_latency_seconds'] = spawn_latency
+        if cpu_seconds is not None:
+            observations['cpu_seconds'] = cpu_seconds
+
+        for family, _, buckets in self.metric_histogram_families:
+            if family not in observations:
+                continue
+
+            histograms = self.metric_histograms[family]
+            if metric_name not in histograms:
+                histograms[metric_name] = Histogram(buckets)
+            histograms[metric_name].observe(observations[family])
+
+    def record_tick(self, dispatched_count: int, tick_lag: float) -> None:
+        """
+        Record a tick of the engine, see Scheduler.dispatch_due_metrics
+
+        :param dispatched_count: the number of metrics the tick started
+        :param tick_lag: the seconds between the earliest due time of the tick and when the tick ran
+        :return: None
+        """
+        self.ticks_total += 1
+        self.dispatched_total += dispatched_count
+        self.tick_dispatched.observe(dispatched_count)
+        self.tick_lag.observe(tick_lag)
+
+    def record_overlap(self, metric_name: str, action: str) -> None:
+        """
+        Count a run of a metric that came due while its previous run was still in flight
+
+        :param metric_name: the name of the metric
+        :param action: what the overlap policy of the metric did, one of overlap_actions
+        :return: None
+        """
+        overlap_totals = self.overlap_totals[action]
+        overlap_totals[metric_name] = overlap_totals.get(metric_name, 0) + 1
+
+    def forget_metrics(self, metric_names: List[str]) -> None:
+        """
+        Drop the histograms & overlap counters of the metrics that were removed from the Scheduler, so their series
+        stop being exported
+
+        :param metric_names: the names of the removed metrics
+        :return: None
+        """
+        for per_metric_stats in [*self.metric_histograms.values(), *self.overlap_totals.values()]:
+            for metric_name in metric_names:
+                per_metric_stats.pop(metric_name, None)  # type: ignore
+
+    def get_prom_strings(self) -> List[str]:
+        """
+        Get the histograms & the tick counters in the prom format
+
+        :return: a list of strings that build up to the prom string we need to write
+        """
+        prom_strings = []
+        for family, help_str, _ in self.metric_histogram_families:
+            histograms = self.metric_histograms[family]
+            prom_builder = PromHistogramBuilder(
+                metric_name='iris_scheduler_metric_{}'.format(family),
+                help_str=help_str,
+                samples=[
+                    ({'metric': name}, histogram.get_cumulative_buckets(), histogram.sum, histogram.count)
+                    for name, histogram in sorted(histograms.items())
+                ]
+            )
+            prom_strings.append(prom_builder.create_prom_string())
+
+        for metric_name, help_str, histogram in [
+            ('iris_scheduler_tick_dispatched_metrics', 'the number of metrics started by a tick of the engine',
+             self.tick_dispatched),
+            ('iris_scheduler_tick_lag_seconds', 'the seconds between the earliest due time of a tick and when it ran',
+             self.tick_lag),
+        ]:
+            prom_builder = PromHistogramBuilder(
+                metric_name=metric_name,
+                help_str=help_str,
+                samples=[({}, histogram.get_cumulative_buckets(), histogram.sum, histogram.count)]
+            )
+            prom_strings.append(prom_builder.create_prom_string())
+
+        prom_builders = [
+            PromStrBuilder(
+                metric_name='iris_scheduler_ticks_total',
+                metric_result=self.ticks_total,
+                help_str='the number of ticks of the engine that started at least one metric',
+                type_str='counter'
+            ),
+            PromStrBuilder(
+                metric_name='iris_scheduler_dispatched_total',
+                metric_result=self.dispatched_total,
+                help_str='the number of metric runs started by the engine',
+                type_str='counter'
+            ),
+        ]
+        for action in self.overlap_actions:
+            overlap_totals = self.overlap_totals[action]
+            prom_builders.append(PromStrBuilder(
+                metric_name='iris_scheduler_overlap_{}_runs_total'.format(action),
+                metric_result=sum(overlap_totals.values()),
+                help_str='the number of runs {} because the previous run of the metric was still in flight'.format(
+                    action),
+                type_str='counter',
+                samples=[({'metric': name}, total) for name, total in sorted(overlap_totals.items())]
+            ))
+        prom_strings.extend(prom_builder.create_prom_string() for prom_builder in prom_builders)
+
+        return prom_strings
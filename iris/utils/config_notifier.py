@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from logging import Logger
+from multiprocessing.connection import Connection
+from typing import Callable, List, Optional
+
+
+@dataclass
+class ConfigPublisher:
+    """
+    The ConfigPublisher is the Config Service's end of the config change channels set up by run_iris. It writes the
+    local_config only when its content changed and then notifies the Scheduler & the Garbage Collector (the
+    ConfigSubscribers) with the new version of the config over their multiprocessing pipes, so they reload it right
+    away instead of polling the file
+
+    :param connections: the send ends of the pipes to the ConfigSubscribers
+    :param logger: logger for forensics
+    """
+    connections: List[Connection]
+    logger: Logger
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the version & the content hash of the published config
+
+        :return: None
+        """
+        self.version = 0
+        self._digest: Optional[str] = None
+
+    def publish(self, config_path: str, config_content: str,
+                write_artifacts: Optional[Callable[[], None]] = None,
+                artifacts_stale: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        Atomically write the config to config_path and notify the ConfigSubscribers, unless the config file already has
+        this content
+
+        :param config_path: the path to the config file, ie the local_config
+        :param config_content: the content of the config
+        :param write_artifacts: writes the files derived from the config (ie its ConfigSnapshot). Called when the
+        config changed, right before the config file is replaced, or when artifacts_stale says they are outdated
+        :param artifacts_stale: checks if the artifacts of an unchanged config are outdated, ie they are missing or
+        were derived from other inputs than the config. None only writes them when the config changed
+        :return: True if the config changed & was published, else False
+        """
+        digest = hashlib.sha256(config_content.encode('utf-8')).hexdigest()
+        if self._digest is None:
+            self._digest = self._get_file_digest(config_path)  # the config written before a restart of the service
+
+        if digest == self._digest:
+            self.logger.info('The config at {} is unchanged, skipping its publish'.format(config_path))
+            if write_artifacts is not None and artifacts_stale is not None and artifacts_stale():
+                self.logger.info('Rewriting the outdated artifacts of the config at {}'.format(config_path))
+                write_artifacts()
+            return False
+
+        if write_artifacts is not None:
+            write_artifacts()
+
+        tmp_file_path = '{}.tmp'.format(config_path)
+        with open(tmp_file_path, 'w') as config_file:
+            config_file.write(config_content)
+        os.rename(tmp_file_path, config_path)  # Atomically update the config file
+
+        self._digest = digest
+        self.version += 1
+        for connection in self.connections:
+            try:
+                connection.send(self.version)
+            except OSError as e:  # the subscriber exited, it reads the config file when it starts again
+                self.logger.warning('Could not notify a subscriber of config version {}. Err: {}'.format(
+                    self.version, e))
+
+        self.logger.info('Published config version {} to {}'.format(self.version, config_path))
+
+        return True
+
+    @staticmethod
+    def _get_file_digest(config_path: str) -> Optional[str]:
+        """
+        Helper method for publish to get the content hash of the config file
+
+        :param config_path: the path to the config file
+        :return: the sha256 hex digest of the config file, or None if it doesn't exist
+        """
+        try:
+            with open(config_path, 'rb') as config_file:
+                return hashlib.sha256(config_file.read()).hexdigest()
+        except FileNotFoundError:
+            return None
+
+
+@dataclass
+class ConfigSubscriber:
+    """
+    The ConfigSubscriber is a consumer's end (ie the Scheduler's) of a config change channel, see ConfigPublisher. Its
+    wait methods replace the consumer's sleep between runs: they return as soon as a new config version is published,
+    or after the timeout
+
+    :param connection: the receive end of the pipe from the ConfigPublisher. None disables the notifications, the
+    wait methods then just sleep
+    :param logger: logger for forensics
+    """
+    connection: Optional[Connection]
+    logger: Logger
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the last config version received
+
+        :return: None
+        """
+        self.version = 0
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Block until a new config version is published or the timeout passes
+
+        :param timeout: the max seconds to wait
+        :return: True if a new config version was published, else False
+        """
+        if self.connection is None:
+            time.sleep(timeout)
+            return False
+
+        return self.connection.poll(timeout) and self._receive()
+
+    async def wait_async(self, timeout: float) -> bool:
+        """
+        Wait in the event loop until a new config version is published or the timeout passes
+
+        :param timeout: the max seconds to wait
+        :return: True if a new config version was published, else False
+        """
+        if self.connection is None:
+            await asyncio.sleep(timeout)
+            return False
+
+        loop = asyncio.get_event_loop()
+        readable = asyncio.Event()
+        loop.add_reader(self.connection.fileno(), readable.set)
+        try:
+            await asyncio.wait_for(readable.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(self.connection.fileno())
+
+        return self._receive()
+
+    def _receive(self) -> bool:
+        """
+        Helper method for the wait methods to receive every pending config version, only the latest one matters
+
+        :return: True if a new config version was received, else False
+        """
+        previous_version = self.version
+        try:
+            while self.connection is not None and self.connection.poll(0):
+                self.version = self.connection.recv()
+        except EOFError:  # the publisher exited, fall back to reloading the config on the timeout
+            self.logger.warning('The config publisher closed its channel, falling back to polling the config')
+            self.connection.close()  # type: ignore
+            self.connection = None
+
+        if self.version != previous_version:
+            self.logger.info('Received config version {}'.format(self.version))
+            return True
+
+        return False
@@ -0,0 +1,98 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from logging import Logger
+from typing import Dict, List, Optional, Tuple
+
+# the (inode, size, mtime) of a file, see ConfigWatcher
+FileStat = Tuple[int, int, int]
+
+
+@dataclass
+class ConfigWatcher:
+    """
+    The ConfigWatcher tells a service (ie the Scheduler) when its config files actually changed, so it only re-lints
+    them and rebuilds the Metric objects when they did. A file is only hashed when its inode, size or mtime changed (ie
+    the Config Service atomically replaced it), and it only counts as changed when its content hash differs from the
+    last applied one
+
+    :param paths: the paths to the config files, ie the global_config & the local_config
+    :param logger: logger for forensics
+    """
+    paths: List[str]
+    logger: Logger
+
+    def __post_init__(self) -> None:
+        """
+        Initialize the stats & content hashes of the files that were seen & applied
+
+        :return: None
+        """
+        self._seen_stats: Dict[str, Optional[FileStat]] = {}
+        self._seen_hashes: Dict[str, Optional[str]] = {}
+        self._applied_hashes: Dict[str, Optional[str]] = {}
+
+    def has_changed(self) -> bool:
+        """
+        Check if the content of any of the config files changed since the last call to mark_applied
+
+        :return: True if a config file changed (or was never applied), else False
+        """
+        for path in self.paths:
+            file_stat = self._get_file_stat(path)
+            if path not in self._seen_stats or file_stat != self._seen_stats[path]:
+                self._seen_stats[path] = file_stat
+                self._seen_hashes[path] = self._get_file_hash(path) if file_stat is not None else None
+
+        changed_paths = [path for path in self.paths if self._seen_hashes[path] != self._applied_hashes.get(path, '')]
+        if changed_paths:
+            self.logger.info('The config files changed: {}'.format(', '.join(changed_paths)))
+
+        return bool(changed_paths)
+
+    def get_hash(self, path: str) -> Optional[str]:
+        """
+        Get the content hash of a config file seen by the last has_changed call
+
+        :param path: the path to the config file
+        :return: the sha256 hex digest of the file, or None if it doesn't exist or wasn't seen yet
+        """
+        return self._seen_hashes.get(path)
+
+    def mark_applied(self) -> None:
+        """
+        Record the content of the config files seen by the last has_changed call as applied, once they were linted &
+        handed to the Scheduler without an error
+
+        :return: None
+        """
+        self._applied_hashes = dict(self._seen_hashes)
+
+    @staticmethod
+    def _get_file_stat(path: str) -> Optional[FileStat]:
+        """
+        Helper method for has_changed to get the stat of a config file
+
+        :param path: the path to the config file
+        :return: the (inode, size, mtime) of the file, or None if it doesn't exist
+        """
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        return stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns
+
+    @staticmethod
+    def _get_file_hash(path: str) -> Optional[str]:
+        """
+        Helper method for has_changed to get the content hash of a config file
+
+        :param path: the path to the config file
+        :return: the sha256 hex digest of the file, or None if it doesn't exist
+        """
+        try:
+            with open(path, 'rb') as config_file:
+                return hashlib.sha256(config_file.read()).hexdigest()
+        except FileNotFoundError:
+            return None
@@ -3,11 +3,14 @@ import re
 from configparser import SectionProxy
 from dataclasses import dataclass
 from logging import Logger
-from typing import Union, Dict, Optional, Awaitable
+from typing import Union, Dict, List, Optional, Awaitable, Tuple
 
 import aiofiles
 
 LabelTypes = Optional[Union[Dict, SectionProxy]]
+SampleTypes = Optional[List[Tuple[Dict, float]]]
+# the (labels, cumulative (upper bound, count) buckets, sum, count) of a histogram series
+HistogramSampleTypes = List[Tuple[Dict, List[Tuple[float, int]], float, int]]
 
 
 @dataclass
@@ -20,24 +23,46 @@ class PromStrBuilder:
     :param help_str: the help string that describes the metric
     :param type_str: the type of the metric
     :param labels: the labels that describe more details of the metric
+    :param samples: the (labels, result) samples of a metric family. Optional, set it instead of metric_result to write
+    many series of the metric at once. The labels of each sample are added to the labels above
+    :param header: the HELP & TYPE lines of the metric precomputed with create_prom_header (ie by the ConfigSnapshot).
+    Optional, they are built from the help_str and type_str if it is not set
     """
     metric_name: str
     metric_result: float
     help_str: str
     type_str: str
     labels: LabelTypes = None
+    samples: SampleTypes = None
+    header: Optional[str] = None
 
     def __post_init__(self) -> None:
         """
-        Add the iris_ prefix to the metric if it is not in the metric name. Create the help_str and type_str
+        Add the iris_ prefix to the metric if it is not in the metric name. Create the header from the help_str and
+        type_str if it was not precomputed
 
         :return: None
         """
         iris_prefix_found = re.search('^iris', self.metric_name, re.IGNORECASE)
         self.metric_name = self.metric_name if iris_prefix_found else 'iris_{}'.format(self.metric_name)
 
-        self.help_str = '# HELP {} {}'.format(self.metric_name, self.help_str)
-        self.type_str = '# TYPE {} {}'.format(self.metric_name, self.type_str)
+        if self.header is None:
+            self.header = self.create_prom_header(self.metric_name, self.help_str, self.type_str)
+
+    @staticmethod
+    def create_prom_header(metric_name: str, help_str: str, type_str: str) -> str:
+        """
+        Create the HELP & TYPE lines of a metric, they only depend on its config so they can be precomputed
+
+        :param metric_name: the name of the metric, the iris_ prefix is added if it is not in the name
+        :param help_str: the help string that describes the metric
+        :param type_str: the type of the metric
+        :return: the HELP & TYPE lines of the metric in prom format
+        """
+        if not re.search('^iris', metric_name, re.IGNORECASE):
+            metric_name = 'iris_{}'.format(metric_name)
+
+        return '# HELP {} {}\n# TYPE {} {}\n'.format(metric_name, help_str, metric_name, type_str)
 
     def create_prom_string(self) -> str:
         """
@@ -45,23 +70,122 @@ class PromStrBuilder:
 
         :return: the metric result string in prom format
         """
-        labels_string = self.create_labels_string()
-        prom_string = '{}{} {}'.format(self.metric_name, labels_string, self.metric_result)
+        if self.samples is None:
+            labels_string = self.create_labels_string()
+            prom_string = '{}{} {}'.format(self.metric_name, labels_string, self.metric_result)
 
-        return '{}\n{}\n{}\n'.format(self.help_str, self.type_str, prom_string)
+            return '{}{}\n'.format(self.header, prom_string)
 
-    def create_labels_string(self) -> str:
+        prom_strings = [
+            '{}{} {}'.format(self.metric_name, self.create_labels_string(sample_labels), sample_result)
+            for sample_labels, sample_result in self.samples
+        ]
+
+        return '{}{}'.format(self.header, ''.join('{}\n'.format(line) for line in prom_strings))
+
+    def create_labels_string(self, sample_labels: LabelTypes = None) -> str:
         """
         Create the labels that we want to add to the metric result prom string. Used by create_prom_string()
 
+        :param sample_labels: the labels of a single sample, added to the labels of the metric
         :return: the string of labels we want to add to the metric result prom string
         """
-        if self.labels:
-            labels = ['{}="{}"'.format(name, value) for name, value in self.labels.items()]
+        all_labels = dict(self.labels or {})
+        all_labels.update(sample_labels or {})
+
+        if all_labels:
+            labels = ['{}="{}"'.format(name, self.escape_label_value(value)) for name, value in all_labels.items()]
             return '{{{}}}'.format(','.join(labels))
 
         return ''
 
+    @staticmethod
+    def escape_label_value(value: object) -> str:
+        """
+        Escape a label value for the prom format, label values can come from the output of a metric's command
+
+        :param value: the label value
+        :return: the label value with its backslashes, double quotes & newlines escaped
+        """
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+@dataclass
+class PromHistogramBuilder:
+    """
+    The PromHistogramBuilder is a class that transforms histograms into a string in .prom file format, with the
+    <name>_bucket, <name>_sum and <name>_count series of each histogram
+
+    :param metric_name: the name of the histogram metric family
+    :param help_str: the help string that describes the metric
+    :param samples: the (labels, cumulative (upper bound, count) buckets, sum, count) of each histogram of the family.
+    The +Inf bucket is added from the count
+    """
+    metric_name: str
+    help_str: str
+    samples: HistogramSampleTypes
+
+    def __post_init__(self) -> None:
+        """
+        Add the iris_ prefix to the metric if it is not in the metric name. Create the help_str and type_str
+
+        :return: None
+        """
+        iris_prefix_found = re.search('^iris', self.metric_name, re.IGNORECASE)
+        self.metric_name = self.metric_name if iris_prefix_found else 'iris_{}'.format(self.metric_name)
+
+        self.help_str = '# HELP {} {}'.format(self.metric_name, self.help_str)
+        self.type_str = '# TYPE {} histogram'.format(self.metric_name)
+
+    def create_prom_string(self) -> str:
+        """
+        Create the prom string of the histograms
+
+        :return: the histograms string in prom format
+        """
+        prom_strings = []
+        for labels, buckets, histogram_sum, histogram_count in self.samples:
+            for upper_bound, bucket_count in buckets:
+                bucket_labels = dict(labels, le=self._format_bound(upper_bound))
+                prom_strings.append('{}_bucket{} {}'.format(
+                    self.metric_name, self._create_labels_string(bucket_labels), bucket_count))
+
+            inf_labels = dict(labels, le='+Inf')
+            prom_strings.append('{}_bucket{} {}'.format(
+                self.metric_name, self._create_labels_string(inf_labels), histogram_count))
+            prom_strings.append('{}_sum{} {}'.format(
+                self.metric_name, self._create_labels_string(labels), histogram_sum))
+            prom_strings.append('{}_count{} {}'.format(
+                self.metric_name, self._create_labels_string(labels), histogram_count))
+
+        return '{}\n{}\n{}'.format(self.help_str, self.type_str, ''.join('{}\n'.format(line) for line in prom_strings))
+
+    @staticmethod
+    def _create_labels_string(labels: Dict) -> str:
+        """
+        Helper method for create_prom_string to create the labels of a histogram series
+
+        :param labels: the labels of the series
+        :return: the string of labels we want to add to the series
+        """
+        if not labels:
+            return ''
+
+        label_strings = [
+            '{}="{}"'.format(name, PromStrBuilder.escape_label_value(value)) for name, value in labels.items()
+        ]
+        return '{{{}}}'.format(','.join(label_strings))
+
+    @staticmethod
+    def _format_bound(upper_bound: float) -> str:
+        """
+        Helper method for create_prom_string to format the le label of a bucket, ie 1.0 as 1 and 0.005 as 0.005
+
+        :param upper_bound: the upper bound of the bucket
+        :return: the upper bound as a string
+        """
+        return '{:g}'.format(upper_bound)
+
 
 @dataclass
 class PromFileWriter:
@@ -1,8 +1,11 @@
+import dataclasses
 import json
 import os
 from configparser import ConfigParser
 from logging import Logger
-from typing import Dict, List, Set, Tuple, Any
+from typing import Dict, List, Set, Tuple, Any, Type, TypeVar
+
+T = TypeVar('T')
 
 
 def read_config_file(config_path: str, logger: Logger = None) -> ConfigParser:
@@ -126,3 +129,51 @@ def _detect_duplicate_json_keys(pairs: List[Tuple]) -> Dict[str, Any]:
         config_json[key] = val
 
     return config_json
+
+
+def add_slots(cls: Type[T]) -> Type[T]:
+    """
+    Class decorator that rebuilds a dataclass with a __slots__ entry for each of its fields, like dataclass(slots=True)
+    does in python 3.10+. The instances have no __dict__, so the records we keep by the thousands (ie the Metric &
+    MetricResult objects) stay small. Apply it on top of the @dataclass decorator, the class must not use super()
+
+    :param cls: the dataclass
+    :return: the slotted dataclass
+    """
+    dataclass_cls: Any = cls  # Type[T] isn't known to be a dataclass, nor a class that can be rebuilt with type()
+    field_names = tuple(field.name for field in dataclasses.fields(dataclass_cls))
+    cls_dict = dict(dataclass_cls.__dict__)
+    cls_dict['__slots__'] = field_names
+    for field_name in field_names:
+        cls_dict.pop(field_name, None)  # the class attribute of a default would shadow the slot, __init__ has its own
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+
+    # the default pickle state of a slotted object is restored with setattr, which a frozen dataclass refuses
+    cls_dict['__getstate__'] = _get_slots_state
+    cls_dict['__setstate__'] = _set_slots_state
+
+    slotted_cls: Type[T] = type(dataclass_cls)(cls.__name__, cls.__bases__, cls_dict)
+    slotted_cls.__qualname__ = cls.__qualname__
+
+    return slotted_cls
+
+
+def _get_slots_state(self: Any) -> Tuple:
+    """
+    Helper method for add_slots to get the pickle/copy state of a slotted dataclass
+
+    :return: a tuple of the values of the slots
+    """
+    return tuple(getattr(self, slot) for slot in self.__slots__)
+
+
+def _set_slots_state(self: Any, state: Tuple) -> None:
+    """
+    Helper method for add_slots to restore the pickle/copy state of a slotted dataclass, even if it is frozen
+
+    :param state: a tuple of the values of the slots, see _get_slots_state
+    :return: None
+    """
+    for slot, value in zip(self.__slots__, state):
+        object.__setattr__(self, slot, value)
@@ -0,0 +1,127 @@
+import gc
+import inspect
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, Optional, Tuple
+from unittest import mock
+
+# set python project  paths to import iris module
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+project_root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, project_root_dir)
+
+from iris.config_service.aws.ec2_tags import EC2Tags  # noqa: E402
+from iris.config_service.aws.s3 import S3  # noqa: E402
+from iris.config_service.aws.session_cache import AWSSessionCache  # noqa: E402
+from scripts.util import get_script_logger  # noqa: E402
+
+logger = get_script_logger('benchmark_config_service_script')
+aws_logger = logger.getChild('aws')
+aws_logger.setLevel(logging.WARNING)  # the aws classes log every run
+
+RUNS = 50
+MEMORY_RUNS = 5
+AWS_PROFILES = ['prod', 'nonprod']
+INSTANCE_ID = 'i-000'
+
+
+def make_api_call(operation_name: str, api_params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stand in for every aws api call, the benchmark only measures the local work of the Config Service's aws clients
+
+    :param operation_name: the name of the aws operation
+    :param api_params: the params of the operation
+    :return: the response of a DescribeInstances call for an instance with the iris tags
+    """
+    return {'Reservations': [{'Instances': [{'InstanceId': INSTANCE_ID, 'Tags': [
+        {'Key': 'ihr:iris:profile', 'Value': 'benchmark'},
+        {'Key': 'ihr:iris:enabled', 'Value': 'true'},
+    ]}]}]}
+
+
+def run_aws_clients(aws_creds_path: str, session_cache: Optional[AWSSessionCache]) -> None:
+    """
+    Build the S3 & EC2Tags objects and get the iris tags, the way each run of the Config Service does
+
+    :param aws_creds_path: path to the aws_credentials file
+    :param session_cache: the AWSSessionCache shared by the runs, None builds new sessions like before it existed
+    :return: None
+    """
+    S3(
+        aws_creds_path=aws_creds_path,
+        region_name='us-east-1',
+        bucket_environment=AWS_PROFILES[0],
+        bucket_name='benchmark',
+        dev_mode=False,
+        logger=aws_logger,
+        session_cache=session_cache
+    )
+    EC2Tags(
+        aws_creds_path=aws_creds_path,
+        region_name='us-east-1',
+        ec2_metadata_url='',
+        dev_mode=True,
+        dev_instance_id=INSTANCE_ID,
+        logger=aws_logger,
+        session_cache=session_cache
+    ).get_iris_tags()
+
+
+def measure_runs(aws_creds_path: str, cached: bool, runs: int) -> Tuple[float, float]:
+    """
+    Time the aws clients of runs Config Service runs, then measure the memory they allocate in a second pass, as
+    tracing the allocations slows the runs down
+
+    :param aws_creds_path: path to the aws_credentials file
+    :param cached: set to True to share an AWSSessionCache between the runs
+    :param runs: the number of runs
+    :return: the median ms of a run and the peak MiB allocated by the runs
+    """
+    session_cache = AWSSessionCache(aws_creds_path=aws_creds_path, logger=aws_logger) if cached else None
+    durations_ms = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_aws_clients(aws_creds_path, session_cache)
+        durations_ms.append((time.perf_counter() - start) * 1000)
+
+    gc.collect()
+    tracemalloc.start()
+    for _ in range(MEMORY_RUNS):
+        run_aws_clients(aws_creds_path, session_cache)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(durations_ms), peak_bytes / 2 ** 20
+
+
+def main() -> None:
+    """
+    Benchmark the aws clients of the Config Service runs with new boto3 sessions on each run vs an AWSSessionCache
+
+    :return: None
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            mock.patch('botocore.client.BaseClient._make_api_call', side_effect=make_api_call):
+        aws_creds_path = os.path.join(tmp_dir, 'aws_credentials')
+        with open(aws_creds_path, 'w') as aws_creds_file:
+            for profile in AWS_PROFILES:
+                aws_creds_file.write('[{}]\naws_access_key_id = benchmark\naws_secret_access_key = benchmark\n'.format(
+                    profile))
+
+        run_aws_clients(aws_creds_path, None)  # warm up the imports & botocore's loader caches
+
+        for name, cached in [('new sessions', False), ('session cache', True)]:
+            median_ms, peak_mib = measure_runs(aws_creds_path, cached, RUNS)
+            logger.info('{:<14} p50: {:>7.2f}ms/run  peak allocated over {} runs: {:>6.2f}MiB'.format(
+                name, median_ms, MEMORY_RUNS, peak_mib))
+
+
+if __name__ == '__main__':
+    logger.info('Benchmarking the aws clients of {} Config Service runs with {} aws profiles'.format(
+        RUNS, len(AWS_PROFILES)))
+    main()
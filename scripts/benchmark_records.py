@@ -0,0 +1,106 @@
+import gc
+import inspect
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, List, Tuple
+
+# set python project  paths to import iris module
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+project_root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, project_root_dir)
+
+from iris.config_service.config_lint.linter import Linter  # noqa: E402
+from iris.config_service.configs import GlobalConfig, Metric  # noqa: E402
+from iris.scheduler.scheduler import MetricResult  # noqa: E402
+from scripts.util import get_script_logger  # noqa: E402
+
+logger = get_script_logger('benchmark_records_script')
+
+METRICS = 5000
+RESULTS_PER_METRIC = 10
+
+
+def measure(build: Callable[[], Any]) -> Tuple[Any, int, float]:
+    """
+    Measure the memory allocated by & the time taken to build some objects
+
+    :param build: the function that builds the objects
+    :return: the built objects, the bytes they allocated and the seconds it took to build them
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    built = build()
+    duration = time.perf_counter() - start
+    allocated_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return built, allocated_bytes, duration
+
+
+def build_metrics(linter: Linter, global_config: GlobalConfig) -> List[Metric]:
+    """
+    Lint METRICS metrics, the way the Scheduler loads a large profile
+
+    :param linter: the Linter used to build the Metric objects
+    :param global_config: the GlobalConfig the metrics are checked against
+    :return: a list of the Metric objects
+    """
+    return [
+        linter._json_to_metric(global_config, 'benchmark_metric_{}'.format(index), {
+            'help': 'benchmark metric {}'.format(index),
+            'metric_type': 'gauge',
+            'execution_frequency': 60,
+            'export_method': 'textfile',
+            'bash_command': 'cat /proc/loadavg | cut -d " " -f 1',
+        })
+        for index in range(METRICS)
+    ]
+
+
+def build_results(metrics: List[Metric]) -> List[MetricResult]:
+    """
+    Build RESULTS_PER_METRIC MetricResult objects for each metric, like a history of their runs
+
+    :param metrics: the metrics the results belong to
+    :return: a list of the MetricResult objects
+    """
+    return [
+        MetricResult(metric=metric, pid=index, timeout=False, return_code=0, shell_output='0.42', logger=logger)
+        for metric in metrics
+        for index in range(RESULTS_PER_METRIC)
+    ]
+
+
+def main() -> None:
+    """
+    Benchmark the memory & the build time of the Metric & MetricResult records, and the time it takes to serialize the
+    metrics into the local_config json
+
+    :return: None
+    """
+    linter = Linter(logger)
+    global_config = GlobalConfig(exec_timeout=30, min_exec_freq=10, max_exec_freq=86400, logger=logger)
+
+    metrics, metrics_bytes, metrics_duration = measure(lambda: build_metrics(linter, global_config))
+    results, results_bytes, results_duration = measure(lambda: build_results(metrics))
+
+    start = time.perf_counter()
+    local_config_content = json.dumps({metric.name: metric.to_json() for metric in metrics}, indent=2)
+    serialize_duration = time.perf_counter() - start
+
+    log_fmt = '{:<14} {:>8} objs  {:>8.1f} bytes/obj  {:>8.2f}us/obj'
+    logger.info(log_fmt.format('Metric', len(metrics), metrics_bytes / len(metrics),
+                               metrics_duration * 1e6 / len(metrics)))
+    logger.info(log_fmt.format('MetricResult', len(results), results_bytes / len(results),
+                               results_duration * 1e6 / len(results)))
+    logger.info('Serialized {} metrics ({} bytes of json) in {:.2f}ms'.format(
+        len(metrics), len(local_config_content), serialize_duration * 1000))
+
+
+if __name__ == '__main__':
+    logger.info('Benchmarking {} Metric records with {} MetricResult records each'.format(METRICS, RESULTS_PER_METRIC))
+    main()
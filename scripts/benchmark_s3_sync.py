@@ -0,0 +1,117 @@
+import hashlib
+import inspect
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+from typing import Dict, List
+from unittest import mock
+
+# set python project  paths to import iris module
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+project_root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, project_root_dir)
+
+from iris.config_service.aws.s3 import S3  # noqa: E402
+from scripts.util import get_script_logger  # noqa: E402
+
+logger = get_script_logger('benchmark_s3_sync_script')
+s3_logger = logger.getChild('s3')
+s3_logger.setLevel(logging.WARNING)  # the S3 class logs every sync
+
+RUNS = 5
+PROFILE_COUNTS = [1, 10, 100]
+DOWNLOAD_WORKERS = [1, 10]
+# the simulated round trip of a GET to s3 from an ec2 host
+ROUND_TRIP_SECONDS = 0.02
+
+LocalS3ObjectSummary = namedtuple('LocalS3ObjectSummary', 'key e_tag size last_modified')
+
+
+class LocalS3Bucket:
+    """
+    A local stand-in for a boto3 s3 Bucket & its client, whose downloads take ROUND_TRIP_SECONDS like a GET to s3
+    """
+    def __init__(self, contents: Dict[str, bytes]) -> None:
+        self.contents = contents
+        self.objects = self
+        self.meta = SimpleNamespace(client=self)
+
+    def all(self) -> List[LocalS3ObjectSummary]:
+        return [
+            LocalS3ObjectSummary(key, '"{}"'.format(hashlib.md5(body).hexdigest()), len(body), 'now')
+            for key, body in sorted(self.contents.items())
+        ]
+
+    def download_file(self, bucket_name: str, key: str, path: str, Config: object = None) -> None:
+        time.sleep(ROUND_TRIP_SECONDS)
+        with open(path, 'wb') as object_file:
+            object_file.write(self.contents[key])
+
+
+def time_syncs(profile_count: int, download_workers: int, runs: int) -> List[float]:
+    """
+    Time a full sync of a bucket with the global_config, the metrics config & profile_count profiles, the way the
+    Config Service syncs it on its first run or when every config changed
+
+    :param profile_count: the number of profile files in the bucket
+    :param download_workers: the number of objects downloaded at once
+    :param runs: the number of syncs to time
+    :return: a list of the wall clock seconds of each sync
+    """
+    contents = {'global_config.json': b'{}', 'metrics.json': b'{}'}
+    for index in range(profile_count):
+        contents['profiles/profile_{}.json'.format(index)] = '{{"profile_{}": []}}'.format(index).encode('utf-8')
+
+    durations = []
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            mock.patch('iris.config_service.aws.session_cache.boto3') as mock_boto3:
+        mock_boto3.Session.return_value.resource.return_value.Bucket.return_value = LocalS3Bucket(contents)
+        aws_creds_path = os.path.join(tmp_dir, 'aws_credentials')
+        open(aws_creds_path, 'w').close()
+
+        for run in range(runs):
+            s3 = S3(
+                aws_creds_path=aws_creds_path,
+                region_name='us-east-1',
+                bucket_environment='benchmark',
+                bucket_name='benchmark',
+                dev_mode=False,
+                logger=s3_logger,
+                download_workers=download_workers
+            )
+            download_path = os.path.join(tmp_dir, 'downloads_{}'.format(run))
+
+            start = time.perf_counter()
+            s3.download_bucket(download_path)
+            durations.append(time.perf_counter() - start)
+
+    return durations
+
+
+def main() -> None:
+    """
+    Benchmark a full sync of the config bucket with 1, 10 & 100 profiles, downloading the objects one at a time vs
+    through the download workers
+
+    :return: None
+    """
+    results = []
+    for profile_count in PROFILE_COUNTS:
+        for download_workers in DOWNLOAD_WORKERS:
+            durations_ms = [duration * 1000 for duration in time_syncs(profile_count, download_workers, RUNS)]
+            results.append((profile_count, download_workers, statistics.median(durations_ms)))
+
+    for profile_count, download_workers, median_ms in results:
+        logger.info('{:>4} profiles  {:>3} download workers  p50: {:.1f}ms'.format(
+            profile_count, download_workers, median_ms))
+
+
+if __name__ == '__main__':
+    logger.info('Benchmarking syncs of the config bucket against a local S3 stand-in with a {}ms round trip'.format(
+        ROUND_TRIP_SECONDS * 1000))
+    main()
@@ -0,0 +1,77 @@
+import asyncio
+import inspect
+import os
+import statistics
+import sys
+import time
+from typing import Awaitable, Callable, List
+
+# set python project  paths to import iris module
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+project_root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, project_root_dir)
+
+from scripts.util import get_script_logger  # noqa: E402
+
+logger = get_script_logger('benchmark_spawn_script')
+
+RUNS = 200
+COMMANDS = ['true', 'cat /proc/loadavg']
+
+
+async def time_spawns(spawn: Callable[[], Awaitable[asyncio.subprocess.Process]], runs: int) -> List[float]:
+    """
+    Time how long it takes to spawn a metric subprocess and collect its output, the way the Scheduler does
+
+    :param spawn: the coroutine function that spawns the subprocess
+    :param runs: the number of subprocesses to spawn
+    :return: a list of the latency of each spawn in seconds
+    """
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = await spawn()
+        await proc.communicate()
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+def log_latencies(mode: str, command: str, latencies: List[float]) -> None:
+    """
+    Log the mean, median and 99th percentile of the spawn latencies in milliseconds
+
+    :param mode: the spawn mode, exec or shell
+    :param command: the command that was spawned
+    :param latencies: a list of the latency of each spawn in seconds
+    :return: None
+    """
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    p99 = latencies_ms[int(len(latencies_ms) * 0.99) - 1]
+    log_fmt = '{:<5} {:<20} mean: {:.3f}ms  p50: {:.3f}ms  p99: {:.3f}ms'
+    logger.info(log_fmt.format(mode, command, statistics.mean(latencies_ms), statistics.median(latencies_ms), p99))
+
+
+async def main() -> None:
+    """
+    Benchmark each command spawned directly (create_subprocess_exec) and through /bin/sh (create_subprocess_shell)
+
+    :return: None
+    """
+    pipe = asyncio.subprocess.PIPE
+    for command in COMMANDS:
+        argv = command.split()
+
+        def spawn_exec() -> Awaitable[asyncio.subprocess.Process]:
+            return asyncio.create_subprocess_exec(*argv, stdout=pipe, stderr=pipe)
+
+        def spawn_shell() -> Awaitable[asyncio.subprocess.Process]:
+            return asyncio.create_subprocess_shell(command, stdout=pipe, stderr=pipe)
+
+        log_latencies('exec', command, await time_spawns(spawn_exec, RUNS))
+        log_latencies('shell', command, await time_spawns(spawn_shell, RUNS))
+
+
+if __name__ == '__main__':
+    logger.info('Benchmarking metric spawn latency of direct exec vs /bin/sh over {} runs'.format(RUNS))
+    asyncio.get_event_loop().run_until_complete(main())
@@ -29,6 +29,7 @@ if __name__ == '__main__':
         region_name = script_settings['config_service_settings']['s3_region_name']
         bucket_env = script_settings['config_service_settings']['s3_bucket_env']
         bucket_name = script_settings['config_service_settings']['s3_bucket_name']
+        bundle = script_settings['config_service_settings'].getboolean('s3_bundle')
 
         logger.info('Downloading content from s3 bucket: {} to dir: {}'.format(bucket_name, s3_download_path))
 
@@ -38,7 +39,8 @@ if __name__ == '__main__':
             bucket_environment=bucket_env,
             bucket_name=bucket_name,
             dev_mode=True,
-            logger=logger
+            logger=logger,
+            bundle=bundle
         )
         s3.download_bucket(s3_download_path)
 
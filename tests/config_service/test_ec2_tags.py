@@ -12,7 +12,7 @@ test_aws_creds_path = 'tests/config_service/test_configs/test_aws_credentials'
 test_logger = logging.getLogger('iris.test')
 
 
-@patch('iris.config_service.aws.ec2_tags.boto3')
+@patch('iris.config_service.aws.session_cache.boto3')
 @patch('iris.config_service.aws.ec2_tags.requests')
 def test_successful_get_tags(mock_requests, mock_boto3):
     mock_requests.get.return_value.text = 'i-test'
@@ -30,7 +30,7 @@ def test_successful_get_tags(mock_requests, mock_boto3):
     assert ec2_tags.get_iris_tags() == expected_result
 
 
-@patch('iris.config_service.aws.ec2_tags.boto3')
+@patch('iris.config_service.aws.session_cache.boto3')
 @patch('iris.config_service.aws.ec2_tags.requests')
 def test_get_tags_failure(mock_requests, mock_boto3):
     test_err = ClientError(
@@ -1,5 +1,9 @@
+import copy
+import dataclasses
+import json
 import logging
 import os
+import pickle
 
 import pytest
 
@@ -112,3 +116,186 @@ def test_detect_mismatch_profilename_filename():
     invalid_profiles = {'invalid_test0': Profile(name='valid_test0', metrics=['test_metric0'], logger=test_logger)}
     with pytest.raises(ValueError):
         linter._detect_mismatch_profilename_filename(invalid_profiles)
+
+
+def test_json_to_metric_argv():
+    linter = Linter(test_logger)
+    test_global_config = linter.lint_global_config(test_global_config_path)
+    test_metric_body = {
+        'help': 'help test',
+        'metric_type': 'gauge',
+        'execution_frequency': 30,
+        'export_method': 'textfile'
+    }
+
+    # commands without shell syntax are executed directly
+    metric_body = dict(test_metric_body, bash_command='cat /proc/loadavg')
+    metric = linter._json_to_metric(test_global_config, 'test', metric_body)
+    assert metric.argv == ['cat', '/proc/loadavg']
+
+    shell_commands = [
+        'who | wc -l',
+        'echo $RANDOM',
+        'ls *.prom',
+        "grep 'a b' /etc/hosts",
+        'cd /tmp',
+        'FOO=bar env',
+        'ls ~',
+        'test_incorrect_metric',
+    ]
+    for bash_command in shell_commands:
+        metric = linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, bash_command=bash_command))
+        assert metric.argv is None
+
+    # an explicit argv doesn't need a bash_command
+    metric = linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, argv=['echo', 'a b']))
+    assert metric.argv == ['echo', 'a b']
+    assert metric.bash_command == "echo 'a b'"
+
+    with pytest.raises(ValueError):
+        linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, argv=[]))
+
+    with pytest.raises(ValueError):
+        linter._json_to_metric(test_global_config, 'test', test_metric_body)
+
+
+def test_json_to_metric_collector():
+    linter = Linter(test_logger)
+    test_global_config = linter.lint_global_config(test_global_config_path)
+    test_metric_body = {
+        'help': 'help test',
+        'metric_type': 'gauge',
+        'execution_frequency': 30,
+        'export_method': 'textfile',
+        'collector': 'process_table',
+    }
+
+    metric = linter._json_to_metric(test_global_config, 'test', test_metric_body)
+    assert metric.collector_args == {}
+    assert metric.argv is None
+
+    with pytest.raises(ValueError):
+        linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, collector='invalid_collector'))
+
+    with pytest.raises(ValueError):
+        linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, bash_command='ps ax | wc -l'))
+
+
+def test_json_to_metric_extract():
+    linter = Linter(test_logger)
+    test_global_config = linter.lint_global_config(test_global_config_path)
+    test_metric_body = {
+        'help': 'help test',
+        'metric_type': 'gauge',
+        'execution_frequency': 30,
+        'export_method': 'textfile',
+        'bash_command': 'ps aux',
+        'extract': {'pattern': '^quickio', 'column': 3},
+    }
+
+    metric = linter._json_to_metric(test_global_config, 'test', test_metric_body)
+    assert metric.extract == {'pattern': '^quickio', 'column': 3}
+
+    with pytest.raises(ValueError):
+        linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, extract={'column': 0}))
+
+    with pytest.raises(ValueError):
+        collector_metric_body = dict(test_metric_body, bash_command='', collector='process_table')
+        linter._json_to_metric(test_global_config, 'test', collector_metric_body)
+
+
+def test_json_to_metric_output_format():
+    linter = Linter(test_logger)
+    test_global_config = linter.lint_global_config(test_global_config_path)
+    test_metric_body = {
+        'help': 'help test',
+        'metric_type': 'gauge',
+        'execution_frequency': 30,
+        'export_method': 'textfile',
+        'bash_command': 'df -P',
+        'output_format': 'labeled',
+    }
+
+    assert linter._json_to_metric(test_global_config, 'test', test_metric_body).output_format == 'labeled'
+
+    with pytest.raises(ValueError):
+        linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, output_format='csv'))
+
+    with pytest.raises(ValueError):
+        linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, max_output_bytes=0))
+
+    with pytest.raises(ValueError):
+        linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, extract={'column': 5}))
+
+
+def test_json_to_metric_resource_limits():
+    linter = Linter(test_logger)
+    test_global_config = linter.lint_global_config(test_global_config_path)
+    test_metric_body = {
+        'help': 'help test',
+        'metric_type': 'gauge',
+        'execution_frequency': 30,
+        'export_method': 'textfile',
+        'bash_command': 'du -s /var/log | cut -f 1',
+        'max_cpu_seconds': 5,
+        'max_rss_mb': 64,
+        'nice': 19,
+        'ioclass': 'idle',
+    }
+
+    metric = linter._json_to_metric(test_global_config, 'test', test_metric_body)
+    assert (metric.max_cpu_seconds, metric.max_rss_mb, metric.nice, metric.ioclass) == (5, 64, 19, 'idle')
+    assert metric.has_resource_limits()
+
+    for invalid_limits in [{'max_cpu_seconds': 0}, {'max_rss_mb': '64'}, {'nice': -5}, {'ioclass': 'realtime'}]:
+        with pytest.raises(ValueError):
+            linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, **invalid_limits))
+
+
+def test_json_to_metric_overlap():
+    linter = Linter(test_logger)
+    test_global_config = linter.lint_global_config(test_global_config_path)
+    test_metric_body = {
+        'help': 'help test',
+        'metric_type': 'gauge',
+        'execution_frequency': 30,
+        'export_method': 'textfile',
+        'bash_command': 'du -s /var/log | cut -f 1',
+    }
+
+    assert linter._json_to_metric(test_global_config, 'test', test_metric_body).overlap == 'skip'
+    metric = linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, overlap='kill-previous'))
+    assert metric.overlap == 'kill-previous'
+
+    with pytest.raises(ValueError):
+        linter._json_to_metric(test_global_config, 'test', dict(test_metric_body, overlap='queue-all'))
+
+
+def test_metric_record():
+    linter = Linter(test_logger)
+    test_global_config = linter.lint_global_config(test_global_config_path)
+    test_metric_body = {
+        'help': 'help test',
+        'metric_type': 'gauge',
+        'execution_frequency': 30,
+        'export_method': 'textfile',
+        'bash_command': 'du -s /var/log | cut -f 1',
+    }
+    metric = linter._json_to_metric(test_global_config, 'test', test_metric_body)
+
+    # the Metric is an immutable slotted record, the GlobalConfig & the logger are only used to build it
+    assert not hasattr(metric, '__dict__')
+    assert not hasattr(metric, 'gc') and not hasattr(metric, 'logger')
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        metric.bash_command = 'lsof'
+    with pytest.raises(TypeError):
+        hash(metric)
+
+    # serializing the Metric leaves it untouched, & the json lints back into an equal Metric
+    metric_json = metric.to_json()
+    assert metric_json == metric.to_json()
+    assert metric_json['execution_timeout'] == metric.execution_timeout
+    assert linter._json_to_metric(test_global_config, 'test', json.loads(json.dumps(metric_json))) == metric
+
+    assert pickle.loads(pickle.dumps(metric)) == metric
+    assert copy.copy(metric) == metric
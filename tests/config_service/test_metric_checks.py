@@ -0,0 +1,45 @@
+import logging
+
+import pytest
+
+from iris.config_service.config_lint.metric_checks import check_collector_args, check_extract_args
+
+logger = logging.getLogger('iris.test')
+
+
+def test_check_collector_args():
+    assert check_collector_args('process_table', {'field': 'user', 'pattern': '^root', 'aggregate': 'count'}, logger)
+    assert check_collector_args('fd_count', {}, logger)
+    assert check_collector_args('loadavg', {'period': 5}, logger)
+    assert check_collector_args('meminfo', {'field': 'MemAvailable'}, logger)
+
+    invalid_collector_args = [
+        ('invalid_collector', {}),
+        ('process_table', {'field': 'invalid_field'}),
+        ('process_table', {'aggregate': 'invalid_aggregate'}),
+        ('process_table', {'pattern': '('}),
+        ('process_table', {'invalid_arg': 1}),
+        ('fd_count', {'field': 'invalid_field'}),
+        ('loadavg', {'period': 10}),
+        ('meminfo', {}),
+        ('logged_in_users', {'unique': 'yes'}),
+        ('logged_in_users', {'pattern': 'root'}),
+    ]
+    for collector, collector_args in invalid_collector_args:
+        with pytest.raises(ValueError):
+            check_collector_args(collector, collector_args, logger)
+
+
+def test_check_extract_args():
+    assert check_extract_args({'pattern': '^quickio', 'column': 3, 'aggregate': 'sum'}, logger)
+
+    invalid_extracts = [
+        {'column': 0},
+        {'column': '3'},
+        {'aggregate': 'avg'},
+        {'pattern': '('},
+        {'field': 'cmdline'},
+    ]
+    for invalid_extract in invalid_extracts:
+        with pytest.raises(ValueError):
+            check_extract_args(invalid_extract, logger)
@@ -1,38 +1,288 @@
+import dataclasses
+import datetime
+import hashlib
+import io
 import logging
 import os
-import shutil
+import stat
+import time
 from collections import namedtuple
+from types import SimpleNamespace
 from unittest.mock import patch
 
 import pytest
+from botocore.exceptions import ClientError
 
-from iris.config_service.aws.s3 import S3
+from iris.config_service.aws.s3 import BUNDLE_MANIFEST_KEY, S3, S3SyncStats
+from iris.config_service.config_lint.linter import Linter
 
 test_aws_creds_path = 'tests/config_service/test_configs/test_aws_credentials'
 
 test_logger = logging.getLogger('iris.test')
 
 
-@patch('iris.config_service.aws.s3.boto3')
-def test_s3_download_bucket(mock_boto3):
-    MockBucketObject = namedtuple('MockBucketObject', 'key')
+class FakeS3Bucket:
+    """
+    A local stand-in for a boto3 s3 Bucket & its client, that keeps its objects in memory and counts the downloads
+    """
+    FakeS3ObjectSummary = namedtuple('FakeS3ObjectSummary', 'key e_tag size last_modified')
 
-    mock_boto3.Session.return_value.resource.return_value.Bucket.return_value.objects.all.return_value = [
-        MockBucketObject('test_path/key1'),
-        MockBucketObject('test_path/key2')
-    ]
+    def __init__(self):
+        self.contents = {}
+        self.downloaded_keys = []
+        self.corrupted_keys = set()
+        self.objects = self
+        self.meta = SimpleNamespace(client=self)
+        self.download_latency = 0.0
+        self.concurrent_downloads = 0
+        self.max_concurrent_downloads = 0
+
+    def put_object(self, Key, Body):
+        self.contents[Key] = Body
+        self.last_modified = datetime.datetime.now()
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.contents:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'Not Found'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.contents[Key])}
+
+    def delete_object(self, key):
+        del self.contents[key]
+
+    def all(self):
+        return [
+            self.FakeS3ObjectSummary(key, '"{}"'.format(hashlib.md5(body).hexdigest()), len(body), self.last_modified)
+            for key, body in sorted(self.contents.items())
+        ]
+
+    def download_file(self, bucket_name, key, path, Config=None):
+        self.concurrent_downloads += 1
+        self.max_concurrent_downloads = max(self.max_concurrent_downloads, self.concurrent_downloads)
+        time.sleep(self.download_latency)  # the round trip to s3
+        self.concurrent_downloads -= 1
+
+        with open(path, 'wb') as object_file:
+            body = self.contents[key]
+            object_file.write(body[::-1] if key in self.corrupted_keys else body)
+        self.downloaded_keys.append(key)
+
+
+@patch('iris.config_service.aws.session_cache.boto3')
+def test_s3_download_bucket(mock_boto3, tmp_path):
+    fake_bucket = FakeS3Bucket()
+    fake_bucket.put_object('global_config.json', b'{}')
+    fake_bucket.put_object('profiles/profile_0.json', b'{"profile_0": []}')
+    mock_boto3.Session.return_value.resource.return_value.Bucket.return_value = fake_bucket
 
     test_s3 = get_test_s3_instance()
-    expected_files = ['test_path/key1', 'test_path/key2']
-    test_download_dir_path = 'tests/config_service/test_download_directory'
+    expected_files = ['global_config.json', 'profiles/profile_0.json']
+    test_download_dir_path = str(tmp_path / 'downloads')
     assert test_s3.download_bucket(test_download_dir_path) == expected_files
+    assert sorted(fake_bucket.downloaded_keys) == expected_files
 
     # test download_bucket() is correctly creating directories (os.makedirs) to download s3 objects to
-    assert os.path.isdir(os.path.join(test_download_dir_path, 'test_path'))
-    shutil.rmtree(test_download_dir_path)
+    assert os.path.isdir(os.path.join(test_download_dir_path, 'profiles'))
+    assert os.path.isfile(S3.get_manifest_path(test_download_dir_path))
+
+    # unchanged objects are not downloaded again, even by a new S3 instance
+    fake_bucket.downloaded_keys = []
+    test_s3 = get_test_s3_instance()
+    assert test_s3.download_bucket(test_download_dir_path) == expected_files
+    assert fake_bucket.downloaded_keys == []
+    assert test_s3._sync_stats.objects_totals == {'fetched': 0, 'skipped': 2, 'deleted': 0}
+
+    # only the changed object & the local copy that was modified are downloaded
+    fake_bucket.put_object('global_config.json', b'{"execution_timeout": 30}')
+    with open(os.path.join(test_download_dir_path, 'profiles/profile_0.json'), 'w') as local_file:
+        local_file.write('{"profile_0": ["edited"]}')
+    test_s3.download_bucket(test_download_dir_path)
+    assert sorted(fake_bucket.downloaded_keys) == expected_files
+    with open(os.path.join(test_download_dir_path, 'global_config.json')) as local_file:
+        assert local_file.read() == '{"execution_timeout": 30}'
+
+    # the objects removed from the bucket are deleted locally
+    fake_bucket.delete_object('profiles/profile_0.json')
+    assert test_s3.download_bucket(test_download_dir_path) == ['global_config.json']
+    assert os.listdir(test_download_dir_path) == ['global_config.json']
+
+    assert test_s3._sync_stats.objects_totals == {'fetched': 2, 'skipped': 3, 'deleted': 1}
+    assert test_s3._sync_stats.bytes_totals == {'fetched': 42, 'skipped': 44, 'deleted': 17}
+
+
+@patch('iris.config_service.aws.session_cache.boto3')
+def test_s3_download_bucket_versions(mock_boto3, tmp_path):
+    fake_bucket = FakeS3Bucket()
+    fake_bucket.put_object('global_config.json', b'{}')
+    fake_bucket.put_object('metrics.json', b'{}')
+    mock_boto3.Session.return_value.resource.return_value.Bucket.return_value = fake_bucket
+
+    test_s3 = dataclasses.replace(get_test_s3_instance(), kept_versions=2)
+    test_download_dir_path = str(tmp_path / 'downloads')
+    versions_path = S3.get_versions_path(test_download_dir_path)
+
+    # the downloads dir of an older Iris is moved to the versions before it is replaced by a link to the first version
+    os.makedirs(test_download_dir_path)
+    with open(os.path.join(test_download_dir_path, 'metrics.json'), 'w') as legacy_file:
+        legacy_file.write('{"legacy": {}}')
+    test_s3.download_bucket(test_download_dir_path)
+    legacy_version_path = os.path.join(versions_path, '000000')
+    assert os.path.islink(test_download_dir_path)
+    assert os.readlink(test_download_dir_path) == 'downloads.versions/000001'
+    with open(os.path.join(legacy_version_path, 'metrics.json')) as legacy_file:
+        assert legacy_file.read() == '{"legacy": {}}'
+
+    # an unchanged bucket doesn't publish a new version
+    test_s3.download_bucket(test_download_dir_path)
+    assert sorted(os.listdir(versions_path)) == ['000000', '000001']
+
+    # a new version links the unchanged objects of the current one
+    fake_bucket.put_object('metrics.json', b'{"test": {}}')
+    test_s3.download_bucket(test_download_dir_path)
+    assert os.readlink(test_download_dir_path) == 'downloads.versions/000002'
+    assert os.path.samefile(os.path.join(versions_path, '000001', 'global_config.json'),
+                            os.path.join(versions_path, '000002', 'global_config.json'))
+
+    # the linked files are shared by the versions, so the published files are read-only
+    for version in ['000001', '000002']:
+        for file_name in ['global_config.json', 'metrics.json']:
+            assert stat.S_IMODE(os.stat(os.path.join(versions_path, version, file_name)).st_mode) == 0o444
+    with open(os.path.join(versions_path, '000001', 'metrics.json')) as previous_file:
+        assert previous_file.read() == '{}'
+
+    # a version that fails validation is not published
+    def validate_download(staged_download_path):
+        with open(os.path.join(staged_download_path, 'metrics.json')) as staged_file:
+            if staged_file.read() == 'invalid':
+                raise ValueError('invalid metrics.json')
+
+    fake_bucket.put_object('metrics.json', b'invalid')
+    with pytest.raises(ValueError):
+        test_s3.download_bucket(test_download_dir_path, validate_download)
+    assert os.readlink(test_download_dir_path) == 'downloads.versions/000002'
+
+    # neither is a download that doesn't match its checksum
+    fake_bucket.put_object('metrics.json', b'{"test": {}, "test2": {}}')
+    fake_bucket.corrupted_keys.add('metrics.json')
+    with pytest.raises(OSError):
+        test_s3.download_bucket(test_download_dir_path, validate_download)
+    assert os.readlink(test_download_dir_path) == 'downloads.versions/000002'
+    fake_bucket.corrupted_keys.clear()
+
+    # only the last kept_versions versions are kept
+    test_s3.download_bucket(test_download_dir_path, validate_download)
+    assert os.readlink(test_download_dir_path) == 'downloads.versions/000003'
+    assert sorted(os.listdir(versions_path)) == ['000002', '000003']
+
+    with pytest.raises(ValueError):
+        dataclasses.replace(test_s3, kept_versions=0)
+
+
+@patch('iris.config_service.aws.session_cache.boto3')
+def test_s3_download_bucket_parallel(mock_boto3, tmp_path):
+    fake_bucket = FakeS3Bucket()
+    fake_bucket.download_latency = 0.05
+    for index in range(20):
+        fake_bucket.put_object('profiles/profile_{}.json'.format(index), b'{}')
+    fake_bucket.corrupted_keys.add('profiles/profile_0.json')
+    mock_boto3.Session.return_value.resource.return_value.Bucket.return_value = fake_bucket
+
+    test_s3 = dataclasses.replace(get_test_s3_instance(), dev_mode=True, download_workers=10)
+    test_download_dir_path = str(tmp_path / 'downloads')
+
+    # a failed download doesn't stop the others, & the objects that were downloaded are not fetched again
+    start = time.monotonic()
+    with pytest.raises(OSError):
+        test_s3.download_bucket(test_download_dir_path)
+    assert time.monotonic() - start < 20 * fake_bucket.download_latency / 2
+    assert 1 < fake_bucket.max_concurrent_downloads <= 10
+
+    fake_bucket.corrupted_keys.clear()
+    fake_bucket.downloaded_keys = []
+    test_s3.download_bucket(test_download_dir_path)
+    assert fake_bucket.downloaded_keys == ['profiles/profile_0.json']
+
+
+@patch('iris.config_service.aws.session_cache.boto3')
+def test_s3_download_bucket_dev_mode(mock_boto3, tmp_path):
+    fake_bucket = FakeS3Bucket()
+    fake_bucket.put_object('global_config.json', b'{}')
+    mock_boto3.Session.return_value.resource.return_value.Bucket.return_value = fake_bucket
+
+    sync_stats = S3SyncStats(logger=test_logger)
+    test_s3 = dataclasses.replace(get_test_s3_instance(), dev_mode=True, sync_stats=sync_stats)
+    test_download_dir_path = str(tmp_path / 'downloads')
+    os.makedirs(os.path.join(test_download_dir_path, 'profiles'))
+    with open(os.path.join(test_download_dir_path, 'profiles/test_profile.json'), 'w') as local_file:
+        local_file.write('{}')
+
+    # the local test profiles are kept in dev mode
+    assert test_s3.download_bucket(test_download_dir_path) == ['global_config.json']
+    assert os.path.isfile(os.path.join(test_download_dir_path, 'profiles/test_profile.json'))
+
+    prom_string = ''.join(sync_stats.get_prom_strings())
+    assert 'iris_config_service_s3_fetched_objects_total 1\n' in prom_string
+    assert 'iris_config_service_s3_deleted_bytes_total 0\n' in prom_string
+    assert 'iris_config_service_s3_syncs_total 1\n' in prom_string
+    assert sync_stats.last_sync_duration == sync_stats.sync_duration_total > 0
+
+
+@patch('iris.config_service.aws.session_cache.boto3')
+def test_s3_bundle(mock_boto3, tmp_path):
+    fake_bucket = FakeS3Bucket()
+    mock_boto3.Session.return_value.resource.return_value.Bucket.return_value = fake_bucket
+
+    test_s3 = dataclasses.replace(get_test_s3_instance(), bundle=True)
+    test_upload_path = 'tests/config_service/test_configs/correct_configs'
+    test_download_dir_path = str(tmp_path / 'downloads')
+    expected_files = ['global_config.json', 'metrics.json', 'profiles/profile_0.json', 'profiles/profile_1.json']
+
+    # there is nothing to sync before a bundle is uploaded
+    with pytest.raises(OSError):
+        test_s3.download_bucket(test_download_dir_path)
+
+    bundle_keys = test_s3.upload_directory(test_upload_path, bundle=True)
+    assert bundle_keys[-1] == BUNDLE_MANIFEST_KEY
+    assert sorted(fake_bucket.contents) == sorted(bundle_keys)
+
+    # the bundle of an unchanged directory is not uploaded again
+    assert test_s3.upload_directory(test_upload_path, bundle=True) == []
+
+    assert test_s3.download_bucket(test_download_dir_path) == expected_files
+    assert os.readlink(test_download_dir_path) == 'downloads.versions/000001'
+    linter = Linter(test_logger)
+    global_config = linter.lint_global_config(os.path.join(test_download_dir_path, 'global_config.json'))
+    linter.lint_metrics_config(global_config, os.path.join(test_download_dir_path, 'metrics.json'))
+    assert set(linter.lint_profile_configs(os.path.join(test_download_dir_path, 'profiles'))) == {
+        'profile_0', 'profile_1'}
+
+    # only the manifest is read while the bundle is unchanged
+    fake_bucket.downloaded_keys = []
+    assert test_s3.download_bucket(test_download_dir_path) == expected_files
+    assert fake_bucket.downloaded_keys == []
+    assert test_s3._sync_stats.objects_totals == {'fetched': 1, 'skipped': 1, 'deleted': 0}
+
+    # a new bundle version is published, unless its download doesn't match its checksum
+    upload_dir_path = str(tmp_path / 'configs')
+    os.makedirs(os.path.join(upload_dir_path, 'profiles'))
+    for file_name in expected_files[:-1]:
+        with open(os.path.join(test_upload_path, file_name)) as config_file, \
+                open(os.path.join(upload_dir_path, file_name), 'w') as upload_file:
+            upload_file.write(config_file.read())
+    new_bundle_key = test_s3.upload_directory(upload_dir_path, bundle=True)[0]
+    assert test_s3._get_bundle_manifest()['version'] == 2
+
+    fake_bucket.corrupted_keys.add(new_bundle_key)
+    with pytest.raises(OSError):
+        test_s3.download_bucket(test_download_dir_path)
+    assert os.readlink(test_download_dir_path) == 'downloads.versions/000001'
+
+    fake_bucket.corrupted_keys.clear()
+    assert test_s3.download_bucket(test_download_dir_path) == expected_files[:-1]
+    assert os.readlink(test_download_dir_path) == 'downloads.versions/000002'
+    assert fake_bucket.downloaded_keys == [new_bundle_key, new_bundle_key]
 
 
-@patch('iris.config_service.aws.s3.boto3')
+@patch('iris.config_service.aws.session_cache.boto3')
 def test_s3_upload_object(mock_boto3):
     mock_boto3.Session.return_value.resource.return_value.Bucket.return_value.upload_file.return_value = None
 
@@ -45,7 +295,7 @@ def test_s3_upload_object(mock_boto3):
         test_s3.upload_object(invalid_path)
 
 
-@patch('iris.config_service.aws.s3.boto3')
+@patch('iris.config_service.aws.session_cache.boto3')
 def test_s3_upload_directory(mock_boto3):
     mock_boto3.Session.return_value.resource.return_value.Bucket.return_value.upload_file.return_value = None
 
@@ -0,0 +1,47 @@
+import logging
+from unittest.mock import patch
+
+from botocore.config import Config
+
+from iris.config_service.aws.session_cache import AWSSessionCache
+
+test_logger = logging.getLogger('iris.test')
+
+
+@patch('iris.config_service.aws.session_cache.boto3')
+def test_aws_session_cache(mock_boto3, tmp_path):
+    aws_creds_path = str(tmp_path / 'aws_credentials')
+    with open(aws_creds_path, 'w') as aws_creds_file:
+        aws_creds_file.write('[test0]\naws_access_key_id = old\n')
+
+    session_cache = AWSSessionCache(aws_creds_path=aws_creds_path, logger=test_logger)
+    s3 = session_cache.get_resource('s3', 'test0', 'us-east-1')
+    assert session_cache.get_resource('s3', 'test0', 'us-east-1') is s3
+    assert mock_boto3.Session.call_count == 1
+
+    # each service, aws profile & region has its own resource
+    session_cache.get_resource('ec2', 'test0', 'us-east-1')
+    session_cache.get_resource('ec2', 'test1', 'us-east-1')
+    session_cache.get_resource('ec2', 'test1', 'us-west-2')
+    assert mock_boto3.Session.call_count == session_cache.sessions_created == 4
+
+    # so does each client config, an equal config built on a later run shares the resource
+    s3_pooled = session_cache.get_resource('s3', 'test0', 'us-east-1', Config(max_pool_connections=10))
+    assert session_cache.get_resource('s3', 'test0', 'us-east-1', Config(max_pool_connections=10)) is s3_pooled
+    session_cache.get_resource('s3', 'test0', 'us-east-1', Config(max_pool_connections=20))
+    assert mock_boto3.Session.call_count == session_cache.sessions_created == 6
+    assert mock_boto3.Session.return_value.resource.call_args[1]['config'].max_pool_connections == 20
+
+    # rewriting the aws_credentials with the same content keeps the resources
+    with open(aws_creds_path, 'w') as aws_creds_file:
+        aws_creds_file.write('[test0]\naws_access_key_id = old\n')
+    session_cache.get_resource('s3', 'test0', 'us-east-1')
+    assert mock_boto3.Session.call_count == 6
+
+    # rotated credentials rebuild the resources
+    with open(aws_creds_path, 'w') as aws_creds_file:
+        aws_creds_file.write('[test0]\naws_access_key_id = new\n')
+    session_cache.get_resource('s3', 'test0', 'us-east-1')
+    session_cache.get_resource('ec2', 'test1', 'us-east-1')
+    assert mock_boto3.Session.call_count == 8
+    mock_boto3.Session.assert_called_with(profile_name='test1', region_name='us-east-1')
@@ -0,0 +1,96 @@
+import dataclasses
+import logging
+import pickle
+
+from iris.config_service.config_lint.linter import Linter
+from iris.config_service.snapshot import ConfigSnapshot, get_file_digest, load_local_config
+from iris.utils.config_watcher import ConfigWatcher
+
+test_global_config_path = 'tests/scheduler/test_configs/global_config.json'
+test_local_config_path = 'tests/scheduler/test_configs/local_config.json'
+
+test_logger = logging.getLogger('iris.test')
+
+
+def get_test_snapshot() -> ConfigSnapshot:
+    linter = Linter(test_logger)
+    global_config_obj = linter.lint_global_config(test_global_config_path)
+    return ConfigSnapshot(
+        global_config_digest=get_file_digest(test_global_config_path),
+        local_config_digest=get_file_digest(test_local_config_path),
+        metrics=linter.lint_metrics_config(global_config_obj, test_local_config_path)
+    )
+
+
+def test_config_snapshot(tmp_path):
+    snapshot_path = str(tmp_path / 'local_config.snapshot')
+    snapshot = get_test_snapshot()
+    snapshot.write(snapshot_path)
+
+    loaded_snapshot = ConfigSnapshot.load(snapshot_path, snapshot.global_config_digest,
+                                          snapshot.local_config_digest, test_logger)
+    assert loaded_snapshot == snapshot
+    assert loaded_snapshot.prom_file_names == {name: '{}.prom'.format(name) for name in snapshot.metrics}
+    assert loaded_snapshot.prom_headers == {
+        name: '# HELP iris_{} {}\n# TYPE iris_{} {}\n'.format(name, metric.help, name, metric.metric_type)
+        for name, metric in snapshot.metrics.items()
+    }
+
+    # a stale snapshot is never trusted
+    assert ConfigSnapshot.load(snapshot_path, snapshot.global_config_digest, 'stale', test_logger) is None
+    assert ConfigSnapshot.load(snapshot_path, None, snapshot.local_config_digest, test_logger) is None
+
+    # neither is a missing snapshot, an outdated one or a file that isn't a snapshot
+    missing_snapshot_path = str(tmp_path / 'missing.snapshot')
+    assert ConfigSnapshot.load(missing_snapshot_path, snapshot.global_config_digest,
+                               snapshot.local_config_digest, test_logger) is None
+
+    dataclasses.replace(snapshot, format_version=0).write(snapshot_path)
+    assert ConfigSnapshot.load(snapshot_path, snapshot.global_config_digest,
+                               snapshot.local_config_digest, test_logger) is None
+
+    with open(snapshot_path, 'wb') as snapshot_file:
+        pickle.dump({'metrics': {}}, snapshot_file)
+    assert ConfigSnapshot.load(snapshot_path, snapshot.global_config_digest,
+                               snapshot.local_config_digest, test_logger) is None
+
+    with open(snapshot_path, 'wb') as snapshot_file:
+        snapshot_file.write(b'not a pickle')
+    assert ConfigSnapshot.load(snapshot_path, snapshot.global_config_digest,
+                               snapshot.local_config_digest, test_logger) is None
+
+
+def test_load_local_config(tmp_path, mocker):
+    snapshot_path = str(tmp_path / 'local_config.snapshot')
+    snapshot = get_test_snapshot()
+
+    linter = Linter(test_logger)
+    lint_spy = mocker.spy(linter, 'lint_metrics_config')
+    config_watcher = ConfigWatcher(paths=[test_global_config_path, test_local_config_path], logger=test_logger)
+    assert config_watcher.has_changed()
+
+    load_local_config_params = {
+        'global_config_path': test_global_config_path,
+        'local_config_path': test_local_config_path,
+        'snapshot_path': snapshot_path,
+        'config_watcher': config_watcher,
+        'linter': linter,
+        'logger': test_logger,
+    }
+
+    # no snapshot yet, fall back to the linter
+    assert load_local_config(**load_local_config_params).metrics == snapshot.metrics
+    assert lint_spy.call_count == 1
+
+    snapshot.write(snapshot_path)
+    assert load_local_config(**load_local_config_params).metrics == snapshot.metrics
+    assert lint_spy.call_count == 1
+
+    # the snapshot of another local_config is ignored
+    dataclasses.replace(snapshot, local_config_digest='stale', metrics={}).write(snapshot_path)
+    assert load_local_config(**load_local_config_params).metrics == snapshot.metrics
+    assert lint_spy.call_count == 2
+
+    load_local_config_params['snapshot_path'] = None
+    assert load_local_config(**load_local_config_params).metrics == snapshot.metrics
+    assert lint_spy.call_count == 3
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from iris.scheduler.admission import AdmissionController
+
+logger = logging.getLogger('iris.test')
+
+
+@pytest.mark.asyncio
+async def test_admission_max_in_flight():
+    admission = AdmissionController(max_in_flight=2, max_spawns_per_second=0, logger=logger)
+
+    max_in_flight_seen = 0
+
+    async def run_metric():
+        nonlocal max_in_flight_seen
+        async with admission.admit():
+            max_in_flight_seen = max(max_in_flight_seen, admission.in_flight)
+            await asyncio.sleep(0.05)
+
+    await asyncio.gather(*[run_metric() for _ in range(5)])
+
+    assert max_in_flight_seen == 2
+    assert admission.max_queue_depth == 3  # the first 2 metrics were admitted right away
+    assert admission.admitted_total == 5
+    assert admission.in_flight == 0
+    assert admission.queue_depth == 0
+    assert admission.wait_seconds_total > 0
+
+
+@pytest.mark.asyncio
+async def test_admission_max_spawns_per_second():
+    admission = AdmissionController(max_in_flight=0, max_spawns_per_second=20, logger=logger)
+
+    async def run_metric():
+        async with admission.admit() as wait_seconds:
+            return wait_seconds
+
+    start = time.monotonic()
+    wait_times = await asyncio.gather(*[run_metric() for _ in range(3)])
+
+    # 3 spawns at 20 per second are spread at least 2 * 0.05 seconds apart
+    assert time.monotonic() - start >= 0.1
+    assert max(wait_times) >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_admission_cancelled_while_queued():
+    admission = AdmissionController(max_in_flight=1, max_spawns_per_second=0, logger=logger)
+
+    async with admission.admit():
+        queued_task = asyncio.ensure_future(admission.admit().__aenter__())
+        await asyncio.sleep(0)
+        assert admission.queue_depth == 1
+
+        queued_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued_task
+        assert admission.queue_depth == 0
+
+    # the cancelled metric didn't keep the only in-flight slot
+    async with admission.admit() as wait_seconds:
+        assert wait_seconds < 1
+
+
+def test_admission_invalid_limits():
+    with pytest.raises(ValueError):
+        AdmissionController(max_in_flight=-1, max_spawns_per_second=0, logger=logger)
+
+
+def test_admission_get_prom_strings():
+    admission = AdmissionController(max_in_flight=1, max_spawns_per_second=1, logger=logger)
+    prom_strings = admission.get_prom_strings()
+
+    assert 'iris_scheduler_admission_queue_depth 0' in prom_strings[0]
+    assert 'iris_scheduler_admission_wait_seconds_total 0' in prom_strings[-1]
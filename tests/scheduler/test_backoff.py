@@ -0,0 +1,40 @@
+import logging
+
+import pytest
+
+from iris.scheduler.backoff import FailureBackoff
+
+logger = logging.getLogger('iris.test')
+
+
+def test_failure_backoff():
+    backoff = FailureBackoff(max_backoff=100, quarantine_threshold=5, logger=logger)
+
+    assert backoff.record_result('test', execution_frequency=10, failed=False) == 10
+    assert [backoff.record_result('test', execution_frequency=10, failed=True) for _ in range(4)] == [20, 40, 80, 100]
+    assert backoff.backoff_delays == {'test': 100}
+
+    assert backoff.record_result('test', execution_frequency=10, failed=True) is None
+    assert backoff.is_quarantined('test')
+    assert backoff.record_result('test', execution_frequency=10, failed=True) is None
+
+    prom_string = ''.join(backoff.get_prom_strings())
+    assert 'iris_scheduler_metric_consecutive_failures{metric="test"} 6\n' in prom_string
+    assert 'iris_scheduler_metric_quarantined{metric="test"} 1\n' in prom_string
+
+    assert backoff.reset('test')
+    assert not backoff.is_quarantined('test')
+    assert backoff.consecutive_failures == {}
+
+    backoff.record_result('test', execution_frequency=10, failed=True)
+    assert backoff.record_result('test', execution_frequency=10, failed=False) == 10
+    assert backoff.consecutive_failures == {}
+
+
+def test_failure_backoff_disabled():
+    backoff = FailureBackoff(max_backoff=0, quarantine_threshold=0, logger=logger)
+    assert [backoff.record_result('test', execution_frequency=10, failed=True) for _ in range(50)] == [10] * 50
+    assert not backoff.is_quarantined('test')
+
+    with pytest.raises(ValueError):
+        FailureBackoff(max_backoff=-1, quarantine_threshold=0, logger=logger)
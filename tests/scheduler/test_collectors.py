@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+
+import pytest
+
+from iris.scheduler.collectors import Collectors, ProcessTable, utmp_struct
+
+logger = logging.getLogger('iris.test')
+
+clock_ticks = os.sysconf('SC_CLK_TCK')
+page_size = os.sysconf('SC_PAGE_SIZE')
+
+
+def create_test_proc_dir(proc_path):
+    proc_path.mkdir()
+    (proc_path / 'uptime').write_text('1000.00 4000.00\n')
+    (proc_path / 'meminfo').write_text('MemTotal:        1000 kB\nMemFree:          500 kB\n')
+
+    # pid, comm, state, cpu ticks (utime + stime), start time ticks, rss pages, cmdline
+    test_processes = [
+        (1, 'quickio', 'S', 10 * clock_ticks, 500 * clock_ticks, 1, b'quickio\0--port\0800\0'),
+        (2, 'my (app)', 'R', 50 * clock_ticks, 900 * clock_ticks, 2, b'/opt/my app\0'),
+        (3, 'defunct', 'Z', 0, 999 * clock_ticks, 0, b''),
+    ]
+    for pid, comm, state, cpu_ticks, start_ticks, rss_pages, cmdline in test_processes:
+        pid_path = proc_path / str(pid)
+        pid_path.mkdir()
+
+        stat_fields = ['0'] * 22
+        stat_fields[0] = state
+        stat_fields[11] = str(cpu_ticks)
+        stat_fields[19] = str(start_ticks)
+        stat_fields[21] = str(rss_pages)
+        (pid_path / 'stat').write_text('{} ({}) {}\n'.format(pid, comm, ' '.join(stat_fields)))
+        (pid_path / 'cmdline').write_bytes(cmdline)
+
+    (proc_path / 'self').mkdir()
+
+    return str(proc_path)
+
+
+def test_process_table_scan(tmp_path):
+    process_table = ProcessTable(max_age=5, logger=logger, proc_path=create_test_proc_dir(tmp_path / 'proc'))
+    processes = {process.pid: process for process in process_table.scan()}
+
+    assert sorted(processes) == [1, 2, 3]
+    assert processes[1].cmdline == 'quickio --port 800'
+    assert processes[1].cpu_percent == pytest.approx(100 * 10 / 500)
+    assert processes[1].mem_percent == pytest.approx(100 * page_size / (1000 * 1024))
+    assert processes[2].comm == 'my (app)'
+    assert processes[2].state == 'R'
+    assert processes[3].cmdline == '[defunct]'
+
+
+@pytest.mark.asyncio
+async def test_process_table_query(tmp_path):
+    process_table = ProcessTable(max_age=5, logger=logger, proc_path=create_test_proc_dir(tmp_path / 'proc'))
+
+    assert await process_table.query({}) == 3
+    assert await process_table.query({'state': 'Z'}) == 1
+    assert await process_table.query({'field': 'cmdline', 'pattern': '^quickio'}) == 1
+    assert await process_table.query({'field': 'cmdline', 'pattern': 'my app', 'aggregate': 'cpu_percent'}) == 50
+    assert await process_table.query({'pattern': 'nothing', 'aggregate': 'mem_percent'}) == 0
+
+    # every query in the scheduling window is answered from the same scan
+    assert process_table.scan_count == 1
+
+
+@pytest.mark.asyncio
+async def test_process_table_shared_scan():
+    process_table = ProcessTable(max_age=5, logger=logger)
+
+    counts = await asyncio.gather(*[process_table.query({'field': 'cmdline', 'pattern': 'py'}) for _ in range(10)])
+    assert process_table.scan_count == 1
+    assert len(set(counts)) == 1 and counts[0] >= 1
+
+
+@pytest.mark.asyncio
+async def test_collectors_collect():
+    collectors = Collectors(process_table_max_age=5, logger=logger)
+    assert await collectors.collect('process_table', {'field': 'cmdline', 'pattern': str(os.getpid())}) >= 0
+
+    with pytest.raises(ValueError):
+        await collectors.collect('invalid_collector', {})
+
+
+def create_test_utmp(utmp_path, users):
+    records = [utmp_struct.pack(2, 0, b'~', b'~~', b'reboot', b'', 0, 0, 0, 0, 0, 0, 0, 0, 0, b'')]
+    for pid, user in enumerate(users, start=100):
+        records.append(utmp_struct.pack(7, pid, b'pts/0', b'ts/0', user, b'10.0.0.1', 0, 0, 0, 0, 0, 0, 0, 0, 0, b''))
+    utmp_path.write_bytes(b''.join(records))
+
+    return str(utmp_path)
+
+
+@pytest.mark.asyncio
+async def test_collectors_host_stats(tmp_path):
+    proc_path = create_test_proc_dir(tmp_path / 'proc')
+    meminfo = 'MemTotal:        1000 kB\nMemAvailable:     500 kB\nHugePages_Total: 2\n'
+    (tmp_path / 'proc' / 'meminfo').write_text(meminfo)
+    (tmp_path / 'proc' / 'loadavg').write_text('0.50 0.25 0.10 2/300 12345\n')
+    (tmp_path / 'proc' / 'sys' / 'fs').mkdir(parents=True)
+    (tmp_path / 'proc' / 'sys' / 'fs' / 'file-nr').write_text('2048\t48\t100000\n')
+    utmp_path = create_test_utmp(tmp_path / 'utmp', [b'alice', b'bob', b'alice'])
+
+    collectors = Collectors(process_table_max_age=5, logger=logger, proc_path=proc_path, utmp_path=utmp_path)
+
+    assert await collectors.collect('fd_count', {}) == 2000
+    assert await collectors.collect('fd_count', {'field': 'max'}) == 100000
+    assert await collectors.collect('loadavg', {}) == 0.5
+    assert await collectors.collect('loadavg', {'period': 15}) == 0.1
+    assert await collectors.collect('meminfo', {'field': 'MemAvailable'}) == 500 * 1024
+    assert await collectors.collect('meminfo', {'field': 'HugePages_Total'}) == 2
+    assert await collectors.collect('logged_in_users', {}) == 3
+    assert await collectors.collect('logged_in_users', {'unique': True}) == 2
+    assert await collectors.collect('process_table', {}) == 3
+
+    with pytest.raises(ValueError):
+        await collectors.collect('meminfo', {'field': 'NoSuchField'})
+
+    collectors.utmp_path = str(tmp_path / 'no_utmp')
+    assert await collectors.collect('logged_in_users', {}) == 0
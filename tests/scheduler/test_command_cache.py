@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from unittest import mock
+
+import pytest
+
+from iris.scheduler.command_cache import CommandCache
+
+logger = logging.getLogger('iris.test')
+
+
+def get_test_run_command(outputs):
+    async def run_command():
+        await asyncio.sleep(0.05)
+        outputs.append(len(outputs))
+        return outputs[-1]
+
+    return run_command
+
+
+@pytest.mark.asyncio
+async def test_command_cache_running():
+    command_cache = CommandCache(window=0, logger=logger)
+    outputs = []
+
+    results = await asyncio.gather(*[command_cache.run('ps aux', get_test_run_command(outputs)) for _ in range(3)])
+    assert outputs == [0]
+    assert sorted(results) == [(0, False), (0, True), (0, True)]
+
+    # a window of 0 only shares commands that are still running
+    assert await command_cache.run('ps aux', get_test_run_command(outputs)) == (1, False)
+    assert command_cache.runs_total == 2
+    assert command_cache.saved_runs_total == 2
+
+
+@pytest.mark.asyncio
+async def test_command_cache_window():
+    command_cache = CommandCache(window=0.2, logger=logger)
+    outputs = []
+
+    assert await command_cache.run('ps aux', get_test_run_command(outputs)) == (0, False)
+    assert await command_cache.run('ps aux', get_test_run_command(outputs)) == (0, True)
+    assert await command_cache.run('who', get_test_run_command(outputs)) == (1, False)
+
+    await asyncio.sleep(0.2)
+    assert await command_cache.run('ps aux', get_test_run_command(outputs)) == (2, False)
+
+    assert command_cache.runs_total == 3
+    assert command_cache.saved_runs_total == 1
+
+
+@pytest.mark.asyncio
+async def test_command_cache_cancel():
+    command_cache = CommandCache(window=0, logger=logger)
+    outputs = []
+
+    # the run keeps going while another metric still waits on it
+    owner = asyncio.ensure_future(command_cache.run('ps aux', get_test_run_command(outputs)))
+    sharer = asyncio.ensure_future(command_cache.run('ps aux', get_test_run_command(outputs)))
+    await asyncio.sleep(0)
+    owner.cancel()
+    await asyncio.sleep(0)
+
+    # a metric that comes due after the owner was cancelled shares the run instead of starting a duplicate one
+    assert 'ps aux' in command_cache._running
+    late_sharer = asyncio.ensure_future(command_cache.run('ps aux', get_test_run_command(outputs)))
+    assert await sharer == (0, True)
+    assert await late_sharer == (0, True)
+    assert outputs == [0]
+    assert command_cache._running == {}
+
+    # the run is cancelled once no metric waits on it
+    owner = asyncio.ensure_future(command_cache.run('ps aux', get_test_run_command(outputs)))
+    await asyncio.sleep(0)
+    owner.cancel()
+    await asyncio.sleep(0.1)
+    assert outputs == [0]
+    assert command_cache._running == {}
+
+
+def get_test_metric(**changes):
+    settings = dict(execution_timeout=10, max_output_bytes=1024, max_cpu_seconds=None, max_rss_mb=None, nice=None,
+                    ioclass=None)
+    settings.update(changes)
+
+    return mock.MagicMock(**settings)
+
+
+def test_get_command_key():
+    metric = get_test_metric(argv=['ps', 'aux'], bash_command='ps  aux')
+    assert CommandCache.get_command_key(metric).startswith('ps aux\0')
+    assert CommandCache.get_command_key(metric) == CommandCache.get_command_key(
+        get_test_metric(argv=['ps', 'aux'], bash_command='ps aux'))
+
+    metric = get_test_metric(argv=None, bash_command=' ps aux | grep "a  b" ')
+    assert CommandCache.get_command_key(metric).startswith('ps aux | grep "a  b"\0')
+
+    # metrics that would run the same command with different execution settings don't share it
+    metric = get_test_metric(argv=['ps', 'aux'], bash_command='ps aux')
+    for changes in [{'execution_timeout': 5}, {'max_output_bytes': 10}, {'max_cpu_seconds': 1}, {'max_rss_mb': 64},
+                    {'nice': 10}, {'ioclass': 'idle'}]:
+        changed_metric = get_test_metric(argv=['ps', 'aux'], bash_command='ps aux', **changes)
+        assert CommandCache.get_command_key(changed_metric) != CommandCache.get_command_key(metric)
+
+
+def test_command_cache_invalid_window():
+    with pytest.raises(ValueError):
+        CommandCache(window=-1, logger=logger)
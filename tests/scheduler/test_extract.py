@@ -0,0 +1,27 @@
+import logging
+
+import pytest
+
+from iris.scheduler.extract import extract_value
+
+logger = logging.getLogger('iris.test')
+
+test_ps_output = '''USER       PID %CPU %MEM    VSZ   RSS TTY      STAT START   TIME COMMAND
+quickio   1001  1.5  2.0 100000 20000 ?        Sl   10:00   1:00 /usr/bin/quickio
+quickio   1002  0.5  1.0 100000 10000 ?        Sl   10:00   0:10 /usr/bin/quickio --worker
+root         1  0.0  0.1  10000  1000 ?        Ss   09:00   0:01 /sbin/init'''
+
+
+def test_extract_value():
+    assert extract_value({'pattern': '^quickio', 'column': 3}, test_ps_output) == 2.0
+    assert extract_value({'pattern': '^quickio', 'column': 4, 'aggregate': 'max'}, test_ps_output) == 2.0
+    assert extract_value({'pattern': '^quickio', 'aggregate': 'count'}, test_ps_output) == 2
+    assert extract_value({'pattern': 'init$', 'column': 2, 'aggregate': 'first'}, test_ps_output) == 1
+    assert extract_value({'pattern': '^nothing', 'column': 3}, test_ps_output) == 0
+    assert extract_value({}, '42') == 42
+
+    with pytest.raises(ValueError):
+        extract_value({'column': 3}, test_ps_output)  # the %CPU header isn't a number
+
+    with pytest.raises(ValueError):
+        extract_value({'pattern': '^nothing', 'column': 3, 'aggregate': 'min'}, test_ps_output)
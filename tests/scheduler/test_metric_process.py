@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import os
+import signal
+from unittest import mock
+
+import pytest
+
+from iris.scheduler.metric_process import MetricProcess, get_preexec_fn
+
+logger = logging.getLogger('iris.test')
+
+
+@pytest.mark.asyncio
+async def test_metric_process():
+    proc = await MetricProcess.start(['sh', '-c', 'echo out; echo err >&2; exit 3'], shell=False)
+    stdout, stderr, return_code = await asyncio.gather(proc.stdout.read(), proc.stderr.read(), proc.wait())
+
+    assert (stdout, stderr, return_code) == (b'out\n', b'err\n', 3)
+    assert proc.poll() == 3
+
+    # the exited subprocess is a zombie until it is reaped, so its process group id can't be reused
+    with open('/proc/{}/stat'.format(proc.pid)) as stat_file:
+        assert stat_file.read().rsplit(')', 1)[1].split()[0] == 'Z'
+    proc.reap()
+    assert not os.path.exists('/proc/{}'.format(proc.pid))
+    assert proc.rusage is not None
+    assert proc.rusage.ru_maxrss > 0
+
+    # a subprocess that didn't exit yet is reaped once it exits
+    proc = await MetricProcess.start('kill -9 $$', shell=True)
+    proc.reap()
+    assert await proc.wait() == -signal.SIGKILL
+    assert proc.rusage is not None
+
+    with pytest.raises(FileNotFoundError):
+        await MetricProcess.start(['/nonexistent/command'], shell=False)
+
+
+@pytest.mark.asyncio
+async def test_metric_process_limits():
+    assert get_preexec_fn(None, None, None, None, logger) is None
+
+    preexec_fn = get_preexec_fn(max_cpu_seconds=1, max_rss_mb=64, nice=10, ioclass='idle', logger=logger)
+    proc = await MetricProcess.start(
+        'ulimit -t; ulimit -d; cut -d " " -f 19 /proc/self/stat', shell=True, preexec_fn=preexec_fn)
+    stdout, _, return_code = await asyncio.gather(proc.stdout.read(), proc.stderr.read(), proc.wait())
+
+    assert return_code == 0
+    assert stdout.decode().split() == ['1', str(64 * 1024), str(max(10, os.nice(0)))]
+
+    # the exit is noticed by a thread blocked on os.waitid when the system has no pidfd
+    with mock.patch('os.pidfd_open', side_effect=OSError, create=True):
+        proc = await MetricProcess.start('exit 4', shell=True, preexec_fn=preexec_fn)
+    assert await asyncio.wait_for(proc.wait(), timeout=10) == 4
+    proc.reap()
+    assert proc.rusage is not None
+
+    preexec_fn = get_preexec_fn(max_cpu_seconds=1, max_rss_mb=None, nice=None, ioclass=None, logger=logger)
+    proc = await MetricProcess.start('while :; do :; done', shell=True, preexec_fn=preexec_fn)
+    assert await asyncio.wait_for(proc.wait(), timeout=10) in (-signal.SIGXCPU, -signal.SIGKILL)
+    proc.reap()
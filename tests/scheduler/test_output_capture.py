@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from iris.scheduler.output_capture import READ_CHUNK_BYTES, read_frame, read_head, read_tail
+
+
+def get_test_stream(data):
+    stream = asyncio.StreamReader()
+    stream.feed_data(data)
+    stream.feed_eof()
+
+    return stream
+
+
+@pytest.mark.asyncio
+async def test_read_head():
+    assert await read_head(get_test_stream(b'12.5\n'), max_bytes=10) == (b'12.5\n', False)
+    assert await read_head(get_test_stream(b'0123456789'), max_bytes=10) == (b'0123456789', False)
+    assert await read_head(get_test_stream(b'0123456789a'), max_bytes=10) == (b'0123456789', True)
+
+
+@pytest.mark.asyncio
+async def test_read_head_stops_early():
+    stream = asyncio.StreamReader()
+    stream.feed_data(b'x' * 3 * READ_CHUNK_BYTES)  # no EOF, like a command that keeps on writing
+
+    head, output_exceeded = await asyncio.wait_for(read_head(stream, max_bytes=READ_CHUNK_BYTES + 1), timeout=1)
+    assert output_exceeded
+    assert len(head) == READ_CHUNK_BYTES + 1
+
+
+@pytest.mark.asyncio
+async def test_read_tail():
+    assert await read_tail(get_test_stream(b'error\n'), max_bytes=10) == (b'error\n', False)
+
+    data = b'log line\n' * READ_CHUNK_BYTES + b'the error\n'
+    assert await read_tail(get_test_stream(data), max_bytes=10) == (b'the error\n', True)
+
+
+@pytest.mark.asyncio
+async def test_read_frame():
+    stream = asyncio.StreamReader()
+    stream.feed_data(b'12.5\n\niris-token 0\n')
+    assert await read_frame(stream, b'\niris-token ', max_bytes=10) == (b'12.5\n', b'0', False)
+
+    # the delimiter is found across chunks, and the stream isn't read past the frame
+    stream = asyncio.StreamReader()
+    stream.feed_data(b'x' * (READ_CHUNK_BYTES - 3) + b'\niris-token\n')
+    output, exit_status, output_exceeded = await read_frame(stream, b'\niris-token\n', max_bytes=READ_CHUNK_BYTES)
+    assert len(output) == READ_CHUNK_BYTES - 3 and exit_status == b'' and not output_exceeded
+
+    # no delimiter or EOF, like a command that keeps on writing
+    stream = asyncio.StreamReader()
+    stream.feed_data(b'x' * 3 * READ_CHUNK_BYTES)
+    assert await asyncio.wait_for(read_frame(stream, b'\niris-token ', max_bytes=10), timeout=1) == (b'', b'', True)
+
+    stream = asyncio.StreamReader()
+    stream.feed_data(b'log line\n' * READ_CHUNK_BYTES + b'the error\n\niris-token\n')
+    assert await read_frame(stream, b'\niris-token\n', max_bytes=10, keep_tail=True) == (b'the error\n', b'', True)
+
+    stream = get_test_stream(b'12.5\n')
+    with pytest.raises(asyncio.IncompleteReadError):
+        await read_frame(stream, b'\niris-token ', max_bytes=10)
@@ -0,0 +1,67 @@
+import pytest
+
+from iris.scheduler.output_formats import MAX_SAMPLES, parse_samples
+
+
+def test_parse_labeled_samples():
+    output = 'device=sda mount=/ 12.5\n\ndevice=sdb mount=/data 80\n'
+    assert parse_samples('labeled', output, 'disk_used') == [
+        ({'device': 'sda', 'mount': '/'}, 12.5),
+        ({'device': 'sdb', 'mount': '/data'}, 80.0),
+    ]
+    assert parse_samples('labeled', '', 'disk_used') == []
+
+    invalid_outputs = ['sda 12.5', 'device=sda twelve', 'device=sda 1\ndevice=sda 2', 'bad-name=sda 1']
+    for invalid_output in invalid_outputs:
+        with pytest.raises(ValueError):
+            parse_samples('labeled', invalid_output, 'disk_used')
+
+
+def test_parse_prometheus_samples():
+    output = '\n'.join([
+        '# HELP disk_used the disk used',
+        '# TYPE disk_used gauge',
+        'disk_used{device="sda",mount="/"} 12.5',
+        'iris_disk_used{device="sdb", mount="/my \\"data\\""} 80 1600000000000',
+        'disk_free{device="sda"} 10',
+        'disk_used 1e3',
+    ])
+    assert parse_samples('prometheus', output, 'disk_used') == [
+        ({'device': 'sda', 'mount': '/'}, 12.5),
+        ({'device': 'sdb', 'mount': '/my "data"'}, 80.0),
+        ({}, 1000.0),
+    ]
+
+    with pytest.raises(ValueError):
+        parse_samples('prometheus', 'disk_used{device=sda} 1', 'disk_used')
+
+    with pytest.raises(ValueError):
+        parse_samples('prometheus', 'not a sample line', 'disk_used')
+
+
+def test_parse_json_samples():
+    output = '[{"labels": {"interface": "eth0"}, "value": 10}, {"labels": {"interface": "eth1"}, "value": "2.5"}]'
+    assert parse_samples('json', output, 'rx_bytes') == [({'interface': 'eth0'}, 10.0), ({'interface': 'eth1'}, 2.5)]
+
+    invalid_outputs = ['{"eth0": 10}', '[{"labels": {}}]', '[1, 2]', 'not json']
+    for invalid_output in invalid_outputs:
+        with pytest.raises(ValueError):
+            parse_samples('json', invalid_output, 'rx_bytes')
+
+
+def test_parse_samples_limit():
+    output = '\n'.join('id={} 1'.format(i) for i in range(MAX_SAMPLES + 1))
+    with pytest.raises(ValueError):
+        parse_samples('labeled', output, 'too_many_series')
+
+
+def test_parse_samples_reserved_labels():
+    # the execution_frequency label is set by Iris, the output of a command can't overwrite it
+    reserved_outputs = [
+        ('labeled', 'device=sda execution_frequency=1 12.5'),
+        ('prometheus', 'disk_used{device="sda",execution_frequency="1"} 12.5'),
+        ('json', '[{"labels": {"execution_frequency": "1"}, "value": 12.5}]'),
+    ]
+    for output_format, reserved_output in reserved_outputs:
+        with pytest.raises(ValueError, match='Reserved label names: execution_frequency'):
+            parse_samples(output_format, reserved_output, 'disk_used')
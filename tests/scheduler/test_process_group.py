@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+
+import pytest
+
+from iris.scheduler.process_group import (
+    ProcessGroupStats, get_process_group_members, terminate_process_group
+)
+
+logger = logging.getLogger('iris.test')
+
+
+@pytest.mark.asyncio
+async def test_terminate_process_group():
+    proc = subprocess.Popen(['sh', '-c', 'sleep 100 | sleep 100'], start_new_session=True)
+    try:
+        await asyncio.sleep(0.1)
+        assert len(get_process_group_members(proc.pid)) == 3
+
+        assert not await terminate_process_group(proc.pid, grace_seconds=2)
+        assert proc.wait(timeout=1) == -signal.SIGTERM
+        assert get_process_group_members(proc.pid) == []
+    finally:
+        if proc.poll() is None:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+
+@pytest.mark.asyncio
+async def test_terminate_process_group_sigkill():
+    proc = subprocess.Popen(['sh', '-c', 'trap "" TERM; sleep 100'], start_new_session=True)
+    try:
+        await asyncio.sleep(0.1)
+        assert await terminate_process_group(proc.pid, grace_seconds=0.2)
+        assert proc.wait(timeout=1) == -signal.SIGKILL
+    finally:
+        if proc.poll() is None:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+
+def test_process_group_stats():
+    process_group_stats = ProcessGroupStats(logger=logger)
+    process_group_stats.record_killed('timeout_test')
+    process_group_stats.record_killed('timeout_test')
+    process_group_stats.record_orphaned('random_value', 3)
+
+    killed_prom_string, orphaned_prom_string = process_group_stats.get_prom_strings()
+    assert 'iris_scheduler_killed_processes_total{metric="timeout_test"} 2\n' in killed_prom_string
+    assert 'iris_scheduler_orphaned_processes_total{metric="random_value"} 3\n' in orphaned_prom_string
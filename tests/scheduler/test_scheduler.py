@@ -1,12 +1,20 @@
+import asyncio
+import dataclasses
 import logging
 import os
+import signal
+import time
+from typing import Optional
 from unittest import mock
 
 import aiofiles
 import pytest
 
 from iris.config_service.config_lint.linter import Linter
-from iris.scheduler.scheduler import Scheduler
+from iris.config_service.configs import Metric
+from iris.scheduler.metric_process import MetricProcess
+from iris.scheduler.process_group import get_process_group_members
+from iris.scheduler.scheduler import MetricsDiff, Scheduler
 
 test_global_config_path = 'tests/scheduler/test_configs/global_config.json'
 test_local_config_path = 'tests/scheduler/test_configs/local_config.json'
@@ -37,6 +45,15 @@ async def test_scheduler_success(mocker):
     assert metric_result.shell_output == '5'
     assert metric_result.prom_result_value == 5
     assert metric_result.return_code == 0
+    assert not hasattr(metric_result, '__dict__')
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        metric_result.return_code = 1
+    with pytest.raises(TypeError):
+        hash(metric_result)
+
+    run_state = scheduler.run_states[scheduler.metrics[0].name]
+    assert run_state.last_result is metric_result
+    assert run_state.last_start <= run_state.last_finish
 
 
 @pytest.mark.asyncio
@@ -57,22 +74,596 @@ async def test_scheduler_failure(mocker):
     assert metric_result.return_code == 127
 
 
-def test_get_prom_files_to_write():
+@pytest.mark.asyncio
+async def test_scheduler_exec(mocker):
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path
+    )
+    metric = scheduler.metrics[0]
+
+    mock_file = mock.MagicMock()
+    with mock.patch('aiofiles.threadpool.sync_open', return_value=mock_file):
+        mocker.patch('os.rename')
+
+        metric = replace_test_metric(metric, argv=['echo', '7'])
+        metric_result = await scheduler.run_metric_task(test_prom_output_path, metric)
+        assert metric_result.shell_output == '7'
+        assert metric_result.prom_result_value == 7
+
+        metric = replace_test_metric(metric, argv=['/nonexistent/test_incorrect_metric'])
+        metric_result = await scheduler.run_metric_task(test_prom_output_path, metric)
+        assert metric_result.return_code == 127
+        assert metric_result.prom_result_value == -1
+
+
+@pytest.mark.asyncio
+async def test_scheduler_shell_pool(mocker):
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path,
+        shell_pool_size=1
+    )
+
+    mock_file = mock.MagicMock()
+    with mock.patch('aiofiles.threadpool.sync_open', return_value=mock_file):
+        mocker.patch('os.rename')
+        metric_result = await scheduler.run_metric_task(test_prom_output_path, scheduler.metrics[0])
+
+    assert metric_result.shell_output == '5'
+    assert metric_result.pid == scheduler.shell_pool.workers[0].pid
+
+    metric = replace_test_metric(scheduler.metrics[0], bash_command='yes', max_output_bytes=100)
+    metric_result = await scheduler._run_in_shell_pool(scheduler.shell_pool, metric, scheduling_lag=0)
+    assert metric_result.return_code == -1
+    assert metric_result.shell_output == 'OUTPUT EXCEEDED 100 BYTES'
+
+    await scheduler.shell_pool.close()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_collector(mocker):
+    linter = Linter(logger)
+    global_config_obj = linter.lint_global_config(test_global_config_path)
+    metric = linter._json_to_metric(global_config_obj, 'test_process_count', {
+        'help': 'the number of processes',
+        'metric_type': 'gauge',
+        'execution_frequency': 30,
+        'export_method': 'textfile',
+        'collector': 'process_table',
+        'collector_args': {'aggregate': 'count'},
+    })
+    scheduler = Scheduler([metric], test_prom_output_path, logger)
+    spawn = mocker.patch('iris.scheduler.scheduler.MetricProcess.start')
+
+    mock_file = mock.MagicMock()
+    with mock.patch('aiofiles.threadpool.sync_open', return_value=mock_file):
+        mocker.patch('os.rename')
+        metric_result = await scheduler.run_metric_task(test_prom_output_path, metric)
+
+    assert metric_result.return_code == 0
+    assert metric_result.prom_result_value >= 1
+    assert not spawn.called
+    assert scheduler.admission.admitted_total == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_shared_command(mocker):
+    linter = Linter(logger)
+    global_config_obj = linter.lint_global_config(test_global_config_path)
+    metrics = [
+        linter._json_to_metric(global_config_obj, 'test_{}'.format(aggregate), {
+            'help': 'test shared command',
+            'metric_type': 'gauge',
+            'execution_frequency': 30,
+            'export_method': 'textfile',
+            'bash_command': 'printf "a 1\\nb 2\\nb 3\\n"',
+            'extract': {'pattern': '^b', 'column': 2, 'aggregate': aggregate},
+        })
+        for aggregate in ['sum', 'count', 'max']
+    ]
+    scheduler = Scheduler(metrics, test_prom_output_path, logger)
+    spawn = mocker.spy(MetricProcess, 'start')
+
+    mock_file = mock.MagicMock()
+    with mock.patch('aiofiles.threadpool.sync_open', return_value=mock_file):
+        mocker.patch('os.rename')
+        metric_results = await asyncio.gather(*[
+            scheduler.run_metric_task(test_prom_output_path, metric) for metric in metrics
+        ])
+
+    assert [metric_result.prom_result_value for metric_result in metric_results] == [5, 2, 3]
+    assert spawn.call_count == 1
+    assert scheduler.command_cache.saved_runs_total == 2
+    assert scheduler.admission.admitted_total == 1
+
+
+@pytest.mark.asyncio
+async def test_scheduler_multi_sample(mocker):
+    linter = Linter(logger)
+    global_config_obj = linter.lint_global_config(test_global_config_path)
+    metric = linter._json_to_metric(global_config_obj, 'test_disk_used', {
+        'help': 'test multi sample',
+        'metric_type': 'gauge',
+        'execution_frequency': 30,
+        'export_method': 'textfile',
+        'bash_command': 'printf "device=sda 1.5\\ndevice=sdb 2\\n"',
+        'output_format': 'labeled',
+    })
+    scheduler = Scheduler([metric], test_prom_output_path, logger)
+
+    mock_file = mock.MagicMock()
+    with mock.patch('aiofiles.threadpool.sync_open', return_value=mock_file):
+        mocker.patch('os.rename')
+        metric_result = await scheduler.run_metric_task(test_prom_output_path, metric)
+
+    assert metric_result.prom_result_value == 2
+    assert metric_result.get_prom_strings()[0] == '\n'.join([
+        '# HELP iris_test_disk_used test multi sample',
+        '# TYPE iris_test_disk_used gauge',
+        'iris_test_disk_used{execution_frequency="30",device="sda"} 1.5',
+        'iris_test_disk_used{execution_frequency="30",device="sdb"} 2.0\n',
+    ])
+
+    metric = replace_test_metric(metric, bash_command='echo sda 1', argv=None)
+    metric_result = await scheduler._create_metric_task(metric)
+    assert metric_result.prom_result_value == -1
+    assert metric_result.samples == []
+
+
+@pytest.mark.asyncio
+async def test_scheduler_output_exceeded():
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path
+    )
+    metric = replace_test_metric(scheduler.metrics[0], max_output_bytes=1024, bash_command='yes', argv=['yes'])
+    start = time.monotonic()
+    metric_result = await scheduler._create_metric_task(metric)
+    assert time.monotonic() - start < metric.execution_timeout
+    assert metric_result.return_code == -1
+    assert metric_result.shell_output == 'OUTPUT EXCEEDED 1024 BYTES'
+
+    metric = replace_test_metric(metric, bash_command='seq 100000 >&2; echo 3', argv=None)
+    metric_result = await scheduler._create_metric_task(metric)
+    assert metric_result.prom_result_value == 3
+
+    metric = replace_test_metric(metric, bash_command='seq 100000 >&2; exit 1')
+    metric_result = await scheduler._create_metric_task(metric)
+    assert metric_result.return_code == 1
+    assert metric_result.shell_output.endswith('99999\n100000')
+    assert len(metric_result.shell_output) <= 1024
+
+
+@pytest.mark.asyncio
+async def test_scheduler_timeout_kills_process_group():
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path,
+        kill_grace_seconds=0.5
+    )
+    metric = replace_test_metric(scheduler.metrics[0], exec_timeout=1, bash_command='sleep 100 | sleep 100',
+                                 argv=None)
+    metric_result = await scheduler._create_metric_task(metric)
+
+    assert metric_result.timeout
+    assert get_process_group_members(metric_result.pid) == []
+    assert scheduler.process_group_stats.killed_totals == {metric.name: 1}
+
+    # the command exits right away, but leaves a process behind
+    metric = replace_test_metric(metric, exec_timeout=1, bash_command='sleep 100 >/dev/null 2>&1 & echo 1')
+    metric_result = await scheduler._create_metric_task(metric)
+
+    assert metric_result.prom_result_value == 1
+    assert get_process_group_members(metric_result.pid) == []
+    assert scheduler.process_group_stats.orphaned_totals == {metric.name: 1}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_resource_limits():
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path
+    )
+    metric = replace_test_metric(scheduler.metrics[0], argv=None,
+                                 bash_command='i=0; while [ $i -lt 20000 ]; do i=$((i+1)); done; echo 1')
+    metric_result = await scheduler._create_metric_task(metric)
+    assert metric_result.prom_result_value == 1
+    assert metric_result.user_cpu_seconds + metric_result.system_cpu_seconds > 0
+    assert metric_result.max_rss_bytes > 0
+
+    metric = replace_test_metric(metric, exec_timeout=10, max_cpu_seconds=1, bash_command='while :; do :; done')
+    metric_result = await scheduler._create_metric_task(metric)
+    assert not metric_result.timeout
+    assert metric_result.return_code in (-signal.SIGXCPU, -signal.SIGKILL)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_stats(mocker):
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path
+    )
+    metric = scheduler.metrics[0]
+
+    mock_file = mock.MagicMock()
+    with mock.patch('aiofiles.threadpool.sync_open', return_value=mock_file):
+        mocker.patch('os.rename')
+        metric_result = await scheduler.run_metric_task(test_prom_output_path, metric, time.monotonic())
+
+    assert metric_result.spawn_latency is not None
+    for family in ['spawn_latency_seconds', 'duration_seconds', 'cpu_seconds', 'scheduling_lag_seconds',
+                   'timeout_ratio']:
+        assert scheduler.stats.metric_histograms[family][metric.name].count == 1
+
+    scheduler.update_metrics([])
+    assert scheduler.stats.metric_histograms['duration_seconds'] == {}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_failure_backoff(mocker):
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_incorrect_path,
+        prom_output_path=test_prom_output_path,
+        max_failure_backoff=3600,
+        quarantine_threshold=2
+    )
+    metric = scheduler.metrics[0]
+    run_state = scheduler.run_states[metric.name]
+
+    mock_file = mock.MagicMock()
+    with mock.patch('aiofiles.threadpool.sync_open', return_value=mock_file):
+        mocker.patch('os.rename')
+        scheduler.pop_due_metrics()
+        await scheduler.run_metric_task(test_prom_output_path, metric)
+        assert run_state.next_due == pytest.approx(run_state.last_start + 2 * metric.execution_frequency)
+
+        await scheduler.run_metric_task(test_prom_output_path, metric)
+        assert run_state.next_due == float('inf')
+        assert scheduler.backoff.is_quarantined(metric.name)
+
+    # an unchanged config keeps the metric quarantined, a changed one lifts the quarantine
+    scheduler.update_metrics(list(scheduler.metrics))
+    assert run_state.next_due == float('inf')
+
+    changed_metric = replace_test_metric(metric, bash_command='echo 1', argv=None)
+    scheduler.update_metrics([changed_metric])
+    assert run_state.next_due <= time.monotonic()
+    assert not scheduler.backoff.is_quarantined(metric.name)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_removed_failing_metric(mocker):
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path,
+        max_failure_backoff=3600,
+        quarantine_threshold=2
+    )
+    metric = replace_test_metric(scheduler.metrics[0], bash_command='sleep 0.2; exit 1', argv=None)
+    scheduler.update_metrics([metric])
+    written_prom_files = []
+
+    async def mock_write_prom_file(self, prom_file_path, *prom_strings, is_async=False):
+        written_prom_files.append(prom_file_path)
+
+    mocker.patch('iris.scheduler.scheduler.PromFileWriter.write_prom_file', mock_write_prom_file)
+
+    # the metric fails after it was removed, its run doesn't put it back into the backoff or the stats
+    assert scheduler.dispatch_due_metrics() == [metric.name]
+    task = scheduler.run_states[metric.name].running_task
+    await asyncio.sleep(0.05)
+    scheduler.update_metrics([])
+
+    metric_result = await task
+    assert metric_result.return_code == 1
+    assert metric.name not in scheduler.backoff.consecutive_failures
+    assert metric.name not in scheduler.backoff.backoff_delays
+    assert all(metric.name not in histograms for histograms in scheduler.stats.metric_histograms.values())
+    assert written_prom_files == []
+    assert scheduler._running_tasks == {}
+
+
+def test_pop_due_metrics():
     scheduler = get_test_scheduler_instance(
         global_config_path=test_global_config_path,
         local_config_path=test_local_config_path,
         prom_output_path=test_prom_output_path
     )
+    metric = scheduler.metrics[0]
 
     expected_prom_file_path = os.path.join(test_prom_output_path, 'test_list_iris_root_dir_count.prom')
-    expected_result = {expected_prom_file_path: scheduler.metrics[0]}
-    assert scheduler.get_prom_files_to_write() == expected_result
+    assert scheduler.run_states[metric.name].prom_file_path == expected_prom_file_path
+
+    # the metric has no prom file yet, so it is due right away and is then rescheduled
+    first_due = scheduler.run_states[metric.name].next_due
+    assert scheduler.pop_due_metrics() == [(metric, first_due)]
+    assert scheduler.pop_due_metrics() == []
+
+
+def test_seed_run_state(tmp_path):
+    prom_file_path = tmp_path / 'test_list_iris_root_dir_count.prom'
+    prom_file_path.write_text('')
+
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=str(tmp_path)
+    )
+    metric = scheduler.metrics[0]
+    run_state = scheduler.run_states[metric.name]
+
+    # the prom file was just written, so the metric is due one execution_frequency from now
+    assert run_state.last_finish is not None
+    assert run_state.next_due - time.monotonic() > metric.execution_frequency - 5
+    assert scheduler.pop_due_metrics() == []
+
+    # the prom file is only read once, a later local_config reload doesn't touch it
+    with mock.patch('os.stat') as mock_stat:
+        scheduler.update_metrics([metric])
+        assert not mock_stat.called
+
+
+@pytest.mark.asyncio
+async def test_scheduler_scheduling_lag(mocker):
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path
+    )
+
+    mock_file = mock.MagicMock()
+    with mock.patch('aiofiles.threadpool.sync_open', return_value=mock_file):
+        mocker.patch('os.rename')
+        intended_start = time.monotonic() - 2
+        metric_result = await scheduler.run_metric_task(test_prom_output_path, scheduler.metrics[0], intended_start)
+
+    assert metric_result.scheduling_lag >= 2
+    assert 'iris_test_list_iris_root_dir_count_scheduling_lag_seconds' in metric_result.get_prom_strings()[2]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_due_metrics(mocker):
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path
+    )
+    metric = scheduler.metrics[0]
+
+    started_metrics = []
+
+    async def mock_run_metric_task(prom_file_path, metric, intended_start=None):
+        started_metrics.append((prom_file_path, metric.name))
+
+    mocker.patch.object(scheduler, 'run_metric_task', mock_run_metric_task)
+
+    first_due = scheduler.run_states[metric.name].next_due
+    assert scheduler.dispatch_due_metrics() == [metric.name]
+    await asyncio.sleep(0)
+
+    expected_prom_file_path = os.path.join(test_prom_output_path, '{}.prom'.format(metric.name))
+    assert started_metrics == [(expected_prom_file_path, metric.name)]
+
+    # the metric is rescheduled one execution_frequency after its intended start, so it is not due again yet
+    assert scheduler.run_states[metric.name].next_due == first_due + metric.execution_frequency
+    assert scheduler.dispatch_due_metrics() == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('overlap, expected_starts, expected_overlaps', [
+    ('skip', 1, {'skipped': 2, 'queued': 0, 'killed': 0}),
+    ('queue-one', 2, {'skipped': 1, 'queued': 1, 'killed': 0}),
+    ('kill-previous', 3, {'skipped': 0, 'queued': 0, 'killed': 2}),
+])
+async def test_dispatch_overlap(mocker, overlap, expected_starts, expected_overlaps):
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path
+    )
+    metric = replace_test_metric(scheduler.metrics[0], overlap=overlap)
+    scheduler.update_metrics([metric])
+
+    started_runs = []
+    release_runs = asyncio.Event()
+
+    async def mock_run_metric_task(prom_file_path, metric, intended_start=None):
+        started_runs.append(intended_start)
+        await release_runs.wait()
+
+    mocker.patch.object(scheduler, 'run_metric_task', mock_run_metric_task)
+
+    scheduler.dispatch_due_metrics()
+    for _ in range(2):  # the metric comes due twice more while its first run is in flight
+        await asyncio.sleep(0)
+        scheduler._push_schedule(metric.name, time.monotonic() - 1)
+        scheduler.dispatch_due_metrics()
+
+    release_runs.set()
+    await asyncio.sleep(0.01)
+
+    assert len(started_runs) == expected_starts
+    assert {action: sum(totals.values()) for action, totals in scheduler.stats.overlap_totals.items()} == \
+        expected_overlaps
+    assert scheduler.run_states[metric.name].running_task is None
+    assert scheduler._running_tasks == {}
 
 
-def get_test_scheduler_instance(global_config_path: str, local_config_path: str, prom_output_path: str):
+@pytest.mark.asyncio
+async def test_cancelled_run_kills_process_group():
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path,
+        kill_grace_seconds=0.5
+    )
+    metric = replace_test_metric(scheduler.metrics[0], bash_command='sleep 100 | sleep 100', argv=None)
+
+    procs = []
+    start = MetricProcess.start
+
+    async def mock_start(*args, **kwargs):
+        procs.append(await start(*args, **kwargs))
+        return procs[-1]
+
+    with mock.patch('iris.scheduler.scheduler.MetricProcess.start', mock_start):
+        task = asyncio.ensure_future(scheduler._run_command(metric, 0.0))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.6)
+
+    assert get_process_group_members(procs[0].pid) == []
+    assert scheduler.process_group_stats.killed_totals == {metric.name: 1}
+
+    # the series of a metric removed from the local_config stop being exported
+    scheduler.update_metrics([])
+    assert scheduler.process_group_stats.killed_totals == {}
+    assert 'metric="{}"'.format(metric.name) not in ''.join(scheduler.process_group_stats.get_prom_strings())
+
+
+def test_update_metrics():
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path
+    )
+    metric = scheduler.metrics[0]
+    first_due = scheduler.run_states[metric.name].next_due
+
+    # metrics that are still in the local_config keep their next due time
+    assert scheduler.update_metrics([metric]) == MetricsDiff()
+    assert scheduler.run_states[metric.name].next_due == first_due
+
+    # an unchanged metric keeps its Metric object, a changed metric is updated in place
+    unchanged_metric = replace_test_metric(metric)
+    assert scheduler.update_metrics([unchanged_metric]) == MetricsDiff()
+    assert scheduler.metrics[0] is metric
+
+    run_state = scheduler.run_states[metric.name]
+    run_state.last_start = time.monotonic()
+    run_state.next_due = run_state.last_start + metric.execution_frequency
+    changed_metric = replace_test_metric(metric, execution_frequency=metric.execution_frequency // 2)
+    assert scheduler.update_metrics([changed_metric]) == MetricsDiff(changed=[metric.name])
+    assert scheduler.metrics[0] is changed_metric
+    assert run_state.next_due == run_state.last_start + changed_metric.execution_frequency
+
+    assert scheduler.update_metrics([]) == MetricsDiff(removed=[metric.name])
+    assert metric.name not in scheduler.run_states
+    assert scheduler.dispatch_due_metrics() == []
+
+
+@pytest.mark.asyncio
+async def test_scheduler_precomputed_prom_files(tmp_path):
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=str(tmp_path)
+    )
+    metric = scheduler.metrics[0]
+    prom_header = '# HELP iris_{} precomputed\n# TYPE iris_{} gauge\n'.format(metric.name, metric.name)
+
+    # the prom file name & header precomputed by the ConfigSnapshot are used instead of being formatted
+    scheduler.update_metrics([])
+    scheduler.update_metrics([metric], {metric.name: 'precomputed.prom'}, {metric.name: prom_header})
+    prom_file_path = scheduler.run_states[metric.name].prom_file_path
+    assert prom_file_path == str(tmp_path / 'precomputed.prom')
+
+    await scheduler.run_metric_task(prom_file_path, metric)
+    with open(prom_file_path) as prom_file:
+        assert prom_file.read().startswith('{}iris_{}{{'.format(prom_header, metric.name))
+
+    # a run of the previous config of a changed metric formats its own header
+    changed_metric = replace_test_metric(metric, help='changed')
+    scheduler.update_metrics([changed_metric], {metric.name: 'precomputed.prom'}, {metric.name: prom_header})
+    await scheduler.run_metric_task(prom_file_path, metric)
+    with open(prom_file_path) as prom_file:
+        assert prom_file.read().startswith('# HELP iris_{} {}\n'.format(metric.name, metric.help))
+
+
+def test_phase_offset():
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path,
+        phase_seed='host0'
+    )
+    metric = scheduler.metrics[0]
+    phase_offset = scheduler.get_phase_offset(metric)
+
+    assert 0 <= phase_offset < metric.execution_frequency
+    assert scheduler.get_phase_offset(metric) == phase_offset
+
+    other_host_scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path,
+        phase_seed='host1'
+    )
+    assert other_host_scheduler.get_phase_offset(metric) != phase_offset
+
+    # the metric is first due at its phase slot instead of right away
+    next_due = scheduler.run_states[metric.name].next_due
+    next_due_wall_time = time.time() + next_due - time.monotonic()
+    assert next_due - time.monotonic() < metric.execution_frequency
+    assert next_due_wall_time % metric.execution_frequency == pytest.approx(phase_offset, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_dispatch_jitter(mocker):
+    scheduler = get_test_scheduler_instance(
+        global_config_path=test_global_config_path,
+        local_config_path=test_local_config_path,
+        prom_output_path=test_prom_output_path,
+        max_jitter=5
+    )
+    metric = scheduler.metrics[0]
+    due = scheduler.run_states[metric.name].next_due
+
+    intended_starts = []
+
+    async def mock_run_metric_task(prom_file_path, metric, intended_start=None):
+        intended_starts.append(intended_start)
+
+    mocker.patch.object(scheduler, 'run_metric_task', mock_run_metric_task)
+    scheduler.dispatch_due_metrics()
+    await asyncio.sleep(0)
+
+    # the jitter is bounded by the slack between the metric's execution timeout and frequency
+    assert due <= intended_starts[0] <= due + metric.execution_frequency - metric.execution_timeout
+
+    with pytest.raises(ValueError):
+        get_test_scheduler_instance(
+            global_config_path=test_global_config_path,
+            local_config_path=test_local_config_path,
+            prom_output_path=test_prom_output_path,
+            max_jitter=-1
+        )
+
+
+def get_test_scheduler_instance(global_config_path: str, local_config_path: str, prom_output_path: str,
+                                **scheduler_kwargs):
     linter = Linter(logger)
     global_config_obj = linter.lint_global_config(global_config_path)
     local_config_obj = linter.lint_metrics_config(global_config_obj, local_config_path)
     metrics_list = list(local_config_obj.values())
 
-    return Scheduler(metrics_list, prom_output_path, logger)
+    return Scheduler(metrics_list, prom_output_path, logger, **scheduler_kwargs)
+
+
+def replace_test_metric(metric: Metric, exec_timeout: Optional[int] = None, **changes) -> Metric:
+    global_config_obj = Linter(logger).lint_global_config(test_global_config_path)
+    if exec_timeout is not None:
+        global_config_obj = dataclasses.replace(global_config_obj, exec_timeout=exec_timeout)
+
+    return dataclasses.replace(metric, gc=global_config_obj, logger=logger, **changes)
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+
+import pytest
+
+from iris.scheduler.shell_pool import ShellPool
+
+logger = logging.getLogger('iris.test')
+
+
+@pytest.mark.asyncio
+async def test_shell_pool_run():
+    shell_pool = ShellPool(size=1, logger=logger)
+
+    result = await shell_pool.run('echo test | wc -c', timeout=5)
+    assert result.stdout == b'5\n'
+    assert result.return_code == 0
+    assert not result.timeout
+
+    # the same worker runs the next command, and commands can't read the worker's stdin
+    worker_pid = result.pid
+    result = await shell_pool.run('cat; printf "no newline"; echo err >&2; exit 3', timeout=5)
+    assert result.pid == worker_pid
+    assert result.stdout == b'no newline'
+    assert result.stderr == b'err\n'
+    assert result.return_code == 3
+
+    # syntax errors don't break the framing of the worker
+    result = await shell_pool.run('echo (', timeout=5)
+    assert result.pid == worker_pid
+    assert result.return_code == 2
+
+    await shell_pool.close()
+
+
+@pytest.mark.asyncio
+async def test_shell_pool_timeout():
+    shell_pool = ShellPool(size=1, logger=logger)
+
+    result = await shell_pool.run('sleep 100 && echo 1', timeout=0.5)
+    assert result.timeout
+    assert result.return_code == -1
+
+    # the worker of the timed out command was replaced
+    timed_out_pid = result.pid
+    result = await shell_pool.run('echo 1', timeout=5)
+    assert result.stdout == b'1\n'
+    assert result.pid != timed_out_pid
+
+    await shell_pool.close()
+
+
+@pytest.mark.asyncio
+async def test_shell_pool_max_output_bytes():
+    shell_pool = ShellPool(size=1, logger=logger)
+
+    # the worker stops reading the stdout instead of waiting for the command to finish
+    result = await shell_pool.run('yes', timeout=5, max_output_bytes=100)
+    assert result.output_exceeded
+    assert result.return_code == -1
+    assert not result.timeout
+
+    exceeded_pid = result.pid
+    result = await shell_pool.run('seq 1000 >&2; echo 1', timeout=5, max_output_bytes=100)
+    assert result.pid != exceeded_pid
+    assert result.stdout == b'1\n'
+    assert result.stderr.endswith(b'999\n1000\n') and len(result.stderr) == 100
+
+    await shell_pool.close()
+
+
+@pytest.mark.asyncio
+async def test_shell_pool_size():
+    shell_pool = ShellPool(size=2, logger=logger)
+
+    results = await asyncio.gather(*[shell_pool.run('sleep 0.2; echo 1', timeout=5) for _ in range(4)])
+    assert len(shell_pool.workers) == 2
+    assert {result.pid for result in results} == {worker.pid for worker in shell_pool.workers}
+
+    await shell_pool.close()
+
+    with pytest.raises(ValueError):
+        ShellPool(size=0, logger=logger)
@@ -0,0 +1,60 @@
+import logging
+
+from iris.scheduler.stats import Histogram, SchedulerStats
+from iris.utils.prom_helpers import PromHistogramBuilder
+
+logger = logging.getLogger('iris.test')
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1.0, 10.0))
+    for value in [0.05, 0.1, 0.5, 5, 50]:
+        histogram.observe(value)
+
+    assert histogram.get_cumulative_buckets() == [(0.1, 2), (1.0, 3), (10.0, 4)]
+    assert histogram.count == 5
+    assert histogram.sum == 55.65
+
+
+def test_prom_histogram_builder():
+    histogram = Histogram(buckets=(0.5, 1.0))
+    histogram.observe(0.25)
+    histogram.observe(2)
+
+    prom_builder = PromHistogramBuilder(
+        metric_name='test_duration_seconds',
+        help_str='test help',
+        samples=[({'metric': 'test'}, histogram.get_cumulative_buckets(), histogram.sum, histogram.count)]
+    )
+
+    assert prom_builder.create_prom_string() == (
+        '# HELP iris_test_duration_seconds test help\n'
+        '# TYPE iris_test_duration_seconds histogram\n'
+        'iris_test_duration_seconds_bucket{metric="test",le="0.5"} 1\n'
+        'iris_test_duration_seconds_bucket{metric="test",le="1"} 1\n'
+        'iris_test_duration_seconds_bucket{metric="test",le="+Inf"} 2\n'
+        'iris_test_duration_seconds_sum{metric="test"} 2.25\n'
+        'iris_test_duration_seconds_count{metric="test"} 2\n'
+    )
+
+
+def test_scheduler_stats():
+    stats = SchedulerStats(logger=logger)
+    stats.record_run('test_command', execution_timeout=10, duration=9.5, scheduling_lag=0.002, spawn_latency=0.001,
+                     cpu_seconds=0.3)
+    stats.record_run('test_collector', execution_timeout=10, duration=0.001, scheduling_lag=0.002)
+    stats.record_tick(dispatched_count=2, tick_lag=0.001)
+
+    assert set(stats.metric_histograms['duration_seconds']) == {'test_command', 'test_collector'}
+    assert set(stats.metric_histograms['spawn_latency_seconds']) == {'test_command'}
+    timeout_ratio = stats.metric_histograms['timeout_ratio']['test_command']
+    assert timeout_ratio.get_cumulative_buckets()[-2:] == [(0.9, 0), (1.0, 1)]
+    assert (stats.ticks_total, stats.dispatched_total) == (1, 2)
+
+    prom_string = ''.join(stats.get_prom_strings())
+    assert 'iris_scheduler_metric_cpu_seconds_count{metric="test_command"} 1\n' in prom_string
+    assert 'iris_scheduler_tick_dispatched_metrics_bucket{le="2"} 1\n' in prom_string
+    assert 'iris_scheduler_dispatched_total 2\n' in prom_string
+
+    stats.forget_metrics(['test_command'])
+    assert 'test_command' not in ''.join(stats.get_prom_strings())
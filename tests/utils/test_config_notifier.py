@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+
+import pytest
+
+from iris.utils.config_notifier import ConfigPublisher, ConfigSubscriber
+
+logger = logging.getLogger('iris.test')
+
+
+def test_config_publisher(tmp_path):
+    config_path = str(tmp_path / 'local_config.json')
+    with open(config_path, 'w') as config_file:
+        config_file.write('{}')
+
+    receive_connection, send_connection = multiprocessing.Pipe(duplex=False)
+    config_publisher = ConfigPublisher(connections=[send_connection], logger=logger)
+    config_subscriber = ConfigSubscriber(connection=receive_connection, logger=logger)
+
+    # the config written before a restart of the config service is not published again
+    assert not config_publisher.publish(config_path, '{}')
+    assert not config_subscriber.wait(0)
+
+    assert config_publisher.publish(config_path, '{"test": {}}')
+    assert not config_publisher.publish(config_path, '{"test": {}}')
+    assert config_publisher.publish(config_path, '{"test": {}, "test2": {}}')
+    with open(config_path) as config_file:
+        assert config_file.read() == '{"test": {}, "test2": {}}'
+
+    # only the latest of the pending versions matters
+    assert config_subscriber.wait(0)
+    assert config_subscriber.version == 2
+    assert not config_subscriber.wait(0)
+
+
+@pytest.mark.asyncio
+async def test_config_subscriber_async(tmp_path):
+    config_path = str(tmp_path / 'local_config.json')
+    receive_connection, send_connection = multiprocessing.Pipe(duplex=False)
+    config_publisher = ConfigPublisher(connections=[send_connection], logger=logger)
+    config_subscriber = ConfigSubscriber(connection=receive_connection, logger=logger)
+
+    assert not await config_subscriber.wait_async(0.01)
+
+    asyncio.get_event_loop().call_later(0.01, config_publisher.publish, config_path, '{}')
+    assert await asyncio.wait_for(config_subscriber.wait_async(10), timeout=1)
+    assert config_subscriber.version == 1
+
+    # the subscriber falls back to sleeping once the publisher closed its channel
+    send_connection.close()
+    assert not await config_subscriber.wait_async(0.01)
+    assert config_subscriber.connection is None
+    assert not await config_subscriber.wait_async(0.01)
+
+
+def test_config_publisher_write_artifacts(tmp_path):
+    config_path = str(tmp_path / 'local_config.json')
+    config_publisher = ConfigPublisher(connections=[], logger=logger)
+    written_configs = []
+
+    def write_artifacts():  # the artifacts are written before the config is replaced
+        written_configs.append(os.path.isfile(config_path))
+
+    assert config_publisher.publish(config_path, '{}', write_artifacts)
+    assert not config_publisher.publish(config_path, '{}', write_artifacts)
+    assert config_publisher.publish(config_path, '{"test": {}}', write_artifacts)
+    assert written_configs == [False, True]
+
+
+def test_config_publisher_stale_artifacts(tmp_path):
+    config_path = str(tmp_path / 'local_config.json')
+    config_publisher = ConfigPublisher(connections=[], logger=logger)
+    written_artifacts = []
+    stale_artifacts = [True]
+
+    def write_artifacts():
+        written_artifacts.append(True)
+        stale_artifacts[0] = False
+
+    assert config_publisher.publish(config_path, '{}', write_artifacts, lambda: stale_artifacts[0])
+    assert written_artifacts == [True]
+
+    # the artifacts of an unchanged config are only rewritten when they are outdated, ie after a global_config change
+    assert not config_publisher.publish(config_path, '{}', write_artifacts, lambda: stale_artifacts[0])
+    assert written_artifacts == [True]
+
+    stale_artifacts[0] = True
+    assert not config_publisher.publish(config_path, '{}', write_artifacts, lambda: stale_artifacts[0])
+    assert written_artifacts == [True, True]
+    assert config_publisher.version == 1
@@ -0,0 +1,40 @@
+import logging
+import os
+
+from iris.utils.config_watcher import ConfigWatcher
+
+logger = logging.getLogger('iris.test')
+
+
+def test_config_watcher(tmp_path):
+    global_config_path = str(tmp_path / 'global_config.json')
+    local_config_path = str(tmp_path / 'local_config.json')
+    config_watcher = ConfigWatcher(paths=[global_config_path, local_config_path], logger=logger)
+
+    with open(global_config_path, 'w') as global_config_file:
+        global_config_file.write('{"execution_timeout": 30}')
+    with open(local_config_path, 'w') as local_config_file:
+        local_config_file.write('{}')
+
+    assert config_watcher.has_changed()
+    config_watcher.mark_applied()
+    assert not config_watcher.has_changed()
+
+    # the config file is atomically replaced with the same content, so it is hashed but not reloaded
+    tmp_config_path = '{}.tmp'.format(local_config_path)
+    with open(tmp_config_path, 'w') as local_config_file:
+        local_config_file.write('{}')
+    os.rename(tmp_config_path, local_config_path)
+    assert not config_watcher.has_changed()
+
+    with open(local_config_path, 'w') as local_config_file:
+        local_config_file.write('{"test": {}}')
+    assert config_watcher.has_changed()
+
+    # a change that wasn't applied (ie the linter failed) is still reported as changed
+    assert config_watcher.has_changed()
+    config_watcher.mark_applied()
+    assert not config_watcher.has_changed()
+
+    os.remove(local_config_path)
+    assert config_watcher.has_changed()